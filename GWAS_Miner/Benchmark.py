@@ -0,0 +1,283 @@
+"""
+End to end benchmark of the GC tagging pipeline over the bundled BioC_Studies corpus.
+
+Reports per-stage wall and CPU time, documents/sec, tokens/sec and peak RSS, writing the results as JSON so that
+runs from different commits can be compared. With --compare_profiles each pipeline profile is benchmarked in turn,
+reporting its entity and relation agreement with the accurate profile alongside its throughput. With --tables only
+the *_tables.json files are processed, benchmarking table typing and row relation extraction.
+
+Usage: python Benchmark.py [-d BioC_Studies] [-g GC_content.tsv] [-o benchmark.json] [--compare_profiles] [--tables]
+"""
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import BioC
+import Ontology
+import TableExtractor
+from DocCache import DocCache
+from Experimental import load_bioc_study
+from GC_Tagging import GCInterpreter, get_matching_data, process_gc_study
+from PipelineProfiles import load_profiles, PROFILE_ACCURATE
+from Profiling import StageProfiler
+
+logger = logging.getLogger("GWAS Miner")
+
+BEFREE_FILES = ["vdas_version_2_mesh.tsv", "gdas_version_1_mesh.tsv"]
+
+
+def get_commit_hash():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def get_study_ids(directory, limit=None):
+    study_ids = sorted(x.replace(".json", "") for x in os.listdir(directory)
+                       if x.endswith(".json") and "_" not in x)
+    return study_ids[:limit] if limit else study_ids
+
+
+def count_study_tokens(nlp, directory, pmc_id):
+    study = load_bioc_study(directory, F"{pmc_id}.json")
+    if not study:
+        return 0
+    return sum(len(nlp.nlp.make_doc(x['text'])) for x in study['documents'][0]['passages'] if x['text'])
+
+
+def get_study_items(result):
+    """
+    Identify the entities and relations of an annotated study independently of their annotation identifiers, which
+    are assigned sequentially and so differ between runs.
+    @param result: Annotated BioC study
+    @return: Tuple of the entity key set and relation key set
+    """
+    study = json.loads(json.dumps(result, default=BioC.ComplexHandler))
+    entities = {}
+    for passage in study['documents'][0]['passages']:
+        for annotation in passage.get('annotations') or []:
+            location = annotation['locations'][0] if annotation.get('locations') else {}
+            entities[annotation['id']] = F"{annotation['infons'].get('type')}:{location.get('offset')}:" \
+                                         F"{location.get('length')}"
+    relations = set()
+    for relation in study['documents'][0].get('relations') or []:
+        relations.add("|".join(sorted(F"{x['role']}={entities.get(x['refid'])}" for x in relation['nodes'])))
+    return set(entities.values()), relations
+
+
+def get_agreement(reference, candidate):
+    """
+    Precision and recall of the candidate items, treating the reference items as the truth.
+    """
+    matched = len(reference & candidate)
+    return {"reference": len(reference), "candidate": len(candidate), "matched": matched,
+            "precision": matched / len(candidate) if candidate else None,
+            "recall": matched / len(reference) if reference else None}
+
+
+def run_benchmark(nlp, directory, gc_data, output_dir, limit=None, use_befree=True, study_items=None):
+    """
+    Process every study in the directory with a StageProfiler attached to the interpreter.
+    @param study_items: Dictionary to populate with the (entities, relations) keys of each study, if supplied
+    @return: Dictionary of benchmark results
+    """
+    profiler = StageProfiler()
+    nlp.profiler = profiler
+    for sub_dir in ["xml", "json"]:
+        os.makedirs(os.path.join(output_dir, sub_dir), exist_ok=True)
+
+    studies = []
+    token_count = 0
+    # Time spent keying the study items for comparison, which is excluded from the throughput measurements.
+    items_wall_seconds, items_cpu_seconds = 0.0, 0.0
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    for pmc_id in get_study_ids(directory, limit):
+        study_start = time.perf_counter()
+        result, study_tables, contains_annotations = process_gc_study(nlp, pmc_id, gc_data.get(pmc_id, []),
+                                                                      directory, output_dir, use_befree)
+        study_seconds = time.perf_counter() - study_start
+        if not result:
+            logger.warning(F"Benchmark unable to process {pmc_id}")
+            continue
+        studies.append({"pmc_id": pmc_id, "wall_seconds": study_seconds})
+        if study_items is not None:
+            items_start, items_cpu_start = time.perf_counter(), time.process_time()
+            study_items[pmc_id] = get_study_items(result)
+            items_wall_seconds += time.perf_counter() - items_start
+            items_cpu_seconds += time.process_time() - items_cpu_start
+    wall_seconds = time.perf_counter() - wall_start - items_wall_seconds
+    cpu_seconds = time.process_time() - cpu_start - items_cpu_seconds
+    nlp.profiler = None
+    # Tokenised after the timed window so that counting does not inflate the throughput measurements.
+    for study in studies:
+        study["tokens"] = count_study_tokens(nlp, directory, study["pmc_id"])
+        token_count += study["tokens"]
+
+    return {"documents": len(studies), "tokens": token_count, "wall_seconds": wall_seconds,
+            "cpu_seconds": cpu_seconds,
+            "docs_per_second": len(studies) / wall_seconds if wall_seconds else None,
+            "tokens_per_second": token_count / wall_seconds if wall_seconds else None,
+            "peak_rss_bytes": get_peak_rss_bytes(), "studies": studies, **profiler.metrics()}
+
+
+def run_table_benchmark(nlp, directory, limit=None):
+    """
+    Extract the annotations and relations of every *_tables.json file in the directory.
+    @return: Dictionary of benchmark results
+    """
+    profiler = StageProfiler()
+    nlp.profiler = profiler
+    file_names = sorted(x for x in os.listdir(directory) if x.endswith("_tables.json"))
+    if limit:
+        file_names = file_names[:limit]
+    table_count, row_count, annotation_count, relation_count = 0, 0, 0, 0
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    for file_name in file_names:
+        with profiler.document(file_name):
+            with profiler.stage("tables"):
+                tables_data, contains_annotations = TableExtractor.parse_tables(os.path.join(directory, file_name),
+                                                                                nlp)
+        if not tables_data:
+            continue
+        for table in tables_data["documents"]:
+            table_count += 1
+            row_count += sum(len(section["data_rows"]) for passage in table["passages"]
+                             for section in passage.get("data_section", []))
+            annotation_count += len(table.get("annotations") or [])
+            relation_count += len(table.get("relations") or [])
+    wall_seconds = time.perf_counter() - wall_start
+    cpu_seconds = time.process_time() - cpu_start
+    nlp.profiler = None
+    if not file_names:
+        logger.warning(F"No *_tables.json files found in {directory}")
+
+    return {"files": len(file_names), "tables": table_count, "rows": row_count, "annotations": annotation_count,
+            "relations": relation_count, "wall_seconds": wall_seconds, "cpu_seconds": cpu_seconds,
+            "tables_per_second": table_count / wall_seconds if wall_seconds else None,
+            "rows_per_second": row_count / wall_seconds if wall_seconds else None,
+            "peak_rss_bytes": get_peak_rss_bytes(), **profiler.metrics()}
+
+
+def compare_profiles(profiles, lexicon, args, gc_data, use_befree):
+    """
+    Benchmark each pipeline profile over the same studies, measuring the entities and relations found against those
+    of the accurate profile as a proxy for accuracy.
+    @return: Dictionary of profile name to benchmark results
+    """
+    profiles = [PROFILE_ACCURATE] + [x for x in profiles if x != PROFILE_ACCURATE]
+    results = {}
+    reference_items = None
+    for profile in profiles:
+        logger.info(F"Benchmarking {profile} pipeline profile")
+        nlp = GCInterpreter(lexicon, matcher_backend=args.matcher, prefilter_sentences=args.prefilter,
+                            profile=profile)
+        if args.doc_cache:
+            nlp.doc_cache = DocCache()
+        study_items = {}
+        with tempfile.TemporaryDirectory() as output_dir:
+            results[profile] = run_benchmark(nlp, args.docs, gc_data, output_dir, args.limit, use_befree,
+                                             study_items)
+        results[profile]["pipeline"] = nlp.profiles[profile].jsonable()
+        if reference_items is None:
+            reference_items = study_items
+        shared = [x for x in study_items if x in reference_items]
+        for i, item_type in enumerate(["entities", "relations"]):
+            reference = {F"{x}:{item}" for x in shared for item in reference_items[x][i]}
+            candidate = {F"{x}:{item}" for x in shared for item in study_items[x][i]}
+            results[profile][F"{item_type}_agreement"] = get_agreement(reference, candidate)
+        del nlp
+    return results
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='GWAS Miner pipeline benchmark')
+    parser.add_argument('-d', '--docs', type=str, default="BioC_Studies", help='Directory of BioC study JSON files.')
+    parser.add_argument('-g', '--gc_data', type=str, default="GC_content.tsv",
+                        help='GC curated relations TSV used to configure each study.')
+    parser.add_argument('-o', '--output', type=str, default="benchmark.json", help='JSON results file.')
+    parser.add_argument('-n', '--limit', type=int, help='Only process the first N studies.')
+    parser.add_argument('--doc_cache', action='store_true',
+                        help='Reuse parsed passages from earlier runs to benchmark the rule based stages alone.')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='Only dependency parse candidate association sentences.')
+    parser.add_argument('--matcher', type=str, default="phrase", choices=["phrase", "trie"],
+                        help='Ontology term matcher backend. Default = phrase.')
+    profiles = load_profiles()
+    parser.add_argument('--profile', type=str, default=PROFILE_ACCURATE, choices=list(profiles),
+                        help='spaCy pipeline profile to benchmark. Default = accurate.')
+    parser.add_argument('--compare_profiles', action='store_true',
+                        help='Benchmark every pipeline profile, reporting agreement with the accurate profile.')
+    parser.add_argument('--tables', action='store_true',
+                        help='Only benchmark table typing and row relation extraction on the *_tables.json files.')
+    args = parser.parse_args()
+
+    gc_data = {}
+    if os.path.isfile(args.gc_data):
+        gc_data = get_matching_data(args.gc_data, get_study_ids(args.docs))
+    else:
+        logger.warning(F"{args.gc_data} not found, studies will be processed without GC relations.")
+    use_befree = all(os.path.isfile(x) for x in BEFREE_FILES)
+    if not use_befree:
+        logger.warning("BeFree data files not found, the BeFree merge stage will be skipped.")
+
+    lexicon = Ontology.get_master_lexicon()
+    report = {"commit": get_commit_hash(), "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+              "matcher": args.matcher, "lexicon_version": lexicon.version, "befree": use_befree,
+              "doc_cache": args.doc_cache, "prefilter": args.prefilter}
+    if args.tables:
+        nlp = GCInterpreter(lexicon, matcher_backend=args.matcher, profile=args.profile)
+        report.update(run_table_benchmark(nlp, args.docs, args.limit))
+        with open(args.output, "w", encoding="utf-8") as fout:
+            json.dump(report, fout, indent=2)
+        print(F"{report['tables']} tables, {report['rows']} rows in {report['wall_seconds']:.2f}s "
+              F"({report['rows_per_second'] or 0:.1f} rows/sec), {report['annotations']} annotations, "
+              F"{report['relations']} relations")
+        return
+    if args.compare_profiles:
+        report["profiles"] = compare_profiles(profiles, lexicon, args, gc_data, use_befree)
+        with open(args.output, "w", encoding="utf-8") as fout:
+            json.dump(report, fout, indent=2)
+        for profile, results in report["profiles"].items():
+            entities, relations = results["entities_agreement"], results["relations_agreement"]
+            print(F"{profile}: {results['docs_per_second'] or 0:.3f} docs/sec, "
+                  F"{results['tokens_per_second'] or 0:.1f} tokens/sec, "
+                  F"entity precision {entities['precision'] or 0:.3f} recall {entities['recall'] or 0:.3f}, "
+                  F"relation precision {relations['precision'] or 0:.3f} recall {relations['recall'] or 0:.3f}")
+        return
+
+    nlp = GCInterpreter(lexicon, matcher_backend=args.matcher, prefilter_sentences=args.prefilter,
+                        profile=args.profile)
+    if args.doc_cache:
+        nlp.doc_cache = DocCache()
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = run_benchmark(nlp, args.docs, gc_data, output_dir, args.limit, use_befree)
+
+    report["profile"] = args.profile
+    report.update(results)
+    with open(args.output, "w", encoding="utf-8") as fout:
+        json.dump(report, fout, indent=2)
+
+    print(F"{report['documents']} documents, {report['tokens']} tokens in {report['wall_seconds']:.2f}s "
+          F"({report['docs_per_second'] or 0:.3f} docs/sec, {report['tokens_per_second'] or 0:.1f} tokens/sec), "
+          F"peak RSS {report['peak_rss_bytes'] / 1048576:.1f} MiB")
+    for stage, timing in sorted(report["stage_groups"].items(), key=lambda x: x[1]["wall_seconds"], reverse=True):
+        print(F"  {stage}: {timing['wall_seconds']:.3f}s wall, {timing['cpu_seconds']:.3f}s CPU")
+
+
+if __name__ == '__main__':
+    main()
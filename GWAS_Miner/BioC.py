@@ -1,5 +1,7 @@
 from datetime import datetime
 
+from PValue import get_significance_infons
+
 
 def convert_cell_to_annotation(doc, i, table_elem_id=None, table_cell_id=None):
     current_datetime = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -11,7 +13,8 @@ def convert_cell_to_annotation(doc, i, table_elem_id=None, table_cell_id=None):
         "offset": ent.start_char,
         "length": ent.end_char - ent.start_char,
         "table_element_id": table_elem_id,
-        "table_cell_id": table_cell_id
+        "table_cell_id": table_cell_id,
+        "p_value": ent._.p_value if ent.label_ == "PVAL" else None
     }
     loc = BioCLocation(offset=annot["offset"], length=annot["length"],
                        table_element=annot['table_element_id'], table_cell_id=annot['table_cell_id'])
@@ -32,7 +35,8 @@ def convert_cell_to_annotation(doc, i, table_elem_id=None, table_cell_id=None):
     elif "PVAL" in annot["entity_type"]:
         p_value = BioCAnnotation(id=F"S{i}", infons={"type": "significance", "identifier": annot["id"],
                                                      "annotator": "GWASMiner@le.ac.uk",
-                                                     "updated_at": current_datetime},
+                                                     "updated_at": current_datetime,
+                                                     **get_significance_infons(annot["p_value"])},
                                  locations=[loc], text=annot["text"])
         return p_value
     return None
@@ -49,7 +53,8 @@ def get_bioc_annotations(doc, used_annots, offset, t, m, p, r, table_elem_id=Non
             "offset": ent.start_char,
             "length": ent.end_char - ent.start_char,
             "table_element_id": table_elem_id,
-            "table_cell_id": table_cell_id
+            "table_cell_id": table_cell_id,
+            "p_value": ent._.p_value if ent.label_ == "PVAL" else None
         })
     if annotations:
         for annot in annotations:
@@ -74,7 +79,8 @@ def get_bioc_annotations(doc, used_annots, offset, t, m, p, r, table_elem_id=Non
             elif "PVAL" in annot["entity_type"]:
                 p_value = BioCAnnotation(id=F"S{p}", infons={"type": "significance", "identifier": annot["id"],
                                                              "annotator": "GWASMiner@le.ac.uk",
-                                                             "updated_at": current_datetime},
+                                                             "updated_at": current_datetime,
+                                                             **get_significance_infons(annot["p_value"])},
                                          locations=[loc], text=annot["text"])
                 used_annots.append(p_value)
                 p += 1
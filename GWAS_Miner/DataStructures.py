@@ -1,8 +1,27 @@
 import logging
+import math
 import re
 
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
 logger = logging.getLogger("GWAS Miner")
 
+# Table body cell patterns.
+RSID_PATTERN = re.compile(r"(?:rs[0-9]{1,}){1}", re.IGNORECASE)
+INTEGER_PATTERN = re.compile(r"(^[0-9]{1,}[ ]?$)", re.IGNORECASE)
+PVAL_PATTERN = re.compile(r"(\d+\.?\d?[ ]?[×xX*][ ]?\d+-\d[\(]?\d?[\)]?)|(\d\.\d+ ?)$", re.IGNORECASE)
+# Non-capturing copies for pandas string methods, which warn on every call given a pattern with capture groups.
+SERIES_INTEGER_PATTERN = re.compile(r"^[0-9]{1,}[ ]?$", re.IGNORECASE)
+SERIES_PVAL_PATTERN = re.compile(r"(?:\d+\.?\d?[ ]?[×xX*][ ]?\d+-\d[\(]?\d?[\)]?)|(?:\d\.\d+ ?)$", re.IGNORECASE)
+# Classifies every cell of a newline joined column in one pass, in the same order of precedence as the patterns above.
+CELL_TYPE_PATTERN = re.compile(r"^(?:(?P<rsid>.*?(?:rs[0-9]{1,}){1}.*)|(?P<integer>[0-9]{1,}[ ]?)"
+                               r"|(?P<pval>.*?(?:(?:\d+\.?\d?[ ]?[×xX*][ ]?\d+-\d[\(]?\d?[\)]?).*|(?:\d\.\d+ ?)))"
+                               r"|(?P<blank>[ ]*)|(?P<phenotype>.*))$", re.IGNORECASE | re.MULTILINE)
+CELL_TYPES = ["rsid", "integer", "pval", "blank", "phenotype"]
+
 
 def convert_to_list(num):
     result = []
@@ -150,6 +169,55 @@ class StudySection:
         return self.__weighting
 
 
+def is_blank(value):
+    return not value.replace(" ", "")
+
+
+def count_cell_types(values):
+    """
+    Classify each cell of a table column as an rsID, integer, p-value, blank or phenotype (any other text) value,
+    using pandas string methods over the whole column when available, otherwise a single regex pass over the joined
+    column.
+    @param values: List of cell strings
+    @return: Dictionary of cell type to the number of cells of that type.
+    """
+    if pandas is not None:
+        column = pandas.Series(values, dtype=object)
+        rsid = column.str.contains(RSID_PATTERN)
+        integer = ~rsid & column.str.fullmatch(SERIES_INTEGER_PATTERN)
+        pval = ~rsid & ~integer & column.str.contains(SERIES_PVAL_PATTERN)
+        blank = ~rsid & ~integer & ~pval & (column.str.replace(" ", "", regex=False) == "")
+        counts = {"rsid": int(rsid.sum()), "integer": int(integer.sum()), "pval": int(pval.sum()),
+                  "blank": int(blank.sum())}
+        counts["phenotype"] = len(values) - sum(counts.values())
+        return counts
+    counts = dict.fromkeys(CELL_TYPES, 0)
+    if not values:
+        return counts
+    text = "\n".join(x.replace("\n", " ").replace("\r", " ") for x in values)
+    for match in CELL_TYPE_PATTERN.finditer(text):
+        counts[match.lastgroup] += 1
+    return counts
+
+
+def forward_fill(values):
+    """
+    Fill blank cells with the closest non-blank value above them, for values stated once but shared by the following
+    rows (e.g. a phenotype spanning several markers). Leading blank cells are left unchanged.
+    @param values: List of cell strings
+    @return: Filled list of cell strings
+    """
+    filled = []
+    previous = None
+    for value in values:
+        if is_blank(value):
+            filled.append(previous if previous is not None else value)
+        else:
+            previous = value
+            filled.append(value)
+    return filled
+
+
 class TableSection:
     def __init__(self, table_section):
         self.name = table_section["section_name"]
@@ -174,6 +242,7 @@ class Table:
         self.rows = self.__get_rows()
         self.columns = [x for x in self.data["columns"]]
         self.target_indexes = None
+        self.__body_columns = None
         self.__text = self.__convert_to_text()
 
     def __get_rows(self):
@@ -183,6 +252,16 @@ class Table:
                 rows.append(row)
         return rows
 
+    def get_body_columns(self):
+        """
+        Column oriented copy of the body rows, built on first use. Cells missing from short rows are blank.
+        @return: List of columns, each a list of cell strings
+        """
+        if self.__body_columns is None:
+            self.__body_columns = [[str(row[i]) if i < len(row) else "" for row in self.rows]
+                                   for i in range(len(self.columns))]
+        return self.__body_columns
+
     def set_targets(self, targets):
         """
         Set target headers for this table instance
@@ -199,28 +278,16 @@ class Table:
         data = [x for x in [i for i in self.columns] if x]
         if not data:
             return valuable_fields
+        body_columns = self.get_body_columns()
         for i in range(len(self.columns)):
             if self.columns[i] == '' or self.columns[i].count(self.columns[i][0]) == len(self.columns[i]):
                 continue
             #  Test each body cell value in column
-            rsid_count = 0  # Contains RSID, should be a marker column.
-            phenotype_count = 0  # High chance of being a phenotype descriptor of some sort.
-            integer_count = 0  # Likely to be a quantity or other non-desirable value
-            p_val_count = 0  # Likely to contain a p-value
-            blank_cells = 0
-            for o in range(value_test_count):
-                cell_value = str(self.rows[o][i])
-                if re.search(r"(?:rs[0-9]{1,}){1}", cell_value, re.IGNORECASE):
-                    rsid_count += 1
-                elif re.fullmatch(r"(^[0-9]{1,}[ ]?$)", cell_value, re.IGNORECASE):
-                    integer_count += 1
-                elif re.search(r"(\d+\.?\d?[ ]?[×xX*][ ]?\d+-\d[\(]?\d?[\)]?)|(\d\.\d+ ?)$",
-                               cell_value, re.IGNORECASE):
-                    p_val_count += 1
-                elif not cell_value.replace(" ", ""):
-                    blank_cells += 1
-                else:
-                    phenotype_count += 1
+            counts = count_cell_types(body_columns[i])
+            rsid_count = counts["rsid"]  # Contains RSID, should be a marker column.
+            phenotype_count = counts["phenotype"]  # High chance of being a phenotype descriptor of some sort.
+            p_val_count = counts["pval"]  # Likely to contain a p-value
+            blank_cells = counts["blank"]
             tested_cells = value_test_count - blank_cells
             is_rsid = False
             is_phenotype = False
@@ -258,8 +325,7 @@ class Table:
 
     @staticmethod
     def __strip_pval(text):
-        match = re.search(r"(\d+\.?\d?[ ]?[×xX*][ ]?\d+-\d[\(]?\d?[\)]?)|(\d\.\d+ ?)$", text,
-                          re.IGNORECASE)
+        match = PVAL_PATTERN.search(text)
         if match:
             return match.group()
         else:
@@ -267,7 +333,7 @@ class Table:
 
     @staticmethod
     def __strip_rsid(text):
-        match = re.search(r"(?:rs[0-9]{1,}){1}", text, re.IGNORECASE)
+        match = RSID_PATTERN.search(text)
         if match:
             return match.group()
         else:
@@ -281,22 +347,16 @@ class Table:
         table_targets = self.__get_table_column_types()
         if not table_targets:
             return
+        body_columns = self.get_body_columns()
+        phenotypes = None
+        if table_targets["Phenotypes"]:
+            # Phenotypes can be stated once but used for multiple rows.
+            phenotypes = forward_fill(body_columns[table_targets["Phenotypes"][0][0]])
         for i in range(len(self.rows)):
             new_marker = Marker()
             is_marker_added = False
-            if table_targets["Phenotypes"]:
-                pheno_val = self.rows[i][table_targets["Phenotypes"][0][0]]
-                if not pheno_val.replace(" ", ""):
-                    back_counter = i
-                    while back_counter >= 0:  # Phenotypes can be stated once but used for multiple rows.
-                        prev_val = self.rows[back_counter][table_targets["Phenotypes"][0][0]].replace(" ", "")
-                        if not prev_val:
-                            back_counter -= 1
-                            continue
-                        else:
-                            pheno_val = self.rows[back_counter][table_targets["Phenotypes"][0][0]]
-                            break
-                new_marker.phenotype = pheno_val
+            if phenotypes:
+                new_marker.phenotype = phenotypes[i]
             if table_targets["GEE"]:
                 if len(table_targets["GEE"]) > 1:
                     for entry in table_targets["GEE"]:
@@ -388,8 +448,11 @@ class Marker:
 
 
 class Significance:
-    def __init__(self, token):
+    def __init__(self, token, value=None):
         self.token = token
+        # P-value parsed when the PVAL entity was recognised, and its log10, or None if it could not be parsed.
+        self.value = value if value is not None else token._.p_value
+        self.log10 = math.log10(self.value) if self.value and self.value > 0 else None
 
 
 
@@ -504,6 +567,7 @@ class MasterLexicon:
     def __init__(self):
         self.__lexicons = []
         self.__priority_order = {}
+        self.version = None
 
     def add_lexicon(self, new_lexicon):
         if isinstance(new_lexicon, Lexicon):
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import os
+import sqlite3
+
+from spacy.tokens import DocBin
+
+logger = logging.getLogger("GWAS Miner")
+
+DOC_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "cache", "docs.db")
+
+# Increment when the stored Doc layout changes.
+FORMAT_VERSION = 1
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS docs (key TEXT PRIMARY KEY, data BLOB NOT NULL);
+"""
+
+
+class DocCache:
+    """
+    Store of parsed spaCy Docs keyed on the passage text and the pipeline that parsed it.
+
+    Only the output of the statistical pipeline (tokenizer, tagger, parser) is cached, rule based entity matching is
+    replayed on the deserialised Doc so that changes to patterns and matchers take effect without re-parsing.
+    """
+
+    def __init__(self, path=DOC_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.__connection = None
+        self.__connection_pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_DocCache__connection"] = None
+        state["_DocCache__connection_pid"] = None
+        return state
+
+    def connection(self):
+        """
+        Retrieve the connection for the current process, reopening it after a fork.
+        """
+        if self.__connection is None or self.__connection_pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.__connection = sqlite3.connect(self.path, timeout=60)
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.executescript(SCHEMA)
+            self.__connection_pid = os.getpid()
+        return self.__connection
+
+    def close(self):
+        if self.__connection is not None and self.__connection_pid == os.getpid():
+            self.__connection.close()
+        self.__connection = None
+        self.__connection_pid = None
+
+    @staticmethod
+    def get_pipeline_signature(nlp):
+        """
+        Identify the model and pipeline configuration which produced a Doc.
+        @param nlp: spaCy Language object
+        @return: String describing the model name, version and pipeline components.
+        """
+        return F"{FORMAT_VERSION}|{nlp.meta.get('name')}|{nlp.meta.get('version')}|{','.join(nlp.pipe_names)}"
+
+    @staticmethod
+    def get_key(text, pipeline_signature):
+        return hashlib.sha256(F"{pipeline_signature}\n{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text, nlp, pipeline_signature=None):
+        """
+        Retrieve the cached parse of a passage.
+        @param text: Passage text
+        @param nlp: spaCy Language object whose vocab the Doc is loaded into
+        @param pipeline_signature: Pipeline signature, calculated from nlp if not supplied
+        @return: Doc object or None if not cached.
+        """
+        key = self.get_key(text, pipeline_signature or self.get_pipeline_signature(nlp))
+        row = self.connection().execute("SELECT data FROM docs WHERE key = ?", (key,)).fetchone()
+        if not row:
+            self.misses += 1
+            return None
+        try:
+            doc = next(DocBin().from_bytes(row[0]).get_docs(nlp.vocab))
+        except (ValueError, StopIteration) as e:
+            logger.warning(F"Discarding unreadable cached Doc {key}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return doc
+
+    def put(self, text, doc, nlp, pipeline_signature=None):
+        key = self.get_key(text, pipeline_signature or self.get_pipeline_signature(nlp))
+        doc_bin = DocBin(store_user_data=False)
+        doc_bin.add(doc)
+        connection = self.connection()
+        connection.execute("INSERT OR REPLACE INTO docs (key, data) VALUES (?, ?)", (key, doc_bin.to_bytes()))
+        connection.commit()
@@ -2,13 +2,16 @@ import json
 from datetime import datetime
 
 import BioC
-from TableExtractor import Table, get_cell_entity_annotation, TableRow, TableSection, TableCell, TablePassage
+from TableExtractor import Table, get_cell_entity_annotation, TableRow, TableSection, TableCell, TablePassage, \
+    triage_table
 
 table_significance_pattern = r""
 
 
-def process_tables(nlp, tables):
+def process_tables(nlp, tables, triage=True):
     for table in tables:
+        if triage and not triage_table(nlp, table):
+            continue
         nlp = table.add_spacy_docs(nlp)
         if table.table_type:
             nlp = table.get_gc_annotations(nlp)
@@ -19,7 +22,7 @@ def process_tables(nlp, tables):
     return tables, nlp
 
 
-def parse_tables(file_input, nlp):
+def parse_tables(file_input, nlp, triage=True):
     tables = []
     tables_data = None
     contains_annotations = False
@@ -80,7 +83,7 @@ def parse_tables(file_input, nlp):
     except IOError:
         print(F"No tables file found for {file_input.replace('_tables.json', '')}")
     if tables_data:
-        annotated_tables, nlp = process_tables(nlp, tables)
+        annotated_tables, nlp = process_tables(nlp, tables, triage)
         for table in annotated_tables:
             if table.annotations:
                 contains_annotations = True
@@ -5,26 +5,74 @@ from os import listdir
 from os.path import isfile, join
 
 import networkx as nx
-from spacy.matcher import PhraseMatcher
 from spacy.tokens import Span, Token
 
 import Ontology
-from GWAS_Miner import BioC, OutputConverter, Experimental, befree_annotate, GCTableExtractor, TableExtractor, \
-    DataStructures
+from DocCache import DocCache
+from OutputWriter import OutputWriter
+from PipelineProfiles import load_profiles, PROFILE_ACCURATE
+from Profiling import profile_stage, profile_document
+from PValue import PVALUE_REGEX, PValueIndex, PValueInterval, get_match_value, get_significance_infons, pvalue_pattern
+from ResultCache import ResultCache
+from GWAS_Miner import BioC, OutputConverter, Experimental, befree_annotate, GCTableExtractor, TableExtractor
 from GWAS_Miner.DataStructures import Marker, Significance, Phenotype, Association
-from GWAS_Miner.befree_annotate import get_befree_annotations
 from NLP import Interpreter
 
+# Study processing times at or above this are reported separately rather than included in the average.
+STUDY_TIME_OUTLIER_SECONDS = 600
+
+
+class GCRelationIndex:
+    """
+    GC curated relations of a study indexed by marker, with the p-value interval of each relation parsed once, so
+    that a p-value is only compared with the relations of the markers actually present alongside it.
+    """
+
+    def __init__(self, relations):
+        """
+        @param relations: List of [p-value, marker, MeSH ID] lists
+        """
+        self.__markers = {}
+        intervals = []
+        for i, (p_value, marker, mesh_id) in enumerate(relations):
+            interval = PValueInterval(p_value)
+            intervals.append(interval)
+            self.__markers.setdefault(marker, []).append((i, interval, mesh_id))
+        self.p_values = PValueIndex(intervals)
+
+    def get_relations(self, markers):
+        """
+        @param markers: Iterable of marker texts, e.g. the markers of a sentence
+        @return: List of (p-value interval, marker, MeSH ID) tuples for the relations of the given markers, in the
+        order the relations were curated.
+        """
+        relations = []
+        for marker in set(markers):
+            relations.extend((x[0], x[1], marker, x[2]) for x in self.__markers.get(marker, []))
+        relations.sort(key=lambda x: x[0])
+        return [x[1:] for x in relations]
+
 
 class GCInterpreter(Interpreter):
 
-    def __init__(self, lexicon, ontology_only=False):
-        super().__init__(lexicon, ontology_only)
+    def __init__(self, lexicon, ontology_only=False, matcher_backend=Interpreter.MATCHER_PHRASE,
+                 prefilter_sentences=False, profile=PROFILE_ACCURATE):
+        super().__init__(lexicon, ontology_only, matcher_backend, prefilter_sentences, profile)
+        self.gc_relation_index = None
         self.gc_relations = []
 
+    @property
+    def gc_relations(self):
+        return self.__gc_relations
+
+    @gc_relations.setter
+    def gc_relations(self, relations):
+        self.__gc_relations = relations
+        self.gc_relation_index = GCRelationIndex(relations)
+
     def set_ontology_terms(self, term_ids):
         term_ids = list(set(term_ids))
-        new_matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        new_matcher = self.create_ontology_matcher()
         for lexicon in self.lexicon.get_ordered_lexicons():
             if lexicon.name == "HPO":
                 continue
@@ -38,39 +86,56 @@ class GCInterpreter(Interpreter):
                 new_matcher.add(entry.identifier, patterns, on_match=self._Interpreter__on_match)
         self.__phrase_matcher = new_matcher
 
-    def process_corpus(self, corpus, **kwargs):
+    def get_candidate_patterns(self):
+        return {"RSID": self.rsid_patterns, "PVAL": [PVALUE_REGEX] if self.gc_relation_index.p_values else []}
+
+    def is_curated_p_value(self, match):
+        """
+        @param match: Match of pvalue_pattern
+        @return: True if the matched p-value is within the interval of a curated p-value of the study.
+        """
+        return self.gc_relation_index.p_values.contains(get_match_value(match))
+
+    def process_corpus(self, corpus, parse=True, profile=None, **kwargs):
         """[Applies tokenization, entity recognition and dependency parsing to the supplied corpus.]
 
         Args:
             corpus ([string]): [corpus text for information extraction]
+            parse (bool, optional): [Apply the statistical pipeline, otherwise only tokenize and sentence split the
+            corpus prior to entity matching]. Defaults to True.
+            profile (str, optional): [Pipeline profile to apply]. Defaults to the Interpreter's profile.
 
         Returns: [SpaCy doc object]: [Parsed SpaCy doc object containing the processed input text with entities,
         tokens and dependencies.]
         """
 
-        doc = self.nlp(corpus)
+        pipeline = self.get_pipeline(profile) if parse else None
+        with profile_stage(self.profiler, "parse" if pipeline else "parse/tokenize"):
+            doc = self.parse(corpus, pipeline) if pipeline else self.tokenize(corpus)
         doc.user_data["relations"] = {"PHENO_ASSOC": []}
 
         old_ents, doc.ents = doc.ents, []
-        for pattern in self.pval_patterns:
-            Interpreter._regex_match(pattern, doc, "PVAL")
+        if self.gc_relation_index.p_values:
+            self._profiled_regex_match(pvalue_pattern, doc, "PVAL", select=self.is_curated_p_value)
 
         for pattern in self.rsid_patterns:
-            Interpreter._regex_match(pattern, doc, "RSID")
+            self._profiled_regex_match(pattern, doc, "RSID")
 
         for pattern in self.abbrev_pattens:
-            Interpreter._regex_match(pattern[1], doc, pattern[0], ignore_case=False)
+            self._profiled_regex_match(pattern[1], doc, pattern[0], ignore_case=False)
 
-        # self.__basic_matcher(doc)
-        self.__phrase_matcher(doc)
+        with profile_stage(self.profiler, "matcher/phrase"):
+            # self.__basic_matcher(doc)
+            self.__phrase_matcher(doc)
 
-        # Ensure that rule-matched entities override data model entities when needed.
-        for ent in old_ents:
-            doc.ents += (ent,)
+        with profile_stage(self.profiler, "merge/model_entities"):
+            # Ensure that rule-matched entities override data model entities when needed.
+            for ent in old_ents:
+                doc.ents += (ent,)
 
         # Ensure that multi-token entities are merged for extraction and association processing.
         for ent_label in self._Interpreter__entity_labels:
-            self._Interpreter__merge_spans(doc, ent_label)
+            self._profiled_merge_spans(doc, ent_label)
 
         return doc
 
@@ -115,13 +180,16 @@ class GCInterpreter(Interpreter):
 
             relations = []
 
+            sent_relations = self.gc_relation_index.get_relations(x[0].text for x in markers) if markers else []
+
             if phenotypes and markers and pvals:
                 for pval in pvals:
-                    for s, m, p in self.gc_relations:
+                    value = pval[0]._.p_value
+                    for interval, m, p in sent_relations:
                         significance = None
                         marker = None
                         phenotype = None
-                        if re.search(s, pval[0].text, flags=re.IGNORECASE):
+                        if interval.contains(value):
                             significance = pval[1]
                             marker = next((x[1] for x in markers if x[0].text == m), None)
 
@@ -171,11 +239,12 @@ class GCInterpreter(Interpreter):
                         Association(marker=result_marker, significance=result_significance, phenotype=result_pheno))
             elif top_phenotype and markers and pvals:
                 for pval in pvals:
-                    for s, m, p in self.gc_relations:
+                    value = pval[0]._.p_value
+                    for interval, m, p in sent_relations:
                         significance = None
                         marker = None
                         phenotype = top_phenotype
-                        if re.search(s, pval[0].text) and top_phenotype["ID"] == p:
+                        if top_phenotype["ID"] == p and interval.contains(value):
                             significance = pval[1]
                             marker = next((x[1] for x in markers if x[0].text == m), None)
                             phenotype = next((x for x in sent.doc.ents if x.label_ == phenotype["ID"]), None)
@@ -197,18 +266,19 @@ class GCInterpreter(Interpreter):
         return results
 
 
-def get_relation(relation, passage, nlp):
+def get_relation(relation, passage, nlp, segment_offset=0):
     current_datetime = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+    offset = passage["offset"] + segment_offset
     if type(relation.phenotype.token) == Token:
         pheno_id = [x.id for x in passage['annotations'] if
-                    relation.phenotype.token.idx + passage["offset"] == x.locations[0].offset][0]
+                    relation.phenotype.token.idx + offset == x.locations[0].offset][0]
     else:
         pheno_id = [x.id for x in passage['annotations'] if
-                    relation.phenotype.token.start_char + passage["offset"] == x.locations[0].offset][0]
+                    relation.phenotype.token.start_char + offset == x.locations[0].offset][0]
     marker_id = [x.id for x in passage['annotations'] if
-                 relation.marker.token.idx + passage["offset"] == x.locations[0].offset][0]
+                 relation.marker.token.idx + offset == x.locations[0].offset][0]
     significance_id = [x.id for x in passage['annotations'] if
-                       relation.significance.token.idx + passage["offset"] == x.locations[0].offset][0]
+                       relation.significance.token.idx + offset == x.locations[0].offset][0]
     phenotype_node = BioC.BioCNode(refid=pheno_id, role="")
     marker_node = BioC.BioCNode(refid=marker_id, role="")
     significance_node = BioC.BioCNode(refid=significance_id, role="")
@@ -219,9 +289,21 @@ def get_relation(relation, passage, nlp):
     return bioc_relation, nlp
 
 
-def process_study(nlp, study):
+def process_study(nlp, study, output_dir="output", use_befree=True, result_cache=None, output_writer=None):
     if not study:
         return False
+    cache_key = None
+    if result_cache:
+        cache_key = result_cache.get_key(study, nlp.lexicon.version,
+                                         {"pipeline": "GC", "matcher": nlp.matcher_backend, "befree": use_befree,
+                                          "prefilter": nlp.prefilter_sentences, "profile": nlp.profile,
+                                          "gc_relations": nlp.gc_relations, "rsid_patterns": nlp.rsid_patterns,
+                                          "max_p_value": nlp.max_p_value,
+                                          "abbreviations": nlp.abbrev_pattens})
+        cached_study = result_cache.get(cache_key)
+        if cached_study:
+            submit_output(output_writer, cached_study, output_dir)
+            return cached_study, nlp
     current_datetime = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
     document_relations = []
     results_present = False
@@ -236,91 +318,95 @@ def process_study(nlp, study):
                                                                                  "caption"]:
             continue
         passage_text = passage['text']
-        doc = nlp.process_corpus(passage_text)
-        top_phenotype = nlp.get_ubiquitous_phenotype(passage_text, nlp)
-        doc.user_data["top_phenotype"] = top_phenotype
-        annotations = nlp.get_entities(doc)
-        used_annots = []
-        if annotations:
-            for annot in annotations:
-                loc = BioC.BioCLocation(offset=annot["offset"] + passage["offset"], length=annot["length"])
-                if "RSID" not in annot["entity_type"] and "PVAL" not in annot["entity_type"] \
-                        and "GENE" not in annot["entity_type"]:
-                    genomic_trait = BioC.BioCAnnotation(id=F"T{nlp.t}",
-                                                        infons={"type": "trait", "identifier": F"MeSH:{annot['id']}",
-                                                                "annotator": "GWASMiner@le.ac.uk",
-                                                                "updated_at": current_datetime},
-                                                        locations=[loc], text=annot["text"])
-                    passage['annotations'].append(genomic_trait)
-                    nlp.t += 1
-                elif "RSID" in annot["entity_type"]:
-                    marker_identifier = BioC.BioCAnnotation(id=F"V{nlp.v}",
-                                                            infons={"type": "genetic_variant",
-                                                                    "identifier": F"dbSNP:{annot['text']}",
+        # Candidate sentences are parsed separately from the remainder of the passage when pre-filtering.
+        segments = nlp.process_passage(passage_text)
+        top_phenotype = nlp.get_top_phenotype([x for _, x in segments], nlp.lexicon)
+        for segment_offset, doc in segments:
+            doc.user_data["top_phenotype"] = top_phenotype
+            annotations = nlp.get_entities(doc)
+            used_annots = []
+            if annotations:
+                for annot in annotations:
+                    loc = BioC.BioCLocation(offset=annot["offset"] + segment_offset + passage["offset"],
+                                              length=annot["length"])
+                    if "RSID" not in annot["entity_type"] and "PVAL" not in annot["entity_type"] \
+                            and "GENE" not in annot["entity_type"]:
+                        genomic_trait = BioC.BioCAnnotation(id=F"T{nlp.t}",
+                                                            infons={"type": "trait",
+                                                                    "identifier": F"MeSH:{annot['id']}",
                                                                     "annotator": "GWASMiner@le.ac.uk",
                                                                     "updated_at": current_datetime},
                                                             locations=[loc], text=annot["text"])
-                    passage['annotations'].append(marker_identifier)
-                    nlp.v += 1
-                elif "PVAL" in annot["entity_type"]:
-                    p_value = BioC.BioCAnnotation(id=F"S{nlp.s}",
-                                                  infons={"type": "significance", "identifier": "PVAL",
-                                                          "annotator": "GWASMiner@le.ac.uk",
-                                                          "updated_at": current_datetime},
-                                                  locations=[loc], text=annot["text"])
-                    passage['annotations'].append(p_value)
-                    nlp.s += 1
-                elif "GENE" in annot["entity_type"]:
-                    gene = BioC.BioCAnnotation(id=F"G{nlp.g}",
-                                               infons={"type": "gene", "identifier": F"Entrez:{annot['id']}",
-                                                       "annotator": "GWASMiner@le.ac.uk",
-                                                       "updated_at": current_datetime},
-                                               locations=[loc], text=annot["text"])
-                    passage['annotations'].append(gene)
-                    nlp.g += 1
-                used_annots.append(annot["text"])
-
-            relations, uncertain_relations = nlp.extract_phenotypes(doc)
-            if relations:
-                relations = validate_relations(nlp, relations)
-            if uncertain_relations:
-                uncertain_relations = validate_relations(nlp, uncertain_relations)
-            for relation in relations:
-                bioc_relation, nlp = get_relation(relation, passage, nlp)
-                document_relations.append(bioc_relation)
-                nlp.r += 1
-            for relation in uncertain_relations:
-                bioc_relation, nlp = get_relation(relation, passage, nlp)
-                document_relations.append(bioc_relation)
-                nlp.r += 1
+                        passage['annotations'].append(genomic_trait)
+                        nlp.t += 1
+                    elif "RSID" in annot["entity_type"]:
+                        marker_identifier = BioC.BioCAnnotation(id=F"V{nlp.v}",
+                                                                infons={"type": "genetic_variant",
+                                                                        "identifier": F"dbSNP:{annot['text']}",
+                                                                        "annotator": "GWASMiner@le.ac.uk",
+                                                                        "updated_at": current_datetime},
+                                                                locations=[loc], text=annot["text"])
+                        passage['annotations'].append(marker_identifier)
+                        nlp.v += 1
+                    elif "PVAL" in annot["entity_type"]:
+                        p_value = BioC.BioCAnnotation(id=F"S{nlp.s}",
+                                                      infons={"type": "significance", "identifier": "PVAL",
+                                                              "annotator": "GWASMiner@le.ac.uk",
+                                                              "updated_at": current_datetime,
+                                                              **get_significance_infons(annot["p_value"])},
+                                                      locations=[loc], text=annot["text"])
+                        passage['annotations'].append(p_value)
+                        nlp.s += 1
+                    elif "GENE" in annot["entity_type"]:
+                        gene = BioC.BioCAnnotation(id=F"G{nlp.g}",
+                                                   infons={"type": "gene", "identifier": F"Entrez:{annot['id']}",
+                                                           "annotator": "GWASMiner@le.ac.uk",
+                                                           "updated_at": current_datetime},
+                                                   locations=[loc], text=annot["text"])
+                        passage['annotations'].append(gene)
+                        nlp.g += 1
+                    used_annots.append(annot["text"])
+
+                with profile_stage(nlp.profiler, "sdp"):
+                    relations, uncertain_relations = nlp.extract_phenotypes(doc)
+                    if relations:
+                        relations = validate_relations(nlp, relations)
+                    if uncertain_relations:
+                        uncertain_relations = validate_relations(nlp, uncertain_relations)
+                for relation in relations:
+                    bioc_relation, nlp = get_relation(relation, passage, nlp, segment_offset)
+                    document_relations.append(bioc_relation)
+                    nlp.r += 1
+                for relation in uncertain_relations:
+                    bioc_relation, nlp = get_relation(relation, passage, nlp, segment_offset)
+                    document_relations.append(bioc_relation)
+                    nlp.r += 1
     if document_relations:
         study['documents'][0]['relations'] = document_relations
-    study, nlp = befree_annotate.get_befree_annotations(study, nlp, current_datetime)
-    OutputConverter.output_xml(json.dumps(study, default=BioC.ComplexHandler),
-                               F"output/xml/PMC{study['documents'][0]['id']}_result.xml")
-    OutputConverter.convert_xml_to_json(F"output/xml/PMC{study['documents'][0]['id']}_result.xml",
-                                        F"output/json/PMC{study['documents'][0]['id']}_result.json")
+    if use_befree:
+        with profile_stage(nlp.profiler, "befree"):
+            study, nlp = befree_annotate.get_befree_annotations(study, nlp, current_datetime)
+    if result_cache:
+        result_cache.put(cache_key, study, default=BioC.ComplexHandler)
+    with profile_stage(nlp.profiler, "output"):
+        submit_output(output_writer, study, output_dir)
     return study, nlp
 
 
-def generate_pval_regex_strings(input_string: str) -> str:
-    if "." in input_string:
-        pval_input_int = int(input_string[:input_string.find(".")])
+def output_study(study, output_dir="output"):
+    OutputConverter.output_study(json.dumps(study, default=BioC.ComplexHandler),
+                                 F"{output_dir}/xml/PMC{study['documents'][0]['id']}_result.xml",
+                                 F"{output_dir}/json/PMC{study['documents'][0]['id']}_result.json")
+
+
+def submit_output(output_writer, study, output_dir="output"):
+    """
+    Write the study output on the background writer if one is supplied, otherwise immediately.
+    """
+    if output_writer:
+        output_writer.submit(F"PMC{study['documents'][0]['id']}", output_study, study, output_dir)
     else:
-        pval_input_int = int(input_string[:input_string.lower().find("e")])
-    pval_input_range = F"{pval_input_int - 1}{pval_input_int}{pval_input_int + 1}"
-    power_digits = input_string[input_string.find('-') + 1:]
-    pval = [F"([{pval_input_range}][ \.0-9]*[ xX*×]*10 ?(<sup>)?[-−] ?"
-            F"{power_digits[0] + '?' if power_digits[0] == '0' else power_digits[0]}"
-            F"{power_digits[1:] + '(</sup>)?)' if len(power_digits) > 1 else '(</sup>)?)'}",
-            F"([{pval_input_range}][ \.0-9]*E ?(<sup>)?[-−] ?"
-            F"{power_digits[0] + '?' if power_digits[0] == '0' else power_digits[0]}"
-            F"{power_digits[1:] + '(</sup>)?)' if len(power_digits) > 1 else '(</sup>)?)'}",
-            F"(?:[pP][- \(\)metavalueofcbind]" + "{0,13}"
-            + F"[ =<of]*[ ]?)([{pval_input_range}][ \.0-9]*[ xX*×]*10 ?[-−] ?"
-              F"{power_digits[0] + '?' if power_digits[0] == '0' else power_digits[0]}"
-              F"{power_digits[1:] + ')' if len(power_digits) > 1 else ')'}"]
-    return pval
+        output_study(study, output_dir)
 
 
 def get_matching_data(input_file: str, bioc_pmcids: list, headers_skipped=False) -> dict:
@@ -347,18 +433,88 @@ def validate_relations(nlp, relations):
         pval = relation.significance
         phenotype = relation.phenotype
         # above are mismatched!
-        for gc_relation in nlp.gc_relations:
-            if (marker and (marker.token.text == gc_relation[1])) or (gene and (gene.token.text == gc_relation[1])):
-                phenotype_text = phenotype.token.ent_type_ if type(phenotype.token) != Span else \
-                    phenotype.token.ents[0].label_
-                if re.match(gc_relation[0], pval.token.text) and phenotype_text == gc_relation[2]:
-                    new_relations.append(relation)
-                    break
+        relation_markers = [x.token.text for x in (marker, gene) if x]
+        value = pval.value
+        for interval, m, p in nlp.gc_relation_index.get_relations(relation_markers):
+            phenotype_text = phenotype.token.ent_type_ if type(phenotype.token) != Span else \
+                phenotype.token.ents[0].label_
+            if interval.contains(value) and phenotype_text == p:
+                new_relations.append(relation)
+                break
 
     return new_relations
 
 
+def set_study_relations(nlp, relations):
+    """
+    Configure the interpreter with the GC curated relations of a single study.
+    @param nlp: GCInterpreter object
+    @param relations: List of [rsid, p-value, MeSH ID] lists for the study
+    """
+    rsids = []
+    mesh_terms = []
+    gc_relations = []
+    nlp.reset_annotation_identifiers()
+    for relation in relations:
+        rsid = relation[0]
+        mesh_id = relation[2]
+        rsids.append(F"({rsid})") #(?:\[[a-zA-Z0-9]\])?")
+        mesh_terms.append(mesh_id)
+        gc_relations.append([relation[1], rsid, mesh_id])
+    nlp.set_ontology_terms([x for x in mesh_terms if x])
+    nlp.rsid_patterns = rsids
+    nlp.gc_relations = gc_relations
+
+
+def process_gc_study(nlp, pmc_id, relations, directory="BioC_Studies", output_dir="output", use_befree=True,
+                     result_cache=None, output_writer=None):
+    """
+    Annotate a single BioC study and its tables using its GC curated relations.
+    @return: Tuple of the annotated study (or None if it could not be loaded), table data and whether the tables
+    contain annotations.
+    """
+    with profile_document(nlp.profiler, pmc_id):
+        set_study_relations(nlp, relations)
+
+        study = Experimental.load_bioc_study(directory, F"{pmc_id}.json")
+        if not study:
+            return None, None, False
+
+        with profile_stage(nlp.profiler, "abbreviations"):
+            fulltext = "\n".join([x['text'] for x in study['documents'][0]['passages']])
+            altered_text = re.sub(r"(?:\w)(\()", lambda x: x.group().replace("(", " ("), fulltext)
+
+            abbreviations = nlp.get_all_abbreviations(altered_text)
+            file_abbrevs = nlp.get_study_abbreviations(F"{directory}/{pmc_id}_abbreviations.json")
+            if file_abbrevs:
+                abbreviations += file_abbrevs
+            nlp.set_abbreviations(abbreviations)  # TODO: Check abbreviation partial entity HPC.
+
+        result, nlp = process_study(nlp, study, output_dir, use_befree, result_cache, output_writer)
+        nlp.clear_saved_study_data()
+
+        with profile_stage(nlp.profiler, "tables"):
+            study_tables, contains_annotations = GCTableExtractor.parse_tables(F"{directory}/{pmc_id}_tables.json", nlp)
+    return result, study_tables, contains_annotations
+
+
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='GC relation tagging of BioC studies')
+    parser.add_argument('--no_cache', action='store_true', help='Process every study rather than reusing cached '
+                                                                'results for unchanged studies.')
+    parser.add_argument('--doc_cache', action='store_true', help='Reuse parsed passages from earlier runs, only '
+                                                                 'replaying entity matching and relation extraction.')
+    parser.add_argument('--prefilter', action='store_true', help='Only dependency parse sentences matching a GC '
+                                                                 'relation rsID and p-value.')
+    parser.add_argument('--profile', type=str, default=PROFILE_ACCURATE, choices=list(load_profiles()),
+                        help='spaCy pipeline profile from settings/config.ini used for study passages. '
+                             'Default = accurate.')
+    parser.add_argument('--max_p', type=float, help='Only extract p-values at or below this threshold, e.g. 5e-8 for '
+                                                    'genome-wide significance. Defaults to max_p_value in config.py.')
+    args = parser.parse_args()
+    result_cache = None if args.no_cache else ResultCache()
+
     # load bioc pmc ids
     bioc_pmcids = [x.replace(".json", "").replace("_abbreviations", "") for x in listdir("BioC_Studies") if
                    isfile(join("BioC_Studies", x))]
@@ -367,57 +523,32 @@ def main():
     gc_data = get_matching_data("GC_content.tsv", bioc_pmcids)
 
     lexicon = Ontology.get_master_lexicon()
-    nlp = GCInterpreter(lexicon)
+    nlp = GCInterpreter(lexicon, prefilter_sentences=args.prefilter, profile=args.profile)
+    if args.max_p is not None:
+        nlp.max_p_value = args.max_p
+    if args.doc_cache:
+        nlp.doc_cache = DocCache()
     failed_documents = []
     study_processing_times = []
-    for pmc_id in gc_data.keys():
-        # if pmc_id != "PMC5536245":
-        #     continue
-        start_time = datetime.now()
-        pvals = []
-        rsids = []
-        mesh_terms = []
-        gc_relations = []
-        nlp.reset_annotation_identifiers()
-        for relation in gc_data[pmc_id]:
-            rsid = relation[0]
-            mesh_id = relation[2]
-            new_pvals = generate_pval_regex_strings(relation[1])
-            pvals.extend(new_pvals)
-            rsids.append(F"({rsid})") #(?:\[[a-zA-Z0-9]\])?")
-            mesh_terms.append(mesh_id)
-            for x in new_pvals:
-                gc_relations.append([x, rsid, mesh_id])
-        nlp.set_ontology_terms([x for x in mesh_terms if x])
-        nlp.pval_patterns = pvals
-        nlp.rsid_patterns = rsids
-        nlp.gc_relations = gc_relations
-
-        study = Experimental.load_bioc_study("BioC_Studies", F"{pmc_id}.json")
-        if not study:
-            continue
-
-        fulltext = "\n".join([x['text'] for x in study['documents'][0]['passages']])
-        altered_text = re.sub(r"(?:\w)(\()", lambda x: x.group().replace("(", " ("), fulltext)
-
-        abbreviations = nlp.get_all_abbreviations(altered_text)
-        file_abbrevs = nlp.get_study_abbreviations(F"BioC_Studies/{pmc_id}_abbreviations.json")
-        if file_abbrevs:
-            abbreviations += file_abbrevs
-        nlp.set_abbreviations(abbreviations)  # TODO: Check abbreviation partial entity HPC.
-
-        result, nlp = process_study(nlp, study)
-        nlp.clear_saved_study_data()
-
-        study_tables, contains_annotations = GCTableExtractor.parse_tables(F"BioC_Studies/{pmc_id}_tables.json", nlp)
+    with OutputWriter() as output_writer:
+        for pmc_id in gc_data.keys():
+            # if pmc_id != "PMC5536245":
+            #     continue
+            start_time = datetime.now()
+            result, study_tables, contains_annotations = process_gc_study(nlp, pmc_id, gc_data[pmc_id],
+                                                                          result_cache=result_cache,
+                                                                          output_writer=output_writer)
+            if not result:
+                continue
 
-        time_taken = (datetime.now() - start_time).total_seconds()
-        study_processing_times.append((pmc_id, time_taken))
+            time_taken = (datetime.now() - start_time).total_seconds()
+            study_processing_times.append((pmc_id, time_taken))
 
-        if contains_annotations:
-            TableExtractor.output_tables(F"output/{pmc_id}_tables.json", study_tables)
-        if not result['documents'][0]['relations'] and not contains_annotations:
-            failed_documents.append(pmc_id)
+            if contains_annotations:
+                output_writer.submit(F"{pmc_id}_tables", TableExtractor.output_tables, F"output/{pmc_id}_tables.json",
+                                     study_tables)
+            if not result['documents'][0]['relations'] and not contains_annotations:
+                failed_documents.append(pmc_id)
 
     def avg(times):
         sum = 0
@@ -425,8 +556,10 @@ def main():
             sum += i
         return sum / len(times) if times else 0
 
+    outliers = [(x, y) for x, y in study_processing_times if y >= STUDY_TIME_OUTLIER_SECONDS]
     print(F"Times taken: {study_processing_times}")
-    print(F"Average processing time: {avg([y for x, y in study_processing_times if y < 600])}")
+    print(F"Average processing time: {avg([y for x, y in study_processing_times if y < STUDY_TIME_OUTLIER_SECONDS])}"
+          F" ({len(outliers)} outlier(s) over {STUDY_TIME_OUTLIER_SECONDS}s excluded: {outliers})")
 
 
 if __name__ == '__main__':
@@ -16,6 +16,13 @@ import BioC
 import json
 # import OutputConverter
 from GWAS_Miner import OutputConverter
+from OutputWriter import OutputWriter
+from PipelineProfiles import load_profiles, PROFILE_ACCURATE
+from PValue import get_significance_infons
+from Profiling import profile_document
+from TrainingData import TrainingDataExporter
+from ResultCache import ResultCache
+from RunManifest import RunManifest, get_file_hash, DEFAULT_MAX_ATTEMPTS
 
 
 def __load_config():
@@ -45,8 +52,14 @@ lexicon = None
 nlp = None
 gui = None
 is_cancelled = False
+matcher_backend = "phrase"
+prefilter_sentences = False
+pipeline_profile = PROFILE_ACCURATE
+max_p_value = None
+result_cache = None
+output_writer = None
+training_exporter = TrainingDataExporter()
 global output_xml
-processed_files = []
 
 
 def theme():
@@ -66,7 +79,10 @@ def load_nlp_object(qt_progress_signal=None, qt_finished_signal=None):
         lexicon = __prepare_ontology_data()
     if not nlp:
         update_gui_progress(qt_progress_signal, "Loading NLP Pipeline...")
-        nlp = Interpreter(lexicon)
+        nlp = Interpreter(lexicon, matcher_backend=matcher_backend, prefilter_sentences=prefilter_sentences,
+                          profile=pipeline_profile)
+        if max_p_value is not None:
+            nlp.max_p_value = max_p_value
         if qt_finished_signal:
             qt_finished_signal.emit(True)
             return
@@ -79,6 +95,14 @@ def update_gui_progress(qt_progress_signal, text):
     qt_progress_signal.emit(text)
 
 
+def get_study_output_path(study):
+    return F"output/PMC{study['documents'][0]['id']}_result.xml"
+
+
+def write_study_results(study):
+    OutputConverter.output_xml(json.dumps(study, default=BioC.ComplexHandler), get_study_output_path(study))
+
+
 def output_study_results(study, qt_study_finished_signal=None):
     # if qt_study_finished_signal:
     #     from GUI import QtFinishedResponse
@@ -96,8 +120,10 @@ def output_study_results(study, qt_study_finished_signal=None):
     # with open(F"output/PMC{study['documents'][0]['id']}_result.json", "w", encoding="utf-8") as out_file:
     #     json.dump(study, out_file, default=BioC.ComplexHandler)
 
-    OutputConverter.output_xml(json.dumps(study, default=BioC.ComplexHandler),
-                               F"output/PMC{study['documents'][0]['id']}_result.xml")
+    if output_writer:
+        output_writer.submit(F"PMC{study['documents'][0]['id']}", write_study_results, study)
+    else:
+        write_study_results(study)
 
     if qt_study_finished_signal:
         from GUI import QtFinishedResponse
@@ -114,7 +140,7 @@ def get_study_visualisations(study, qt_progress_signal=None, qt_finished_signal=
         return
     update_gui_progress(qt_progress_signal, F"Processing study {study['documents'][0]['id']}...")
     study_fulltext = "<!break!>".join([x['text'] for x in study['documents'][0]['passages']])
-    doc = nlp_object.process_corpus(nlp_object.replace_all_abbreviations(study_fulltext))
+    doc = nlp_object.process_corpus(nlp_object.replace_all_abbreviations(study_fulltext), profile=PROFILE_ACCURATE)
     phenotype_stats = nlp_object.get_phenotype_stats(doc, lexicon)
     update_gui_progress(qt_progress_signal, "Generating HTML")
     entities = nlp_object.display_ents(doc, True, theme())
@@ -132,6 +158,18 @@ def process_study(nlp, study, qt_progress_signal=None, qt_study_finished_signal=
         return False
 
     update_gui_progress(qt_progress_signal, F"Identifying data from study {study['documents'][0]['id']}...")
+    cache_key = None
+    if result_cache:
+        cache_key = result_cache.get_key(study, nlp.lexicon.version, {"pipeline": "GWASMiner",
+                                                                      "matcher": nlp.matcher_backend,
+                                                                      "prefilter": nlp.prefilter_sentences,
+                                                                      "profile": nlp.profile,
+                                                                      "max_p_value": nlp.max_p_value})
+        cached_study = result_cache.get(cache_key)
+        if cached_study:
+            logger.info(F"Using cached result for PMC{study['documents'][0]['id']}")
+            output_study_results(cached_study, qt_study_finished_signal)
+            return True
     t, m, p = 0, 0, 0
     study_fulltext = "\n".join([x['text'] for x in study['documents'][0]['passages']])
     # abbreviations = nlp.get_all_abbreviations(study_fulltext)
@@ -143,20 +181,12 @@ def process_study(nlp, study, qt_progress_signal=None, qt_study_finished_signal=
         #     for abbrev in abbreviations:
         #         passage_text = passage_text.replace(abbrev[0], abbrev[1])
 
-        doc = nlp.process_corpus(passage_text, )
-        for sent in doc.sents:
-            training_sent = [x.label_ for x in sent.ents]
-            if training_sent:
-                if [x for x in training_sent if x[0] == "D"] and "RSID" in training_sent and "PVAL" in training_sent:
-                    training_string = sent.text_with_ws
-                    for ent in sent.ents:
-                        ent_string = F"<!TRAIT:{ent.text_with_ws}!>" if ent.label_[
-                                                                            0] == "D" else F"<!{ent.label_}:{ent.text_with_ws}!>"
-                        training_string = training_string.replace(ent.text_with_ws, ent_string)
-                    with open("training_input/training_input.txt", "a+", encoding="utf-8") as f_in:
-                        f_in.write(training_string + "\n")
-
-        annotations = nlp.get_entities(doc)
+        annotations = []
+        for segment_offset, doc in nlp.process_passage(passage_text):
+            training_exporter.add_doc(doc)
+            for annot in nlp.get_entities(doc):
+                annot["offset"] += segment_offset
+                annotations.append(annot)
         used_annots = []
         if annotations:
             for annot in annotations:
@@ -184,7 +214,8 @@ def process_study(nlp, study, qt_progress_signal=None, qt_study_finished_signal=
                 elif "PVAL" in annot["entity_type"]:
                     p_value = BioC.BioCAnnotation(id=F"P{p}", infons={"type": "significance", "identifier": annot["id"],
                                                                       "annotator": "tr142@le.ac.uk",
-                                                                      "updated_at": current_datetime},
+                                                                      "updated_at": current_datetime,
+                                                                      **get_significance_infons(annot["p_value"])},
                                                   locations=[loc], text=annot["text"])
                     passage['annotations'].append(p_value)
                     p += 1
@@ -194,6 +225,9 @@ def process_study(nlp, study, qt_progress_signal=None, qt_study_finished_signal=
         relations = None
         if relations:
             print(relations)
+    training_exporter.flush()
+    if result_cache:
+        result_cache.put(cache_key, study, default=BioC.ComplexHandler)
     output_study_results(study, qt_study_finished_signal)
     return True
 
@@ -205,13 +239,86 @@ def prepare_study(directory, file_name):
     return study
 
 
-def process_studies(directory, visualise=None, shortlist=None, qt_progress_signal=None, qt_study_finished_signal=None):
+def process_study_file(nlp_object, task):
+    """
+    Process a single study file within a worker process, writing its output synchronously.
+    @param nlp_object: Interpreter inherited from the parent process
+    @param task: Tuple of the directory and file name
+    @return: Dictionary of the output path (None if the study could not be processed), duration and error.
+    """
+    import os
+    import time
+    directory, file_name = task
+    start_time = time.perf_counter()
+    study = prepare_study(directory, file_name)
+    if not study:
+        return {"output_path": None, "duration": time.perf_counter() - start_time, "error": "Unable to load study"}
+    logger.info(F"Processing PMC {study['documents'][0]['id']} in worker {os.getpid()}")
+    result = process_study(nlp_object, study)
+    return {"output_path": get_study_output_path(study) if result else None,
+            "duration": time.perf_counter() - start_time, "error": None if result else "Study could not be processed"}
+
+
+def process_studies_parallel(directory, workers, shortlist=None, manifest=None):
+    """
+    Process each file within the provided directory across forked worker processes.
+
+    The Interpreter is loaded once in this process and inherited copy-on-write by each worker, rather than each worker
+    loading its own model, matchers and lexicon. The manifest is only updated from this process.
+    @param directory: Directory containing publication files
+    @param workers: Number of worker processes
+    @param shortlist: Optional list of file names to restrict processing to
+    @param manifest: Optional RunManifest of previously processed files
+    """
+    import os
+    from WorkerPool import ForkWorkerPool
+    nlp_object = load_nlp_object()
+    if nlp_object.profiler:
+        logger.warning("Stage metrics are not collected from worker processes.")
+    # Workers append training sentences to their own files rather than contending on one.
+    training_exporter.shard_by_process = True
+
+    tasks = []
+    for file_name in sorted(os.listdir(directory)):
+        if shortlist and file_name not in shortlist:
+            continue
+        if manifest:
+            content_hash = get_file_hash(os.path.join(directory, file_name))
+            if not manifest.should_process(file_name, content_hash):
+                logger.info(F"Skipping previously processed file: {file_name}")
+                continue
+            manifest.mark_started(file_name, content_hash)
+        tasks.append((directory, file_name))
+
+    with ForkWorkerPool(nlp_object, process_study_file, workers) as pool:
+        for (_, file_name), result, error in pool.imap_unordered(tasks):
+            if error:
+                logger.error(F"Failed to process {file_name}: {error}")
+            elif not result["output_path"]:
+                logger.warning(F"Unable to process study {file_name}: {result['error']}")
+            if manifest:
+                if error:
+                    manifest.mark_failed(file_name, error)
+                elif result["output_path"]:
+                    manifest.mark_completed(file_name, result["output_path"], result["duration"])
+                else:
+                    manifest.mark_failed(file_name, result["error"], result["duration"])
+        pool.log_memory_summary()
+
+    if manifest:
+        logger.info(F"Run manifest status: {manifest.summary()}")
+
+
+def process_studies(directory, visualise=None, shortlist=None, qt_progress_signal=None, qt_study_finished_signal=None,
+                    manifest=None):
     """[Processes each file within the provided directory for GWAS information extraction.]
 
     Args: directory ([string]): [directory containing publication files.] visualise ([string], optional): [ents =
-    entity visualisation, sents = dependency parsing visualisation]. Defaults to None.
+    entity visualisation, sents = dependency parsing visualisation]. Defaults to None. manifest ([RunManifest],
+    optional): [manifest of previously processed files, used to skip completed files and retry failed ones].
     """
     import os
+    import time
     cancel_response = None
 
     if qt_progress_signal:
@@ -232,40 +339,102 @@ def process_studies(directory, visualise=None, shortlist=None, qt_progress_signa
         qt_study_finished_signal.emit(cancel_response)
         return
 
-    # Process each publication file in turn
-    for file_name in os.listdir(directory):
-        if shortlist:
-            if file_name not in shortlist:
+    # Serialise and write finished studies in the background while the next study is processed.
+    global output_writer
+    output_writer = OutputWriter()
+    study_files = {}
+    # Processed studies awaiting their output, only marked as completed in the manifest once it has been written.
+    pending_outputs = {}
+    try:
+        # Process each publication file in turn
+        for file_name in os.listdir(directory):
+            if shortlist:
+                if file_name not in shortlist:
+                    continue
+            if is_cancelled:
+                qt_study_finished_signal.emit(cancel_response)
+                return
+
+            content_hash = None
+            if manifest:
+                content_hash = get_file_hash(os.path.join(directory, file_name))
+                if not manifest.should_process(file_name, content_hash):
+                    logger.info(F"Skipping previously processed file: {file_name}")
+                    continue
+                manifest.mark_started(file_name, content_hash)
+
+            logger.info(F"Extracting data for file: {file_name}")
+            update_gui_progress(qt_progress_signal, F"Extracting data for file: {file_name}")
+            start_time = time.perf_counter()
+            study = prepare_study(directory, file_name)
+
+            if not study:
+                if manifest:
+                    manifest.mark_failed(file_name, "Unable to load study", time.perf_counter() - start_time)
+                if qt_study_finished_signal:
+                    response = QtFinishedResponse(False, file_name)
+                    qt_study_finished_signal.emit(response)
                 continue
-        if is_cancelled:
-            qt_study_finished_signal.emit(cancel_response)
-            return
-
-        logger.info(F"Extracting data for file: {file_name}")
-        update_gui_progress(qt_progress_signal, F"Extracting data for file: {file_name}")
-        study = prepare_study(directory, file_name)
-
-        if not study:
-            response = QtFinishedResponse(False, file_name)
-            qt_study_finished_signal.emit(response)
-            continue
 
-        logger.info(F"Processing PMC {study['documents'][0]['id']}")
-        result = process_study(nlp_object, study, qt_progress_signal, qt_study_finished_signal)
+            logger.info(F"Processing PMC {study['documents'][0]['id']}")
+            study_files[F"PMC{study['documents'][0]['id']}"] = file_name
+            try:
+                with profile_document(nlp_object.profiler, F"PMC{study['documents'][0]['id']}"):
+                    result = process_study(nlp_object, study, qt_progress_signal, qt_study_finished_signal)
+            except Exception as e:
+                if not manifest:
+                    raise
+                logger.exception(F"Failed to process {file_name}")
+                manifest.mark_failed(file_name, repr(e), time.perf_counter() - start_time)
+                continue
 
-        if not result:
-            update_gui_progress(qt_progress_signal, F"Unable to process study {file_name}. Skipping...")
+            if manifest:
+                if result:
+                    pending_outputs[F"PMC{study['documents'][0]['id']}"] = (file_name, get_study_output_path(study),
+                                                                            time.perf_counter() - start_time)
+                    mark_written_outputs(manifest, pending_outputs)
+                elif is_cancelled:
+                    manifest.mark_cancelled(file_name)
+                else:
+                    manifest.mark_failed(file_name, "Study could not be processed", time.perf_counter() - start_time)
+
+            if not result:
+                update_gui_progress(qt_progress_signal, F"Unable to process study {file_name}. Skipping...")
+    finally:
+        output_writer.close()
+        if manifest:
+            mark_written_outputs(manifest, pending_outputs)
+            for label, error in output_writer.failures:
+                if label in study_files:
+                    pending_outputs.pop(label, None)
+                    manifest.mark_failed(study_files[label], F"Output failed: {error!r}")
+        output_writer = None
+
+    if manifest:
+        logger.info(F"Run manifest status: {manifest.summary()}")
 
     if qt_study_finished_signal:
         response = QtFinishedResponse(True, "Finished processing.", 1)
         qt_study_finished_signal.emit(response)
 
 
+def mark_written_outputs(manifest, pending_outputs):
+    """
+    Mark the studies whose output has been written by the background writer as completed in the run manifest.
+    @param manifest: RunManifest object
+    @param pending_outputs: Dictionary of output label -> (file name, output path, duration) of processed studies,
+    from which the written studies are removed.
+    """
+    for label in output_writer.pop_completed():
+        if label in pending_outputs:
+            manifest.mark_completed(*pending_outputs.pop(label))
+
+
 def visualise_study(file, visualisation_type):
     import os
     study = prepare_study(directory=os.path.dirname(file), file_name=os.path.basename(file))
     nlp = load_nlp_object()
-    doc = nlp.process_corpus(nlp.replace_all_abbreviations(study.get_fulltext()))
+    doc = nlp.process_corpus(nlp.replace_all_abbreviations(study.get_fulltext()), profile=PROFILE_ACCURATE)
     if visualisation_type.lower() == "ents":
         nlp.display_ents(doc, theme=theme())
     elif visualisation_type.lower() == "sents":
@@ -278,25 +447,64 @@ def main():
     import sys
     # Configure command line arguments
     parser = argparse.ArgumentParser(description='GWAS Information Extraction')
-    parser.add_argument('-c', '--cores', type=int, default=1, help='Number of CPU cores to utilise. 0 = Max '
-                                                                   'available. Default = 1.')
+    parser.add_argument('-c', '--cores', type=int, default=1, help='Number of CPU cores to utilise, forking worker '
+                                                                   'processes after loading the NLP pipeline so that '
+                                                                   'it is shared between them. 0 = Max available. '
+                                                                   'Default = 1.')
     parser.add_argument('-d', '--docs', type=str, help='Directory containing the study JSON files.')
     parser.add_argument('-u', '--update_ont', action='store_true', help='Update ontology cache files from the source '
                                                                         'ontology files.')
+    parser.add_argument('--rebuild_ont', action='store_true', help='Rebuild the ontology cache from scratch when '
+                                                                   'updating rather than applying only the changes.')
+    parser.add_argument('--mesh_xml', type=str, help='MeSH descriptor XML file to update the ontology cache from '
+                                                     'instead of the ontology database.')
+    parser.add_argument('--hpo_obo', type=str, help='HPO OBO file to update the ontology cache from instead of the '
+                                                    'ontology database.')
     parser.add_argument('-v', '--visualise', type=str, help='Start displacy visualisation server for entities or '
                                                             'dependencies by specifying ents or sents respectively.')
     parser.add_argument('-g', '--interface', action='store_true', help='Launch using the graphical user interface.')
+    parser.add_argument('--matcher', type=str, default="phrase", choices=["phrase", "trie"],
+                        help='Ontology term matcher backend. Default = phrase.')
+    parser.add_argument('--manifest', type=str, default="output/manifest.db",
+                        help='Run manifest used to resume interrupted runs. Default = output/manifest.db.')
+    parser.add_argument('--no_resume', action='store_true', help='Process every file, ignoring the run manifest.')
+    parser.add_argument('--max_attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=F'Attempts made to process a failing file across resumed runs. '
+                             F'Default = {DEFAULT_MAX_ATTEMPTS}.')
+    parser.add_argument('--no_cache', action='store_true', help='Process every study rather than reusing cached '
+                                                                'results for unchanged studies.')
+    parser.add_argument('--doc_cache', action='store_true', help='Reuse parsed passages from earlier runs, only '
+                                                                 'replaying entity matching and relation extraction.')
+    parser.add_argument('--shard_training', action='store_true', help='Write training sentences to a separate file '
+                                                                      'per process.')
+    parser.add_argument('--prefilter', action='store_true', help='Only dependency parse sentences containing an rsID '
+                                                                 'and p-value, matching entities elsewhere without '
+                                                                 'parsing.')
+    parser.add_argument('--profile', type=str, default=PROFILE_ACCURATE, choices=list(load_profiles()),
+                        help='spaCy pipeline profile from settings/config.ini used for study passages. '
+                             'Default = accurate.')
+    parser.add_argument('--max_p', type=float, help='Only extract p-values at or below this threshold, e.g. 5e-8 for '
+                                                    'genome-wide significance. Defaults to max_p_value in config.py.')
+    parser.add_argument('--metrics', type=str, help='Record per-stage timings and counts while processing, writing '
+                                                    'them to the given JSON file and the log.')
     parser.add_argument('-x', '--xml', action='store_true', help='Output results in BioC XML format rather than JSON.')
 
     # Parse input arguments
     args = parser.parse_args()
-    # cores = args.cores  # not yet implemented
+    cores = args.cores if args.cores > 0 else os.cpu_count()
     docs = args.docs
     visualise = args.visualise
     using_gui = args.interface
     update_ont = args.update_ont
-    global output_xml
+    global output_xml, matcher_backend, prefilter_sentences, pipeline_profile, max_p_value, result_cache
     output_xml = args.xml
+    matcher_backend = args.matcher
+    prefilter_sentences = args.prefilter
+    pipeline_profile = args.profile
+    max_p_value = args.max_p
+    if not args.no_cache:
+        result_cache = ResultCache()
+    training_exporter.shard_by_process = args.shard_training
 
     # Setup folder for log files.
     if not os.path.isdir("logs"):
@@ -321,7 +529,8 @@ def main():
     # Update ontology cache files if requested.
     if update_ont:
         import Ontology
-        Ontology.update_ontology_cache()
+        source_files = {k: v for k, v in [("MESH", args.mesh_xml), ("HPO", args.hpo_obo)] if v}
+        Ontology.update_ontology_cache(incremental=not args.rebuild_ont, source_files=source_files)
 
     if not using_gui:
         global lexicon
@@ -337,7 +546,26 @@ def main():
         if visualise and docs:
             visualise_study(docs, visualise)
         elif docs:
-            process_studies(docs)
+            if args.doc_cache:
+                from DocCache import DocCache
+                load_nlp_object().doc_cache = DocCache()
+            if args.metrics:
+                from Profiling import StageProfiler
+                load_nlp_object().profiler = StageProfiler()
+            manifest = None if args.no_resume else RunManifest(args.manifest, args.max_attempts)
+            from WorkerPool import is_fork_available
+            if cores > 1 and not is_fork_available():
+                logger.warning("Forked worker processes are not supported on this platform, using a single core.")
+                cores = 1
+            if cores > 1:
+                process_studies_parallel(docs, cores, manifest=manifest)
+            else:
+                process_studies(docs, manifest=manifest)
+            if manifest:
+                manifest.close()
+            if args.metrics:
+                nlp.profiler.log_summary()
+                nlp.profiler.save(args.metrics)
         else:
             print("No valid parameters given.")
 
@@ -0,0 +1,405 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+from DataStructures import Lexicon, LexiconEntry, MasterLexicon
+
+logger = logging.getLogger("GWAS Miner")
+
+# Increment when the table layout changes so that stale stores are rebuilt rather than misread.
+FORMAT_VERSION = 1
+
+# Bytes of the store file that SQLite may memory-map. Mapped pages live in the OS page cache and are shared
+# between every process reading the same store.
+DEFAULT_MMAP_SIZE = 1 << 30
+
+SCHEMA = """
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    CREATE TABLE entries (
+        entry_id INTEGER PRIMARY KEY,
+        lexicon TEXT NOT NULL,
+        identifier TEXT NOT NULL,
+        name TEXT NOT NULL,
+        tree_ids TEXT NOT NULL,
+        synonyms TEXT NOT NULL,
+        entry_hash TEXT NOT NULL
+    );
+    CREATE TABLE terms (term TEXT NOT NULL, lexicon TEXT NOT NULL, entry_id INTEGER NOT NULL);
+    CREATE INDEX entries_identifier ON entries (lexicon, identifier);
+    CREATE INDEX terms_lookup ON terms (lexicon, term, entry_id);
+"""
+
+
+class LexiconStoreError(Exception):
+    def __init__(self, path, message="Lexicon store is missing or was written by an incompatible version"):
+        self.path = path
+        self.message = message
+        super().__init__(F"{self.message}: {path}")
+
+
+def get_entry_hash(entry):
+    """
+    Calculate a stable hash of the content of a lexicon entry.
+    @param entry: LexiconEntry to hash
+    @return: Hex digest string
+    """
+    content = json.dumps([entry.identifier, entry.name(), entry.tree_id(),
+                          sorted(x["name"] for x in entry.synonyms())], ensure_ascii=False)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def get_entry_terms(entry):
+    """
+    Retrieve the unique lower case terms (name and synonyms) an entry can be looked up by.
+    """
+    terms = [entry.name().lower()]
+    for syn in entry.synonyms():
+        term = syn["name"].lower()
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+class LexiconStore:
+    """
+    Compact SQLite representation of a MasterLexicon.
+
+    Entries are only materialised into LexiconEntry objects when they are requested, and the file is opened
+    read-only with memory-mapped I/O so that worker processes share a single copy of the data.
+    """
+
+    def __init__(self, path, mmap_size=DEFAULT_MMAP_SIZE):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.__connection = None
+        self.__connection_pid = None
+        self.__meta = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_LexiconStore__connection"] = None
+        state["_LexiconStore__connection_pid"] = None
+        return state
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def connection(self):
+        """
+        Retrieve the read-only connection for the current process, reopening it after a fork.
+        """
+        if self.__connection is None or self.__connection_pid != os.getpid():
+            if not self.exists():
+                raise LexiconStoreError(self.path)
+            self.__connection = sqlite3.connect(F"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self.__connection.execute(F"PRAGMA mmap_size={int(self.mmap_size)}")
+            self.__connection.execute("PRAGMA query_only=1")
+            self.__connection_pid = os.getpid()
+            self.__meta = None
+        return self.__connection
+
+    def close(self):
+        if self.__connection is not None and self.__connection_pid == os.getpid():
+            self.__connection.close()
+        self.__connection = None
+        self.__connection_pid = None
+        self.__meta = None
+
+    def meta(self):
+        if self.__meta is None:
+            try:
+                rows = self.connection().execute("SELECT key, value FROM meta").fetchall()
+            except sqlite3.DatabaseError as de:
+                raise LexiconStoreError(self.path, F"Unable to read lexicon store ({de})")
+            self.__meta = {k: v for k, v in rows}
+            if self.__meta.get("format_version") != str(FORMAT_VERSION):
+                raise LexiconStoreError(self.path)
+        return self.__meta
+
+    @property
+    def version(self):
+        """
+        Content version of the stored lexicon, suitable for keying caches derived from it.
+        """
+        return self.meta()["version"]
+
+    def lexicon_names(self):
+        return json.loads(self.meta()["lexicons"])
+
+    def write(self, master_lexicon):
+        """
+        Write the supplied MasterLexicon to the store, replacing any previous contents atomically.
+        @param master_lexicon: MasterLexicon object to persist
+        @return: Version string of the written store
+        """
+        rows = []
+        for lexicon in master_lexicon.get_ordered_lexicons():
+            if lexicon is None:
+                continue
+            for entry in lexicon.get_entries():
+                rows.append((lexicon.name, entry))
+        return self.write_entries(rows, [x for x in master_lexicon.get_priority_order()])
+
+    def write_entries(self, rows, lexicon_names):
+        """
+        Write (lexicon name, LexiconEntry) pairs to the store, replacing any previous contents atomically.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp_path = F"{self.path}.{os.getpid()}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        connection = sqlite3.connect(temp_path)
+        try:
+            connection.executescript(SCHEMA)
+            entry_id = 0
+            for lexicon_name, entry in rows:
+                entry_id += 1
+                LexiconStore.__insert_entry(connection, entry_id, lexicon_name, entry)
+            version = LexiconStore.__calculate_version(connection)
+            connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("format_version", str(FORMAT_VERSION)),
+                ("version", version),
+                ("lexicons", json.dumps(lexicon_names)),
+                ("entry_id_seq", str(entry_id)),
+                ("created_at", datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"))])
+            connection.commit()
+        finally:
+            connection.close()
+        self.close()
+        os.replace(temp_path, self.path)
+        logger.info(F"Wrote lexicon store {self.path} (version {version}).")
+        return version
+
+    def update(self, master_lexicon):
+        """
+        Apply the differences between the stored lexicon and the supplied MasterLexicon to the store in place.
+
+        Entries are compared by per-entry content hash, so only added, removed or modified (e.g. changed
+        synonyms) entries are rewritten and the store version only changes when the content does.
+        @param master_lexicon: Freshly exported MasterLexicon
+        @return: LexiconChangeSet describing the applied changes
+        """
+        fresh = {}
+        for lexicon in master_lexicon.get_ordered_lexicons():
+            if lexicon is None:
+                continue
+            for entry in lexicon.get_entries():
+                fresh.setdefault((lexicon.name, entry.identifier), []).append(entry)
+        stored = {}
+        for lexicon_name, identifier, entry_hash in self.connection().execute(
+                "SELECT lexicon, identifier, entry_hash FROM entries ORDER BY entry_id"):
+            stored.setdefault((lexicon_name, identifier), []).append(entry_hash)
+
+        change_set = LexiconChangeSet(from_version=self.version)
+        for key, entries in fresh.items():
+            if key not in stored:
+                change_set.added.extend((key[0], x) for x in entries)
+            elif [get_entry_hash(x) for x in entries] != stored[key]:
+                change_set.modified.extend((key[0], x) for x in entries)
+        change_set.removed = [key for key in stored if key not in fresh]
+        lexicon_names = list(master_lexicon.get_priority_order())
+
+        if not change_set and lexicon_names == self.lexicon_names():
+            change_set.to_version = change_set.from_version
+            logger.info("Lexicon store is already up to date.")
+            return change_set
+
+        connection = sqlite3.connect(self.path)
+        try:
+            entry_id = int(connection.execute("SELECT value FROM meta WHERE key = 'entry_id_seq'").fetchone()[0])
+            stale_keys = change_set.removed + [(x, y.identifier) for x, y in change_set.modified]
+            for lexicon_name, identifier in set(stale_keys):
+                connection.execute("DELETE FROM terms WHERE entry_id IN (SELECT entry_id FROM entries "
+                                   "WHERE lexicon = ? AND identifier = ?)", (lexicon_name, identifier))
+                connection.execute("DELETE FROM entries WHERE lexicon = ? AND identifier = ?",
+                                   (lexicon_name, identifier))
+            for lexicon_name, entry in change_set.added + change_set.modified:
+                entry_id += 1
+                LexiconStore.__insert_entry(connection, entry_id, lexicon_name, entry)
+            change_set.to_version = LexiconStore.__calculate_version(connection)
+            connection.executemany("UPDATE meta SET value = ? WHERE key = ?", [
+                (change_set.to_version, "version"),
+                (json.dumps(lexicon_names), "lexicons"),
+                (str(entry_id), "entry_id_seq"),
+                (datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"), "created_at")])
+            connection.commit()
+        finally:
+            connection.close()
+        self.close()
+        logger.info(F"Updated lexicon store {self.path} to version {change_set.to_version}: {change_set}")
+        return change_set
+
+    @staticmethod
+    def __insert_entry(connection, entry_id, lexicon_name, entry):
+        connection.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (entry_id, lexicon_name, entry.identifier, entry.name(),
+                            json.dumps(entry.tree_id()), json.dumps(entry.synonyms(), ensure_ascii=False),
+                            get_entry_hash(entry)))
+        connection.executemany("INSERT INTO terms VALUES (?, ?, ?)",
+                               [(term, lexicon_name, entry_id) for term in get_entry_terms(entry)])
+
+    @staticmethod
+    def __calculate_version(connection):
+        """
+        Hash every entry hash in the store, independent of insertion order so that an incrementally updated
+        store has the same version as a rebuilt one.
+        """
+        version_hash = hashlib.sha1()
+        for lexicon_name, entry_hash in sorted(connection.execute("SELECT lexicon, entry_hash FROM entries")):
+            version_hash.update(F"{lexicon_name}:{entry_hash}".encode("utf-8"))
+        return version_hash.hexdigest()
+
+    def load_master_lexicon(self):
+        """
+        Create a MasterLexicon whose lexicons are backed by this store.
+        @return: MasterLexicon object with the store version assigned.
+        """
+        master = MasterLexicon()
+        priority = {}
+        for i, name in enumerate(self.lexicon_names()):
+            master.add_lexicon(StoredLexicon(name, self))
+            priority[name] = i + 1
+        if priority:
+            master.set_priority_order(priority)
+        master.version = self.version
+        return master
+
+    def get_entry(self, entry_id):
+        row = self.connection().execute("SELECT identifier, name, tree_ids, synonyms FROM entries "
+                                        "WHERE entry_id = ?", (entry_id,)).fetchone()
+        return LexiconStore.__materialise(row) if row else None
+
+    def iter_entries(self, lexicon_name):
+        cursor = self.connection().execute("SELECT entry_id, identifier, name, tree_ids, synonyms FROM entries "
+                                           "WHERE lexicon = ? ORDER BY entry_id", (lexicon_name,))
+        for row in cursor:
+            yield row[0], LexiconStore.__materialise(row[1:])
+
+    def find_entry_id_by_identifier(self, lexicon_name, identifier):
+        row = self.connection().execute("SELECT MIN(entry_id) FROM entries WHERE lexicon = ? AND identifier = ?",
+                                        (lexicon_name, identifier)).fetchone()
+        return row[0] if row else None
+
+    def find_entry_id_by_term(self, lexicon_name, term):
+        row = self.connection().execute("SELECT MIN(entry_id) FROM terms WHERE lexicon = ? AND term = ?",
+                                        (lexicon_name, term.lower())).fetchone()
+        return row[0] if row else None
+
+    def entry_count(self, lexicon_name):
+        return self.connection().execute("SELECT COUNT(*) FROM entries WHERE lexicon = ?",
+                                         (lexicon_name,)).fetchone()[0]
+
+    @staticmethod
+    def __materialise(row):
+        identifier, name, tree_ids, synonyms = row
+        tree_ids = json.loads(tree_ids)
+        entry = LexiconEntry(identifier, name=name, tree_id=tree_ids[0] if tree_ids else None)
+        for tree_id in tree_ids[1:]:
+            entry.add_tree_id(tree_id)
+        for syn in json.loads(synonyms):
+            entry.add_synonym(id=syn["id"], name=syn["name"])
+        return entry
+
+
+class LexiconChangeSet:
+    """
+    Entries added, removed and modified by an incremental lexicon store update.
+    """
+
+    def __init__(self, from_version=None, to_version=None, added=None, removed=None, modified=None):
+        self.from_version = from_version
+        self.to_version = to_version
+        # (lexicon name, LexiconEntry) pairs
+        self.added = added if added else []
+        # (lexicon name, identifier) pairs
+        self.removed = removed if removed else []
+        # (lexicon name, LexiconEntry) pairs holding the new content of each entry
+        self.modified = modified if modified else []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    def __str__(self):
+        return F"{len(self.added)} added, {len(self.removed)} removed, {len(self.modified)} modified"
+
+    def jsonable(self):
+        def entry_dict(lexicon_name, entry):
+            return {"lexicon": lexicon_name, "identifier": entry.identifier, "name": entry.name(),
+                    "tree_ids": entry.tree_id(), "synonyms": entry.synonyms()}
+        return {"from_version": self.from_version, "to_version": self.to_version,
+                "added": [entry_dict(x, y) for x, y in self.added],
+                "removed": [{"lexicon": x, "identifier": y} for x, y in self.removed],
+                "modified": [entry_dict(x, y) for x, y in self.modified]}
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fout:
+            json.dump(self.jsonable(), fout, ensure_ascii=False)
+
+    @staticmethod
+    def load(path):
+        def entry_pair(data):
+            entry = LexiconEntry(data["identifier"], name=data["name"],
+                                 tree_id=data["tree_ids"][0] if data["tree_ids"] else None)
+            for tree_id in data["tree_ids"][1:]:
+                entry.add_tree_id(tree_id)
+            for syn in data["synonyms"]:
+                entry.add_synonym(id=syn["id"], name=syn["name"])
+            return data["lexicon"], entry
+        with open(path, "r", encoding="utf-8") as fin:
+            data = json.load(fin)
+        return LexiconChangeSet(from_version=data["from_version"], to_version=data["to_version"],
+                                added=[entry_pair(x) for x in data["added"]],
+                                removed=[(x["lexicon"], x["identifier"]) for x in data["removed"]],
+                                modified=[entry_pair(x) for x in data["modified"]])
+
+
+class StoredLexicon(Lexicon):
+    """
+    Read-only Lexicon view over a LexiconStore. Entries are materialised on first access and then reused.
+    """
+
+    def __init__(self, name, store):
+        super().__init__(name)
+        self.store = store
+        self.__materialised = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_StoredLexicon__materialised"] = {}
+        return state
+
+    def clear_cache(self):
+        self.__materialised = {}
+
+    def __get_entry(self, entry_id):
+        if entry_id is None:
+            return None
+        entry = self.__materialised.get(entry_id)
+        if entry is None:
+            entry = self.store.get_entry(entry_id)
+            self.__materialised[entry_id] = entry
+        return entry
+
+    def add_entry(self, entry):
+        raise TypeError("Stored lexicons are read-only, rebuild the store to add entries.")
+
+    def remove_entry(self, entry):
+        raise TypeError("Stored lexicons are read-only, rebuild the store to remove entries.")
+
+    def get_entries(self):
+        for entry_id, entry in self.store.iter_entries(self.name):
+            yield self.__materialised.get(entry_id, entry)
+
+    def identifier_used(self, identifier):
+        return self.store.find_entry_id_by_identifier(self.name, identifier) is not None
+
+    def get_entry_by_term(self, term):
+        return self.__get_entry(self.store.find_entry_id_by_term(self.name, term))
+
+    def get_entry_by_id(self, ident):
+        return self.__get_entry(self.store.find_entry_id_by_identifier(self.name, ident))
@@ -0,0 +1,114 @@
+"""
+Compares the PhraseMatcher and token trie ontology matcher backends over the bundled BioC_Studies corpus.
+
+Usage: python MatcherBenchmark.py [-d BioC_Studies] [-o matcher_benchmark.json]
+"""
+import json
+import logging
+import os
+import time
+
+import Ontology
+from Experimental import load_bioc_study
+from NLP import Interpreter
+
+logger = logging.getLogger("GWAS Miner")
+
+
+def get_rss_bytes():
+    """
+    Current resident set size of this process, read from /proc (Linux only).
+    """
+    try:
+        with open("/proc/self/statm", "r") as fin:
+            return int(fin.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, ValueError):
+        return None
+
+
+def build_matcher(interpreter, lexicon, backend):
+    interpreter.matcher_backend = backend
+    rss_before = get_rss_bytes()
+    start = time.perf_counter()
+    matcher = interpreter.create_ontology_matcher()
+    pattern_count = 0
+    for lexi in lexicon.get_ordered_lexicons():
+        if lexi.name == "HPO":
+            continue
+        for entry in lexi.get_entries():
+            patterns = list(interpreter.nlp.tokenizer.pipe(Interpreter.get_term_variations(entry)))
+            pattern_count += len(patterns)
+            matcher.add(entry.identifier, patterns, on_match=interpreter._Interpreter__on_match)
+    build_seconds = time.perf_counter() - start
+    rss_after = get_rss_bytes()
+    return matcher, {"backend": backend, "build_seconds": build_seconds, "patterns": pattern_count,
+                     "rss_delta_bytes": rss_after - rss_before if rss_before is not None else None}
+
+
+def load_corpus(directory):
+    docs = []
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".json") or "_" in file_name:
+            continue
+        study = load_bioc_study(directory, file_name)
+        if not study:
+            continue
+        for passage in study['documents'][0]['passages']:
+            if passage['text']:
+                docs.append(passage['text'])
+    return docs
+
+
+def run_matcher(interpreter, matcher, texts):
+    """
+    Match every text with the supplied matcher, applying the Interpreter's on_match entity logic.
+    @return: Tuple of timing statistics and the list of (text index, entity label, start, end) results
+    """
+    results = []
+    match_count = 0
+    token_count = 0
+    elapsed = 0
+    for i in range(len(texts)):
+        doc = interpreter.nlp.make_doc(texts[i])
+        token_count += len(doc)
+        start = time.perf_counter()
+        match_count += len(matcher(doc))
+        elapsed += time.perf_counter() - start
+        results.extend((i, x.label_, x.start, x.end) for x in doc.ents)
+    return {"match_seconds": elapsed, "matches": match_count, "entities": len(results),
+            "tokens_per_second": token_count / elapsed if elapsed else None}, results
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Ontology matcher backend benchmark')
+    parser.add_argument('-d', '--docs', type=str, default="BioC_Studies", help='Directory of BioC study JSON files.')
+    parser.add_argument('-o', '--output', type=str, default="matcher_benchmark.json", help='JSON results file.')
+    args = parser.parse_args()
+
+    lexicon = Ontology.get_master_lexicon()
+    interpreter = Interpreter(lexicon, ontology_only=True)
+    texts = load_corpus(args.docs)
+    report = {"passages": len(texts), "lexicon_version": lexicon.version, "backends": []}
+    backend_results = {}
+    for backend in [Interpreter.MATCHER_PHRASE, Interpreter.MATCHER_TRIE]:
+        matcher, stats = build_matcher(interpreter, lexicon, backend)
+        run_stats, backend_results[backend] = run_matcher(interpreter, matcher, texts)
+        stats.update(run_stats)
+        report["backends"].append(stats)
+        print(F"{backend}: built {stats['patterns']} patterns in {stats['build_seconds']:.2f}s "
+              F"(RSS +{(stats['rss_delta_bytes'] or 0) / 1048576:.1f} MiB), matched {stats['matches']} in "
+              F"{stats['match_seconds']:.2f}s")
+        del matcher
+    phrase_results = set(backend_results[Interpreter.MATCHER_PHRASE])
+    trie_results = set(backend_results[Interpreter.MATCHER_TRIE])
+    report["entity_agreement"] = {"shared": len(phrase_results & trie_results),
+                                  "phrase_only": len(phrase_results - trie_results),
+                                  "trie_only": len(trie_results - phrase_results)}
+    print(F"Entity agreement: {report['entity_agreement']}")
+    with open(args.output, "w", encoding="utf-8") as fout:
+        json.dump(report, fout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,45 @@
 import itertools
 import json
 import logging
+import os
 import re
-from spacy.pipeline import merge_entities
+from spacy.pipeline import merge_entities, Sentencizer
 
 import config
 import networkx as nx
+import Ontology
 import spacy
 from DataStructures import Marker, Phenotype, Significance, Association, LexiconEntry
 from spacy import displacy
 from spacy.matcher import Matcher, PhraseMatcher
 from spacy.tokens import Span, Token, Doc
 
+from PipelineProfiles import load_profiles, PROFILE_ACCURATE
+from Profiling import profile_stage
+from PValue import is_significant, parse_p_value
+from TrieMatcher import TokenTrieMatcher
 from Utility_Functions import Utility
 
 
 class Interpreter:
-    def __init__(self, lexicon, ontology_only=False):
+    MATCHER_PHRASE = "phrase"
+    MATCHER_TRIE = "trie"
+    MATCHER_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "cache", "matchers")
+
+    def __init__(self, lexicon, ontology_only=False, matcher_backend=MATCHER_PHRASE, prefilter_sentences=False,
+                 profile=PROFILE_ACCURATE):
         self.lexicon = lexicon
-        self.nlp = spacy.load("en_core_sci_scibert", disable=["ner"])
-        self.nlp.add_pipe("merge_noun_chunks")
+        self.matcher_backend = matcher_backend
+        self.prefilter_sentences = prefilter_sentences
+        self.__sentencizer = Sentencizer()
+        self.profiles = load_profiles()
+        if profile not in self.profiles:
+            raise ValueError(F"Unknown pipeline profile '{profile}', expected one of {list(self.profiles)}")
+        self.profile = profile
+        self.nlp = self.profiles[profile].load()
+        self.__pipelines = {profile: self.nlp}
         self.__failed_matches = []
-        self.nlp.tokenizer.add_special_case(",", [{"ORTH": ","}])
+        self.__configure_tokenizer(self.nlp)
         self.__rsid_regex = {"LOWER": {"REGEX": "((?:[(]?)(rs[0-9]{1,}){1,})"}}  # "(?:rs[0-9]{1,}){1}"}}
         self.__marker_regex = {"TEXT": {"REGEX": r"([ATCG]{1}[a-z]{1,}[0-9]{1,}[ATCG]{1}[a-z]{1,})"}}
         self.__gene_seq_regex = {"TEXT": {"REGEX": "([ ][ACTG]{3,}[ ])"}}
@@ -33,10 +51,6 @@ class Interpreter:
         self.lexicon = lexicon
         # self.nlp = spacy.load("en_core_sci_lg", disable=["ner"])
         self.__failed_matches = []
-        # self.nlp.tokenizer.add_special_case(",", [{"ORTH": ","}])
-        infixes = self.nlp.Defaults.infixes + [r'(?!\w)(\()']
-        infix_regex = spacy.util.compile_infix_regex(infixes)
-        self.nlp.tokenizer.infix_finditer = infix_regex.finditer
         self.__basic_matcher = None
         self.__phrase_matcher = None
         self.__abbreviation_matcher = PhraseMatcher(self.nlp.vocab, attr="ORTH")
@@ -51,10 +65,39 @@ class Interpreter:
         self.r = 0
         self.annotations = []
         self.relations = []
+        self.profiler = None
+        self.doc_cache = None
+        # PVAL entities above this p-value are not extracted, if set.
+        self.max_p_value = config.max_p_value
         self.association_patterns = config.pheno_assoc_patterns
         if not ontology_only:
             self.__add_matchers(lexicon)
 
+    @staticmethod
+    def __configure_tokenizer(nlp):
+        # nlp.tokenizer.add_special_case(",", [{"ORTH": ","}])
+        infixes = nlp.Defaults.infixes + [r'(?!\w)(\()']
+        infix_regex = spacy.util.compile_infix_regex(infixes)
+        nlp.tokenizer.infix_finditer = infix_regex.finditer
+
+    def get_pipeline(self, profile=None):
+        """
+        Retrieve the spaCy pipeline of a profile, loading it with the shared vocab on first use.
+        @param profile: Profile name, defaults to the profile the Interpreter was created with
+        @return: spaCy Language object, or None if the profile only tokenizes.
+        """
+        profile = profile if profile else self.profile
+        if profile not in self.profiles:
+            raise ValueError(F"Unknown pipeline profile '{profile}'")
+        if not self.profiles[profile].parse:
+            return None
+        if profile not in self.__pipelines:
+            self.__logger.info(F"Loading {profile} pipeline profile ({self.profiles[profile].model})")
+            nlp = self.profiles[profile].load(vocab=self.nlp.vocab)
+            self.__configure_tokenizer(nlp)
+            self.__pipelines[profile] = nlp
+        return self.__pipelines[profile]
+
     def reset_annotation_identifiers(self):
         self.t = 0
         self.v = 0
@@ -87,25 +130,105 @@ class Interpreter:
         self.__basic_matcher = Matcher(self.nlp.vocab)
         # self.__basic_matcher.add('marker', [[self.__marker_regex]], on_match=self.__on_match)
 
-        new_matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
-        for lexicon in lexicon.get_ordered_lexicons():
-            if lexicon.name == "HPO":
-                continue
-            for entry in lexicon.get_entries():
-                patterns = Interpreter.get_term_variations(entry)
-                patterns = self.nlp.tokenizer.pipe(patterns)
-                new_matcher.add(entry.identifier, patterns, on_match=self.__on_match)
+        new_matcher = self.__load_cached_matcher(lexicon)
+        if new_matcher is None:
+            new_matcher = self.create_ontology_matcher()
+            for lexicon in lexicon.get_ordered_lexicons():
+                if lexicon.name == "HPO":
+                    continue
+                for entry in lexicon.get_entries():
+                    patterns = Interpreter.get_term_variations(entry)
+                    patterns = self.nlp.tokenizer.pipe(patterns)
+                    new_matcher.add(entry.identifier, patterns, on_match=self.__on_match)
+            self.__save_cached_matcher(new_matcher)
         self.__phrase_matcher = new_matcher
-        # Assign extension getters
-        Token.set_extension("matches_ontology", getter=self.ontology_getter)
-        Token.set_extension("is_trait", getter=self.is_trait_getter)
-        Token.set_extension("has_trait", getter=self.has_trait_getter)
-        Span.set_extension("has_ontology_term", getter=self.has_ontology_getter)
-        Span.set_extension("has_trait", getter=self.has_trait_getter)
-        Span.set_extension("is_trait", getter=self.is_trait_getter)
-        Doc.set_extension("has_ontology_term", getter=self.has_ontology_getter)
-        Doc.set_extension("has_trait", getter=self.has_trait_getter)
-        Doc.set_extension("is_trait", getter=self.is_trait_getter)
+        Interpreter.__register_extensions()
+
+    @staticmethod
+    def __register_extensions():
+        """
+        Register the spaCy extension attributes, once per process. The getters are static and read any state they
+        need from the Doc (e.g. doc.user_data), so several Interpreters (e.g. one per pipeline profile) can share them.
+        """
+        extensions = [(Token, "matches_ontology", Interpreter.ontology_getter),
+                      (Token, "is_trait", Interpreter.is_trait_getter),
+                      (Token, "has_trait", Interpreter.has_trait_getter),
+                      (Span, "has_ontology_term", Interpreter.has_ontology_getter),
+                      (Span, "has_trait", Interpreter.has_trait_getter),
+                      (Span, "is_trait", Interpreter.is_trait_getter),
+                      (Doc, "has_ontology_term", Interpreter.has_ontology_getter),
+                      (Doc, "has_trait", Interpreter.has_trait_getter),
+                      (Doc, "is_trait", Interpreter.is_trait_getter),
+                      (Token, "p_value", Interpreter.p_value_getter),
+                      (Span, "p_value", Interpreter.p_value_getter)]
+        for obj_type, name, getter in extensions:
+            if not obj_type.has_extension(name):
+                obj_type.set_extension(name, getter=getter)
+
+    def create_ontology_matcher(self):
+        """
+        Create an empty ontology term matcher using the configured matcher backend.
+        """
+        if self.matcher_backend == Interpreter.MATCHER_TRIE:
+            return TokenTrieMatcher(self.nlp.vocab)
+        return PhraseMatcher(self.nlp.vocab, attr="LOWER")
+
+    def __get_matcher_cache_path(self, version=None):
+        version = version if version else getattr(self.lexicon, "version", None)
+        if self.matcher_backend != Interpreter.MATCHER_TRIE or not version:
+            return None
+        return os.path.join(Interpreter.MATCHER_CACHE_DIR, F"{self.nlp.meta['name']}_{version}.trie")
+
+    def __load_cached_matcher(self, lexicon):
+        """
+        Load the serialised trie matcher built for this lexicon version and model. Failing that, the matcher cached
+        for an earlier lexicon version is patched with the change sets saved by the incremental lexicon updates since
+        then, rather than building the matcher from scratch, and cached for this version.
+        @return: TokenTrieMatcher object, or None if the matcher must be built.
+        """
+        path = self.__get_matcher_cache_path()
+        if not path:
+            return None
+        if os.path.isfile(path):
+            self.__logger.info(F"Loading cached ontology matcher {path}")
+            return TokenTrieMatcher.from_disk(path, self.nlp.vocab, on_match=self.__on_match)
+        base_version, change_sets = Ontology.get_change_set_chain(
+            lexicon.version, lambda x: os.path.isfile(self.__get_matcher_cache_path(x)))
+        if not change_sets:
+            return None
+        base_path = self.__get_matcher_cache_path(base_version)
+        self.__logger.info(F"Patching cached ontology matcher {base_path} with {len(change_sets)} lexicon change set(s)")
+        matcher = TokenTrieMatcher.from_disk(base_path, self.nlp.vocab, on_match=self.__on_match)
+        for change_set in change_sets:
+            self.__apply_change_set(matcher, change_set)
+        self.__save_cached_matcher(matcher)
+        return matcher
+
+    def __save_cached_matcher(self, matcher):
+        path = self.__get_matcher_cache_path()
+        if not path:
+            return
+        try:
+            matcher.to_disk(path)
+        except IOError as io:
+            self.__logger.error(F"Unable to save ontology matcher cache: {io}")
+
+    def __apply_change_set(self, matcher, change_set):
+        """
+        Patch an ontology matcher with an incremental lexicon update rather than rebuilding it.
+        @param matcher: Ontology matcher built for the change set's from_version
+        @param change_set: LexiconChangeSet produced by LexiconStore.update
+        """
+        stale_ids = [x for (_, x) in change_set.removed] + [x.identifier for (_, x) in change_set.modified]
+        for identifier in set(stale_ids):
+            if identifier in matcher:
+                matcher.remove(identifier)
+        for lexicon_name, entry in change_set.added + change_set.modified:
+            if lexicon_name == "HPO":
+                continue
+            patterns = Interpreter.get_term_variations(entry)
+            patterns = self.nlp.tokenizer.pipe(patterns)
+            matcher.add(entry.identifier, patterns, on_match=self.__on_match)
 
     @staticmethod
     def get_term_variations(term: LexiconEntry):
@@ -248,7 +371,8 @@ class Interpreter:
     # def add_study_specific_abbreviations(self, abbrevs):
     #     self.nlp
 
-    def ontology_getter(self, token):
+    @staticmethod
+    def ontology_getter(token):
         if token.ent_type_:
             if "HP:" in token.ent_type_:
                 return "HPO"
@@ -259,13 +383,15 @@ class Interpreter:
         else:
             return False
 
-    def has_ontology_getter(self, obj):
+    @staticmethod
+    def has_ontology_getter(obj):
         if any(["HP:" in token.ent_type_ or token.ent_type_[0] == "D" for token in obj if token.ent_type_]):
             return True
         else:
             return False
 
-    def is_trait_getter(self, token):
+    @staticmethod
+    def is_trait_getter(token):
         if type(token) != Token:
             return False
         if token.ent_type_:
@@ -276,7 +402,8 @@ class Interpreter:
         else:
             return False
 
-    def has_trait_getter(self, obj):
+    @staticmethod
+    def has_trait_getter(obj):
         if type(obj) != Span:
             return False
         if any(["HP:" in token.ent_type_ or token.ent_type_[0] == "D" for token in obj if token.ent_type_]):
@@ -284,10 +411,35 @@ class Interpreter:
         else:
             return False
 
+    @staticmethod
+    def p_value_getter(obj):
+        """
+        P-value of a PVAL entity, parsed once when the entity was recognised.
+        @return: Float value, or None if the entity is not a p-value or could not be parsed.
+        """
+        start = obj.idx if type(obj) == Token else obj.start_char
+        return obj.doc.user_data.get("p_values", {}).get(start)
+
     @staticmethod
     def get_ubiquitous_phenotype(fulltext, nlp):
         doc = nlp.process_corpus(fulltext, )
-        top_phenotypes = nlp.get_phenotype_stats(doc, nlp.lexicon)
+        return Interpreter.get_top_phenotype([doc], nlp.lexicon)
+
+    @staticmethod
+    def get_top_phenotype(docs, lexicon):
+        """
+        Identify the most frequently mentioned phenotype across the supplied documents.
+        @param docs: List of processed documents (e.g. the segments of a passage)
+        @param lexicon: Master lexicon used to identify the phenotype entities
+        @return: Dictionary of the phenotype count, ontology, ID and label, or None if no phenotypes are present.
+        """
+        top_phenotypes = {}
+        for doc in docs:
+            for name, stats in Interpreter.get_phenotype_stats(doc, lexicon).items():
+                if name in top_phenotypes:
+                    top_phenotypes[name]["Count"] += stats["Count"]
+                else:
+                    top_phenotypes[name] = stats
         top_phenotype = None
         for pheno in top_phenotypes:
             if not top_phenotype:
@@ -321,6 +473,8 @@ class Interpreter:
                       label=self.nlp.vocab.strings[match_id])
         try:
             doc.ents += (entity,)
+            if self.profiler:
+                self.profiler.add_count("entities_added")
         except Exception:
             entities_to_replace = []
             for ent in doc.ents:
@@ -330,19 +484,42 @@ class Interpreter:
             if entities_to_replace:
                 doc.ents = [x for x in doc.ents if x not in entities_to_replace]
                 doc.ents += (entity,)
+                if self.profiler:
+                    self.profiler.add_count("entities_replaced", len(entities_to_replace))
+            elif self.profiler:
+                self.profiler.add_count("overlaps_rejected")
             return
 
     @staticmethod
-    def _regex_match(pattern, doc, label, ignore_case=True):
+    def _regex_match(pattern, doc, label, ignore_case=True, select=None, max_p_value=None):
+        """
+        Add the regular expression matches of a pattern to the document entities, skipping overlapping matches.
+        The value of each PVAL entity is parsed as it is added, and made available through the p_value extension.
+        @param pattern: Regex string, or compiled pattern whose own flags are used instead of ignore_case
+        @param select: Function of each match returning whether it should be added, or None to add every match
+        @param max_p_value: Skip PVAL matches with a p-value above this threshold, if supplied
+        @return: Tuple of the number of entities added and the number of matches rejected due to overlaps.
+        """
+        added, rejected = 0, 0
+        p_values = doc.user_data.setdefault("p_values", {}) if label == "PVAL" else None
         chars_to_tokens = {}
         for token in doc:
             for i in range(token.idx, token.idx + len(token.text)):
                 chars_to_tokens[i] = token.i
-        if ignore_case:
+        if isinstance(pattern, re.Pattern):
+            matches = pattern.finditer(doc.text)
+        elif ignore_case:
             matches = re.finditer(pattern, doc.text, flags=re.IGNORECASE)
         else:
             matches = re.finditer(pattern, doc.text)
         for match in matches:
+            if select and not select(match):
+                continue
+            p_value = None
+            if label == "PVAL":
+                p_value = parse_p_value(match.group())
+                if not is_significant(p_value, max_p_value):
+                    continue
             start, end = match.span()
             if label == "PVAL":
                 span = doc.char_span(start, end, label=label, alignment_mode="expand")
@@ -351,7 +528,11 @@ class Interpreter:
             if span is not None:
                 try:
                     doc.ents += (span,)
+                    added += 1
+                    if p_values is not None:
+                        p_values[span.start_char] = p_value
                 except:
+                    rejected += 1
                     continue
             else:
                 start_token = chars_to_tokens.get(start)
@@ -360,15 +541,133 @@ class Interpreter:
                     span = doc[start_token:end_token + 1]
                     try:
                         doc.ents += (span,)
+                        added += 1
+                        if p_values is not None:
+                            p_values[span.start_char] = p_value
                     except Exception:
-                        return  # print(e)
+                        rejected += 1
+                        return added, rejected  # print(e)
+        return added, rejected
+
+    def _profiled_regex_match(self, pattern, doc, label, ignore_case=True, select=None):
+        """
+        Apply _regex_match within a "regex/<label>" profiling stage, recording entities added and overlaps rejected.
+        """
+        with profile_stage(self.profiler, F"regex/{label}"):
+            added, rejected = self._regex_match(pattern, doc, label, ignore_case, select, self.max_p_value)
+            if self.profiler:
+                self.profiler.add_count("patterns")
+                self.profiler.add_count("entities_added", added)
+                self.profiler.add_count("overlaps_rejected", rejected)
+
+    def _profiled_merge_spans(self, doc, entity_label):
+        with profile_stage(self.profiler, F"merge/{entity_label}"):
+            merges = self.__merge_spans(doc, entity_label)
+            if self.profiler:
+                self.profiler.add_count("merges", merges)
+
+    def parse(self, corpus, pipeline=None):
+        """
+        Apply the statistical pipeline (tokenizer, tagger, parser) to the supplied text, reusing the cached Doc
+        from an earlier run when a DocCache is attached.
+        @param corpus: Text to parse
+        @param pipeline: spaCy Language object to parse with, defaults to the Interpreter's profile pipeline
+        @return: Parsed SpaCy doc object without any rule based entities.
+        """
+        pipeline = pipeline if pipeline else self.nlp
+        doc = None
+        if self.doc_cache:
+            doc = self.doc_cache.get(corpus, pipeline)
+            if self.profiler:
+                self.profiler.add_count("doc_cache_hits" if doc is not None else "doc_cache_misses")
+        if doc is None:
+            doc = pipeline(corpus)
+            if self.doc_cache:
+                self.doc_cache.put(corpus, doc, pipeline)
+        if self.profiler:
+            self.profiler.add_count("tokens", len(doc))
+        return doc
 
-    def process_corpus(self, corpus, ontology_only=False):
+    def tokenize(self, corpus):
+        """
+        Tokenize and sentence split the supplied text using rules alone, without the statistical pipeline.
+        @param corpus: Text to tokenize
+        @return: SpaCy doc object with sentence boundaries but no tags or dependencies.
+        """
+        doc = self.__sentencizer(self.nlp.make_doc(corpus))
+        if self.profiler:
+            self.profiler.add_count("tokens", len(doc))
+        return doc
+
+    def get_candidate_patterns(self):
+        """
+        Patterns identifying sentences which may contain an association, keyed by entity label.
+        """
+        return config.candidate_sentence_patterns
+
+    def is_candidate_sentence(self, text):
+        """
+        Determine whether a sentence matches a candidate pattern for every label, and so needs a full parse.
+        """
+        patterns = self.get_candidate_patterns()
+        for label in patterns:
+            if not any(re.search(x, text, flags=re.IGNORECASE) for x in patterns[label]):
+                return False
+        return True
+
+    def get_candidate_segments(self, corpus):
+        """
+        Split text into contiguous segments of candidate sentences (plus surrounding context sentences) and the
+        remaining non-candidate sentences.
+        @param corpus: Passage text
+        @return: List of [start character, end character, is candidate] lists covering the whole text.
+        """
+        sents = list(self.__sentencizer(self.nlp.make_doc(corpus)).sents)
+        is_candidate = [self.is_candidate_sentence(x.text) for x in sents]
+        context = config.candidate_context_sentences
+        segments = []
+        for i in range(len(sents)):
+            candidate = any(is_candidate[max(0, i - context):i + context + 1])
+            if segments and segments[-1][2] == candidate:
+                segments[-1][1] = sents[i].end_char
+            else:
+                segments.append([segments[-1][1] if segments else 0, sents[i].end_char, candidate])
+        if segments:
+            segments[-1][1] = len(corpus)
+        return segments
+
+    def process_passage(self, corpus, ontology_only=False, profile=None):
+        """
+        Process a passage, only applying the statistical pipeline to candidate sentences when sentence pre-filtering
+        is enabled. Entities are matched across the whole passage either way.
+        @param corpus: Passage text
+        @param ontology_only: Only apply ontology term matching
+        @param profile: Pipeline profile name, defaults to the Interpreter's profile
+        @return: List of (character offset within the passage, processed doc) tuples.
+        """
+        if not self.prefilter_sentences:
+            return [(0, self.process_corpus(corpus, ontology_only=ontology_only, profile=profile))]
+        with profile_stage(self.profiler, "prefilter"):
+            segments = [x for x in self.get_candidate_segments(corpus) if corpus[x[0]:x[1]].strip()]
+            if self.profiler:
+                self.profiler.add_count("candidate_segments", len([x for x in segments if x[2]]))
+                self.profiler.add_count("skipped_segments", len([x for x in segments if not x[2]]))
+        results = []
+        for start, end, candidate in segments:
+            results.append((start, self.process_corpus(corpus[start:end], ontology_only=ontology_only,
+                                                       parse=candidate, profile=profile)))
+        return results
+
+    def process_corpus(self, corpus, ontology_only=False, parse=True, profile=None):
         """[Applies tokenization, entity recognition and dependency parsing to the supplied corpus.]
 
         Args:
             corpus ([string]): [corpus text for information extraction]
             ontology_only (bool, optional): [Only apply ontology term matching to the supplied corpus]. Defaults to False.
+            parse (bool, optional): [Apply the statistical pipeline, otherwise only tokenize and sentence split the
+            corpus prior to entity matching]. Defaults to True.
+            profile (str, optional): [Pipeline profile to apply, e.g. "tables" for tokenization and matching only].
+            Defaults to the Interpreter's profile.
 
         Returns:
             [SpaCy doc object]: [Parsed SpaCy doc object containing the processed input text with entities, tokens and dependencies.]
@@ -378,7 +677,9 @@ class Interpreter:
         # for parser in parsers:
         #     corpus = parser(corpus)
 
-        doc = self.nlp(corpus)
+        pipeline = self.get_pipeline(profile) if parse else None
+        with profile_stage(self.profiler, "parse" if pipeline else "parse/tokenize"):
+            doc = self.parse(corpus, pipeline) if pipeline else self.tokenize(corpus)
 
         old_ents, doc.ents = doc.ents, []
 
@@ -387,29 +688,37 @@ class Interpreter:
             for ent_label in config.regex_entity_patterns:
                 if isinstance(config.regex_entity_patterns[ent_label], list):
                     for pattern in config.regex_entity_patterns[ent_label]:
-                        self._regex_match(pattern, doc, ent_label)
+                        self._profiled_regex_match(pattern, doc, ent_label)
                         if ent_label not in self.__entity_labels:
                             self.__entity_labels.append(ent_label)
                 else:
-                    self._regex_match(config.regex_entity_patterns[ent_label], doc, ent_label)
+                    self._profiled_regex_match(config.regex_entity_patterns[ent_label], doc, ent_label)
                     if ent_label not in self.__entity_labels:
                         self.__entity_labels.append(ent_label)
 
-        self.__basic_matcher(doc)
-        self.__phrase_matcher(doc)
+        with profile_stage(self.profiler, "matcher/basic"):
+            self.__basic_matcher(doc)
+        with profile_stage(self.profiler, "matcher/phrase"):
+            self.__phrase_matcher(doc)
 
         # Ensure that rule-matched entities override data model entities when needed.
         if not ontology_only:
-            for ent in old_ents:
-                try:
-                    doc.ents += (ent,)
-                except:  # Default SpaCy entities should never override others.
-                    continue
+            with profile_stage(self.profiler, "merge/model_entities"):
+                for ent in old_ents:
+                    try:
+                        doc.ents += (ent,)
+                    except:  # Default SpaCy entities should never override others.
+                        if self.profiler:
+                            self.profiler.add_count("overlaps_rejected")
+                        continue
 
         # Ensure that multi-token entities are merged for extraction and association processing.
         for ent_label in self.__entity_labels:
-            self.__merge_spans(doc, ent_label)
-        doc = merge_entities(doc)
+            self._profiled_merge_spans(doc, ent_label)
+        with profile_stage(self.profiler, "merge/entities"):
+            if self.profiler:
+                self.profiler.add_count("merges", len(doc.ents))
+            doc = merge_entities(doc)
 
         return doc
 
@@ -419,10 +728,13 @@ class Interpreter:
         Merge document spans that are part of the same entity.
         @param doc: Processed document
         @param entity_label: Label of entities to merge.
+        @return: Number of entities merged.
         """
+        ents = [x for x in doc.ents if x.label_ == entity_label]
         with doc.retokenize() as retokenizer:
-            for ent in [x for x in doc.ents if x.label_ == entity_label]:
+            for ent in ents:
                 retokenizer.merge(doc[ent.start:ent.end])
+        return len(ents)
 
     @staticmethod
     def _filter_sents_by_entity(sents, entity_list, property_list=[]):
@@ -564,7 +876,8 @@ class Interpreter:
                 "id": ent.label_[ent.label_.index(":") + 2:] if ":" in ent.label_ else ent.label_,
                 "text": ent.text,  # self.trim_brackets(ent.text),
                 "offset": ent.start_char,
-                "length": ent.end_char - ent.start_char
+                "length": ent.end_char - ent.start_char,
+                "p_value": ent._.p_value if ent.label_ == "PVAL" else None
             })
         return result
 
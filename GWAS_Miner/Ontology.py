@@ -1,11 +1,23 @@
+import json
 import logging
+import os
 import pickle
 
-from py2neo import Graph
 from DataStructures import Lexicon, LexiconEntry, MasterLexicon
+from LexiconStore import LexiconChangeSet, LexiconStore, LexiconStoreError
 
 logger = logging.getLogger("GWAS Miner")
 
+ONTOLOGY_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "ontology_data")
+LEXICON_STORE_PATH = os.path.join(ONTOLOGY_DATA_DIR, "lexicon.db")
+# Pickled MasterLexicon written by earlier versions, migrated to the lexicon store on first use.
+LEGACY_LEXICON_PATH = os.path.join(ONTOLOGY_DATA_DIR, "lexicon.lexi")
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings", "config.ini")
+# Change sets saved by incremental lexicon store updates, named <from version>_<to version>.json.
+CHANGE_SET_DIR = os.path.join(ONTOLOGY_DATA_DIR, "changes")
+# Number of ontology terms retrieved from the graph database per query.
+EXPORT_PAGE_SIZE = 5000
+
 
 def validate_data(ont_data):
     if ont_data:
@@ -19,11 +31,17 @@ def validate_data(ont_data):
     return True
 
 
-def set_master_lexicon():
-    master = get_graph_ontology_data()
+def get_lexicon_store():
+    return LexiconStore(LEXICON_STORE_PATH)
+
+
+def set_master_lexicon(master=None):
+    if master is None:
+        master = get_graph_ontology_data()
+    store = get_lexicon_store()
     try:
-        with open("../ontology_data/lexicon.lexi", "wb") as file:
-            pickle.dump(master, file)
+        store.write(master)
+        return store.load_master_lexicon()
     except IOError as io:
         logger.error(F"Unable to create lexicon cache: {io}")
     except Exception as ex:
@@ -31,13 +49,26 @@ def set_master_lexicon():
     return master
 
 
+def __load_legacy_lexicon():
+    try:
+        with open(LEGACY_LEXICON_PATH, "rb") as file:
+            master = pickle.load(file)
+    except IOError as io:
+        logger.error(F"Unable to read legacy lexicon cache: {io}")
+        return None
+    logger.info("Migrating legacy lexicon cache to the lexicon store...")
+    return set_master_lexicon(master)
+
+
 def get_master_lexicon():
+    store = get_lexicon_store()
     master = None
     try:
-        with open("../ontology_data/lexicon.lexi", "rb") as file:
-            master = pickle.load(file)
-    except FileNotFoundError:
-        logger.info(F"Cache missing, creating new cache...")
+        master = store.load_master_lexicon()
+    except LexiconStoreError as lse:
+        if os.path.isfile(LEGACY_LEXICON_PATH):
+            return __load_legacy_lexicon()
+        logger.info(F"Cache missing or outdated ({lse}), creating new cache...")
         return set_master_lexicon()
     except IOError as io:
         logger.error(F"Unable to read lexicon cache: {io}")
@@ -46,24 +77,106 @@ def get_master_lexicon():
     return master
 
 
-def update_ontology_cache(qt_progress_signal=None, qt_finished_signal=None):
+def update_ontology_cache(qt_progress_signal=None, qt_finished_signal=None, fixture_dir=None, incremental=True,
+                          source_files=None):
     """[Updates the ontology cache files with data from the source ontology files.]
+
+    Args:
+        fixture_dir ([string], optional): [Directory of recorded ontology exports to use instead of Neo4j.]
+        source_files ([dict], optional): [Ontology name -> MeSH descriptor XML/HPO OBO file to build the lexicon
+        from instead of Neo4j.]
+        incremental ([bool], optional): [Apply only the changed entries to an existing lexicon store rather than
+        rebuilding it]. Defaults to True.
+
+    Returns:
+        [LexiconChangeSet]: [Changes applied by an incremental update, or None when the store was rebuilt.]
     """
     logger.info("Updating ontology cache.")
-    set_master_lexicon()
-    # get_graph_ontology_data()
+    if source_files:
+        import OntologyFiles
+        master = OntologyFiles.get_file_ontology_data(source_files)
+    else:
+        master = get_graph_ontology_data(fixture_dir=fixture_dir)
+    store = get_lexicon_store()
+    change_set = None
+    try:
+        if incremental:
+            store.meta()
+    except LexiconStoreError:
+        incremental = False
+    if incremental:
+        change_set = store.update(master)
+        if change_set:
+            change_set.save(get_change_set_path(change_set))
+    else:
+        set_master_lexicon(master)
     logger.info("Finished updating ontology cache.")
     if qt_finished_signal:
         from GUI import QtFinishedResponse
-        response = QtFinishedResponse(status=True, text="Updated ontology data.")
+        response = QtFinishedResponse(status=True, text=F"Updated ontology data ({change_set}).")
         qt_finished_signal.emit(response)
+    return change_set
 
 
-def get_graph_ontology_data():
-    ontologies = ["MESH", "HPO"]
+def get_change_set_path(change_set):
+    """
+    Location of the saved change set between two lexicon store versions.
+    """
+    if not os.path.isdir(CHANGE_SET_DIR):
+        os.makedirs(CHANGE_SET_DIR)
+    return os.path.join(CHANGE_SET_DIR, F"{change_set.from_version}_{change_set.to_version}.json")
+
+
+def get_change_set_chain(to_version, has_base, directory=CHANGE_SET_DIR):
+    """
+    Find the saved change sets leading to a lexicon store version from the latest earlier version which has_base
+    accepts, e.g. one with a cached ontology matcher.
+    @param to_version: Lexicon store version to reach
+    @param has_base: Function of a version returning whether it can be used as the starting point
+    @param directory: Directory of saved change sets
+    @return: Tuple of the base version and the LexiconChangeSet objects to apply to it in order, or (None, []) if
+    there is no such chain.
+    """
+    if not to_version or not os.path.isdir(directory):
+        return None, []
+    previous = {}
+    for file_name in os.listdir(directory):
+        if file_name.endswith(".json") and "_" in file_name:
+            from_version, version = file_name[:-len(".json")].split("_", 1)
+            previous[version] = (from_version, os.path.join(directory, file_name))
+    paths = []
+    version = to_version
+    while version in previous and len(paths) < len(previous):
+        version, path = previous[version]
+        paths.insert(0, path)
+        if has_base(version):
+            return version, [LexiconChangeSet.load(x) for x in paths]
+    return None, []
+
+
+def get_graph_ontology_data(ontologies=None, concurrent=True, fixture_dir=None, record_dir=None):
+    """[Builds the master lexicon from the ontology graph database.]
+
+    Args:
+        ontologies ([list], optional): [Ontology labels to export]. Defaults to MESH and HPO.
+        concurrent ([bool], optional): [Export each ontology on its own thread]. Defaults to True.
+        fixture_dir ([string], optional): [Directory of recorded exports (<ontology>.json) to replay offline.]
+        record_dir ([string], optional): [Directory to record the exported rows to for later replay.]
+
+    Returns:
+        [MasterLexicon]: [Master lexicon containing a lexicon per ontology.]
+    """
+    if not ontologies:
+        ontologies = ["MESH", "HPO"]
     master_lexi = MasterLexicon()
-    for ont in ontologies:
-        lexi = __retrieve_ont_lexicon(ont)
+    if concurrent and len(ontologies) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(ontologies)) as executor:
+            lexicons = list(executor.map(lambda ont: __retrieve_ont_lexicon(ont, fixture_dir, record_dir),
+                                         ontologies))
+    else:
+        lexicons = [__retrieve_ont_lexicon(ont, fixture_dir, record_dir) for ont in ontologies]
+    for lexi in lexicons:
         master_lexi.add_lexicon(lexi)
     return master_lexi
 
@@ -74,44 +187,118 @@ def output_lexicon_terms(lexi):
             fout.write(", ".join(entry.tree_id()) + "\t" + entry.identifier + "\t" + entry.name() + "\n")
 
 
-def __retrieve_ont_lexicon(ontology_name):
-    try:
-        graph = Graph(scheme="bolt", host="localhost", password="12345")
-        ont_query = ""
-        if ontology_name == "MESH":
-            ont_query = """
-                MATCH (n:MESH)
-                WHERE n.miner_included = true
-                WITH COLLECT(n.id) AS included
-                
-                MATCH (m:MESH)
-                WHERE m.miner_included = false
-                WITH COLLECT(m.id) AS excluded, included
-                
-                MATCH (n:MESH)-[:HAS_SYNONYM*0..]->(syn{miner_included: True})
-                WHERE n.id IN included AND NOT n.id in excluded AND n.miner_included = TRUE
-                WITH n, COLLECT(syn.FSN) AS syns
-                RETURN DISTINCT n.id, n.FSN, n.treeid, syns
-            """
-        else:
-            ont_query = F"""
-            MATCH (n:{ontology_name})-[:HAS_SYNONYM*0..]->(m)
-            WHERE n:Term
-            WITH n, COLLECT(m.FSN) AS syns
-            RETURN n.id, n.FSN, n.treeid, syns
-            """
-        cursor = graph.run(ont_query)
-        lexi = Lexicon(name=ontology_name)
-        while cursor.forward():
-            old_entry = lexi.get_entry_by_term(str(cursor.current[1]))
-            if old_entry:
-                if ontology_name == "MESH":
-                    old_entry.add_tree_id(str(cursor.current[2]))
-                continue
-            entry = LexiconEntry(str(cursor.current[0]), name=str(cursor.current[1]), tree_id=str(cursor.current[2]))
-            for syn in cursor.current[3]:
-                entry.add_synonym(id=entry.identifier, name=syn)
-            lexi.add_entry(entry)
-        return lexi
-    except ConnectionRefusedError as cre:
-        raise cre
+def get_graph():
+    """
+    Connect to the ontology graph database using the [neo4j] settings in config.ini.
+    """
+    from configparser import ConfigParser
+    from py2neo import Graph
+    config_settings = ConfigParser()
+    config_settings.read(CONFIG_PATH)
+    return Graph(scheme=config_settings.get("neo4j", "scheme", fallback="bolt"),
+                 host=config_settings.get("neo4j", "host", fallback="localhost"),
+                 password=config_settings.get("neo4j", "password", fallback="12345"))
+
+
+class RecordedGraph:
+    """
+    Offline stand-in for a py2neo Graph which replays the rows of a recorded ontology export.
+    """
+
+    def __init__(self, path):
+        with open(path, "r", encoding="utf-8") as fin:
+            self.rows = json.load(fin)
+
+    def run(self, query, skip=0, limit=None, **kwargs):
+        return RecordedCursor(self.rows[skip:skip + limit] if limit else self.rows[skip:])
+
+
+class RecordedCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+
+def get_ontology_query(ontology_name):
+    """
+    Retrieve the paged export query for an ontology. Each page returns the id, FSN, tree id and synonym FSNs of
+    each term, ordered so that SKIP/LIMIT paging is stable.
+    """
+    if ontology_name == "MESH":
+        return """
+            MATCH (n:MESH)
+            WHERE n.miner_included = true
+            WITH n ORDER BY n.id, n.treeid SKIP $skip LIMIT $limit
+            MATCH (n)-[:HAS_SYNONYM*0..]->(syn {miner_included: true})
+            WITH n, COLLECT(DISTINCT syn.FSN) AS syns
+            RETURN n.id AS id, n.FSN AS fsn, n.treeid AS treeid, syns
+            ORDER BY id, treeid
+        """
+    return F"""
+        MATCH (n:{ontology_name}:Term)
+        WITH n ORDER BY n.id SKIP $skip LIMIT $limit
+        MATCH (n)-[:HAS_SYNONYM*0..]->(m)
+        WITH n, COLLECT(m.FSN) AS syns
+        RETURN n.id AS id, n.FSN AS fsn, n.treeid AS treeid, syns
+        ORDER BY id
+    """
+
+
+def export_ontology_rows(ontology_name, graph, page_size=EXPORT_PAGE_SIZE):
+    """
+    Generator yielding the exported rows of an ontology, retrieved from the graph a page at a time.
+    """
+    query = get_ontology_query(ontology_name)
+    skip = 0
+    while True:
+        page = graph.run(query, skip=skip, limit=page_size).data()
+        yield from page
+        if len(page) < page_size:
+            break
+        skip += page_size
+
+
+def build_lexicon(ontology_name, rows):
+    """
+    Build a Lexicon in a single pass over exported ontology rows.
+
+    Rows sharing a term (by FSN or synonym) with an earlier row are folded into the earlier entry, with MeSH
+    rows contributing their additional tree numbers.
+    """
+    entries = []
+    term_index = {}
+    for row in rows:
+        fsn = str(row["fsn"])
+        old_entry = term_index.get(fsn.lower())
+        if old_entry:
+            if ontology_name == "MESH":
+                old_entry.add_tree_id(str(row["treeid"]))
+            continue
+        entry = LexiconEntry(str(row["id"]), name=fsn, tree_id=str(row["treeid"]))
+        for syn in row["syns"]:
+            entry.add_synonym(id=entry.identifier, name=syn)
+        term_index.setdefault(fsn.lower(), entry)
+        for syn in entry.synonyms():
+            term_index.setdefault(syn["name"].lower(), entry)
+        entries.append(entry)
+    lexi = Lexicon(name=ontology_name)
+    for entry in entries:
+        lexi.add_entry(entry)
+    return lexi
+
+
+def __retrieve_ont_lexicon(ontology_name, fixture_dir=None, record_dir=None):
+    if fixture_dir:
+        graph = RecordedGraph(os.path.join(fixture_dir, F"{ontology_name}.json"))
+    else:
+        graph = get_graph()
+    rows = export_ontology_rows(ontology_name, graph)
+    if record_dir:
+        rows = list(rows)
+        with open(os.path.join(record_dir, F"{ontology_name}.json"), "w", encoding="utf-8") as fout:
+            json.dump(rows, fout, ensure_ascii=False)
+    lexi = build_lexicon(ontology_name, rows)
+    logger.info(F"Exported {len(lexi.get_entries())} {ontology_name} lexicon entries.")
+    return lexi
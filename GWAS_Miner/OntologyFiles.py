@@ -0,0 +1,172 @@
+import gzip
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger("GWAS Miner")
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+ONTOLOGY_RULES_PATH = os.path.join(PACKAGE_DIR, "settings", "ontologies.json")
+
+
+def load_ontology_rules(path=ONTOLOGY_RULES_PATH):
+    """
+    Retrieve the per-ontology inclusion rules, standing in for the miner_included flags of the graph database.
+    The MeSH graph includes descriptors from every tree (the blacklist drops place names, algorithms, etc. which it
+    would otherwise match), so the default rules include every tree prefix and exclude only the blacklisted terms.
+    Unlike the graph, which can exclude individual synonyms, the rules apply to whole descriptors.
+    @param path: Location of the ontology rules JSON file
+    @return: Dictionary of ontology name -> rules
+    """
+    with open(path, "r", encoding="utf-8") as fin:
+        rules = json.load(fin)
+    blacklist = rules.get("MESH", {}).get("blacklist")
+    if blacklist:
+        rules["MESH"]["excluded_ids"], rules["MESH"]["excluded_terms"] = \
+            load_blacklist(os.path.join(PACKAGE_DIR, blacklist))
+    return rules
+
+
+def load_blacklist(path):
+    """
+    Read the tab separated blacklist of MeSH descriptor IDs and terms excluded from the lexicon.
+    @return: Tuple of the excluded identifiers and lower case excluded terms
+    """
+    ids, terms = [], []
+    with open(path, "r", encoding="utf-8") as fin:
+        for line in fin:
+            line = line.rstrip("\n").split("\t")
+            if len(line) < 2:
+                continue
+            ids.append(line[0])
+            terms.append(line[1].lower())
+    return ids, terms
+
+
+def __open_source(path, mode="rb"):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def __is_mesh_tree_included(tree_number, rules):
+    included = rules.get("included_tree_prefixes", [])
+    excluded = rules.get("excluded_tree_prefixes", [])
+    if included and not any(tree_number.startswith(x) for x in included):
+        return False
+    return not any(tree_number.startswith(x) for x in excluded)
+
+
+def iter_mesh_rows(path, rules):
+    """
+    Stream included MeSH descriptors from a descriptor XML file (e.g. desc2022.xml), without building a DOM.
+    @param path: MeSH descriptor XML file, optionally gzipped
+    @param rules: MESH inclusion rules
+    @return: Generator of export rows (id, fsn, treeid, syns), one per included tree number
+    """
+    excluded_ids = set(rules.get("excluded_ids", []))
+    excluded_terms = set(rules.get("excluded_terms", []))
+    with __open_source(path) as fin:
+        context = ET.iterparse(fin, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end" or elem.tag != "DescriptorRecord":
+                continue
+            identifier = elem.findtext("DescriptorUI")
+            name = elem.findtext("DescriptorName/String")
+            tree_numbers = [x.text for x in elem.iterfind("TreeNumberList/TreeNumber")]
+            if not identifier or not name:
+                logger.warning(F"Skipping MeSH descriptor record without an identifier or name: {identifier}")
+            elif identifier not in excluded_ids and name.lower() not in excluded_terms:
+                tree_numbers = [x for x in tree_numbers if __is_mesh_tree_included(x, rules)]
+                if tree_numbers:
+                    syns = []
+                    for term in elem.iterfind("ConceptList/Concept/TermList/Term/String"):
+                        if term.text not in syns and term.text.lower() not in excluded_terms:
+                            syns.append(term.text)
+                    for tree_number in tree_numbers:
+                        yield {"id": identifier, "fsn": name, "treeid": tree_number, "syns": syns}
+            root.clear()
+
+
+def iter_obo_rows(path, rules):
+    """
+    Stream terms from an OBO ontology file (e.g. hp.obo) a stanza at a time.
+    @param path: OBO file, optionally gzipped
+    @param rules: HPO inclusion rules
+    @return: Generator of export rows (id, fsn, treeid, syns)
+    """
+    scopes = rules.get("synonym_scopes", ["EXACT"])
+    include_obsolete = rules.get("include_obsolete", False)
+    term = None
+    with __open_source(path, "rt") as fin:
+        for line in fin:
+            line = line.strip()
+            if line.startswith("["):
+                if term and (include_obsolete or not term["obsolete"]):
+                    yield __get_obo_row(term)
+                term = {"id": None, "name": None, "syns": [], "obsolete": False} if line == "[Term]" else None
+            elif term is None or not line or ":" not in line:
+                continue
+            else:
+                tag, value = line.split(":", 1)
+                value = value.strip()
+                if tag == "id":
+                    term["id"] = value
+                elif tag == "name":
+                    term["name"] = value
+                elif tag == "is_obsolete":
+                    term["obsolete"] = value == "true"
+                elif tag == "synonym" and value.startswith('"'):
+                    text, _, scope = value[1:].partition('"')
+                    if scope.split(" ")[1:2] and scope.split(" ")[1] in scopes:
+                        term["syns"].append(text)
+        if term and (include_obsolete or not term["obsolete"]):
+            yield __get_obo_row(term)
+
+
+def __get_obo_row(term):
+    syns = [term["name"]] + [x for x in term["syns"] if x != term["name"]]
+    return {"id": term["id"], "fsn": term["name"], "treeid": None, "syns": syns}
+
+
+def build_ontology_lexicon(ontology_name, path, rules=None):
+    """
+    Build the Lexicon for a single ontology source file.
+    @param ontology_name: MESH or HPO
+    @param path: Location of the MeSH descriptor XML or HPO OBO file
+    @param rules: Inclusion rules for this ontology, defaults to the rules in settings/ontologies.json
+    @return: Lexicon object
+    """
+    from Ontology import build_lexicon
+    if rules is None:
+        rules = load_ontology_rules().get(ontology_name, {})
+    rows = iter_mesh_rows(path, rules) if ontology_name == "MESH" else iter_obo_rows(path, rules)
+    lexi = build_lexicon(ontology_name, rows)
+    logger.info(F"Built {len(lexi.get_entries())} {ontology_name} lexicon entries from {path}.")
+    return lexi
+
+
+def get_file_ontology_data(sources, rules_path=ONTOLOGY_RULES_PATH, parallel=True):
+    """
+    Build the master lexicon from ontology files instead of the graph database.
+    @param sources: Dictionary of ontology name -> source file path, e.g. {"MESH": "desc2022.xml", "HPO": "hp.obo"}
+    @param rules_path: Location of the ontology rules JSON file
+    @param parallel: Parse each ontology file in its own process
+    @return: MasterLexicon object
+    """
+    from DataStructures import MasterLexicon
+    rules = load_ontology_rules(rules_path)
+    names = list(sources.keys())
+    args = [(x, sources[x], rules.get(x, {})) for x in names]
+    if parallel and len(names) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=len(names)) as executor:
+            lexicons = list(executor.map(build_ontology_lexicon, *zip(*args)))
+    else:
+        lexicons = [build_ontology_lexicon(*x) for x in args]
+    master_lexi = MasterLexicon()
+    for lexi in lexicons:
+        master_lexi.add_lexicon(lexi)
+    return master_lexi
@@ -5,6 +5,8 @@
 
 #### Write a BioC collection in JSON
 import json
+import os
+import threading
 
 import bioc
 
@@ -155,15 +157,53 @@ class JSON2BioC:
         return collection
 
 
+def get_temp_path(out_file):
+    return F"{out_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def replace_output(temp_file, out_file):
+    """
+    Move a completely written temporary file into place, so partially written output is never visible.
+    """
+    try:
+        os.replace(temp_file, out_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def write_xml(bioc_collection, out_file):
+    temp_file = get_temp_path(out_file)
+    try:
+        writer = bioc.BioCXMLWriter(temp_file, bioc_collection)
+        writer.write()
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    replace_output(temp_file, out_file)
+
+
+def write_json(bioc_json, out_file):
+    temp_file = get_temp_path(out_file)
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(bioc_json, f, indent=2)
+            print(file=f)
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    replace_output(temp_file, out_file)
+
+
 def output_xml(in_file, out_file):
     bioc_json = None
     bioc_json = json.loads(in_file)
 
     json2bioc = JSON2BioC()
     bioc_collection = json2bioc.collection(bioc_json)
-
-    writer = bioc.BioCXMLWriter(out_file, bioc_collection)
-    writer.write()
+    write_xml(bioc_collection, out_file)
 
 
 def convert_xml_to_json(in_file, out_file):
@@ -172,6 +212,19 @@ def convert_xml_to_json(in_file, out_file):
 
     bioc2json = BioC2JSON()
     bioc_json = bioc2json.collection(reader.collection)
-    with open(out_file, 'w') as f:
-        json.dump(bioc_json, f, indent=2)
-        print(file=f)
+    write_json(bioc_json, out_file)
+
+
+def output_study(in_file, xml_file=None, json_file=None):
+    """
+    Write a BioC JSON string as XML and/or JSON from a single in-memory collection, rather than writing the XML and
+    reading it back to produce the JSON.
+    @param in_file: BioC JSON string
+    @param xml_file: BioC XML output path
+    @param json_file: BioC JSON output path
+    """
+    bioc_collection = JSON2BioC().collection(json.loads(in_file))
+    if xml_file:
+        write_xml(bioc_collection, xml_file)
+    if json_file:
+        write_json(BioC2JSON().collection(bioc_collection), json_file)
@@ -0,0 +1,96 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger("GWAS Miner")
+
+DEFAULT_WORKERS = 2
+# Studies waiting to be written before submit() blocks the processing loop.
+DEFAULT_MAX_PENDING = 16
+
+
+class OutputWriter:
+    """
+    Background writer serialising finished studies on worker threads, so that the processing loop does not wait
+    on JSON/XML conversion and disk I/O. The pending queue is bounded, applying backpressure to the processing loop
+    if output falls behind rather than holding an unbounded number of studies in memory.
+
+    Studies must not be modified after they have been submitted.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self.__queue = queue.Queue(maxsize=max_pending)
+        self.__lock = threading.Lock()
+        self.failures = []
+        self.written = 0
+        self.__completed = []
+        self.__threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self.__run, name=F"OutputWriter-{i}", daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+        self.__closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, label, fn, *args):
+        """
+        Queue an output task, blocking while the queue is full.
+        @param label: Identifier of the output, reported in failures (e.g. the input file name)
+        @param fn: Function performing the serialisation and writing
+        @param args: Arguments for fn
+        """
+        if self.__closed:
+            raise RuntimeError("Output writer has been closed")
+        self.__queue.put((label, fn, args))
+
+    def __run(self):
+        while True:
+            task = self.__queue.get()
+            try:
+                if task is None:
+                    return
+                label, fn, args = task
+                try:
+                    fn(*args)
+                    with self.__lock:
+                        self.written += 1
+                        self.__completed.append(label)
+                except Exception as e:
+                    logger.exception(F"Failed to write output for {label}")
+                    with self.__lock:
+                        self.failures.append((label, e))
+            finally:
+                self.__queue.task_done()
+
+    def pop_completed(self):
+        """
+        Retrieve the labels of the outputs written successfully since the last call, so that the caller can record
+        them as complete on its own thread.
+        @return: List of output labels
+        """
+        with self.__lock:
+            completed, self.__completed = self.__completed, []
+        return completed
+
+    def flush(self):
+        """
+        Wait until every submitted output has been written.
+        """
+        self.__queue.join()
+
+    def close(self):
+        """
+        Write any remaining outputs and stop the worker threads.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        for i in range(len(self.__threads)):
+            self.__queue.put(None)
+        for thread in self.__threads:
+            thread.join()
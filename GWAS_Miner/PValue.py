@@ -0,0 +1,120 @@
+import math
+import re
+from bisect import bisect_right
+
+# Exponent of a power of ten, e.g. "−8", "<sup>-8</sup>", "⁻⁸", "(-8)" and "^-8".
+EXPONENT_REGEX = r"(?:<sup>\s*|(?P<bracket>\()\s*|\^\s*)?[-−–⁻]\s*(?P<exponent>[0-9⁰¹²³⁴⁵⁶⁷⁸⁹]+)" \
+                 r"(?(bracket)\s*\)|(?:\s*</sup>)?)"
+# Scientific notation p-values as written in publications, e.g. "3.2 × 10−8", "3.2x10<sup>-8</sup>", "3.2 × 10⁻⁸",
+# "3.2 × 10(-8)", "3.2x10^-8" and "3.2E-08". Applied case insensitively.
+PVALUE_REGEX = r"(?<![\w.])(?P<mantissa>\d+(?:\.\d+)?)(?:\s*[x*×·]\s*10\s*|\s*e\s*)" + EXPONENT_REGEX
+pvalue_pattern = re.compile(PVALUE_REGEX, re.IGNORECASE)
+# Fallbacks for p-values already known to be one, e.g. PVAL entities such as "P < 10−5" and "p = 0.003".
+power_pattern = re.compile(r"(?<![\w.])10\s*" + EXPONENT_REGEX)
+decimal_pattern = re.compile(r"(?<![\w.])\d*\.?\d+")
+# A number starting a power of ten which could not be parsed, e.g. "3.2 × 10(-n)", so is not a plain decimal.
+unparsed_power_pattern = re.compile(r"(?:\d+(?:\.\d+)?\s*[x*×·]\s*)?10\s*(?:<sup>|[(^]|[-−–⁻])", re.IGNORECASE)
+SUPERSCRIPT_DIGITS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹", "0123456789")
+
+
+def get_match_value(match):
+    """
+    @param match: Match of pvalue_pattern
+    @return: Float value of the matched p-value
+    """
+    return float(F"{match.group('mantissa')}e-{match.group('exponent').translate(SUPERSCRIPT_DIGITS)}")
+
+
+def parse_p_value(text):
+    """
+    Parse the first p-value of a text, such as a PVAL entity or a curated value.
+    @param text: Text containing a scientific notation p-value, a power of ten or a plain number
+    @return: Float value, or None if no p-value is found.
+    """
+    if not text:
+        return None
+    match = pvalue_pattern.search(text)
+    if match:
+        return get_match_value(match)
+    match = power_pattern.search(text)
+    if match:
+        return float(F"1e-{match.group('exponent').translate(SUPERSCRIPT_DIGITS)}")
+    match = decimal_pattern.search(text)
+    if match and not unparsed_power_pattern.match(text, match.start()):
+        return float(match.group())
+    return None
+
+
+def get_significance_infons(value):
+    """
+    Numeric infons of a significance annotation, so that consumers need not parse its text.
+    @param value: P-value, or None if it could not be parsed
+    @return: Dictionary of the p-value and its log10, empty if there is no positive value.
+    """
+    if value is None or value <= 0:
+        return {}
+    return {"p_value": value, "log10_p_value": math.log10(value)}
+
+
+def is_significant(value, max_p_value):
+    """
+    @param value: P-value, or None if it could not be parsed
+    @param max_p_value: Significance threshold, or None to accept every p-value
+    @return: False only if the p-value is known to be above the threshold.
+    """
+    return max_p_value is None or value is None or value <= max_p_value
+
+
+class PValueInterval:
+    """
+    Range of values matching a curated p-value, allowing for the rounding of its mantissa by publications.
+
+    A curated value of n × 10^-e matches values from (n - 1) × 10^-e up to, but excluding, (n + 2) × 10^-e, so 3.2E-8
+    matches anything from 2 × 10^-8 to 4.99 × 10^-8.
+    """
+
+    # Lowest mantissa of the interval of a curated value with a mantissa of 1.
+    MIN_MANTISSA = 0.1
+
+    def __init__(self, text):
+        """
+        @param text: Curated p-value, e.g. "3E-08"
+        """
+        self.text = text
+        match = pvalue_pattern.search(text)
+        if match:
+            mantissa = int(float(match.group("mantissa")))
+            scale = 10 ** -int(match.group("exponent").translate(SUPERSCRIPT_DIGITS))
+        else:
+            value = float(text.strip())
+            scale = 10 ** math.floor(math.log10(value))
+            mantissa = int(round(value / scale, 9))
+        self.low = max(mantissa - 1, self.MIN_MANTISSA) * scale
+        self.high = (mantissa + 2) * scale
+
+    def contains(self, value):
+        return value is not None and self.low <= value < self.high
+
+
+class PValueIndex:
+    """
+    Intervals of a set of curated p-values sorted by their lower bounds, determining whether a value matches any of
+    them with a binary search rather than testing each in turn.
+    """
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda x: x.low)
+        self.__lows = [x.low for x in intervals]
+        # Highest upper bound of the intervals up to each position, as intervals may overlap.
+        self.__highs = []
+        for interval in intervals:
+            self.__highs.append(max(interval.high, self.__highs[-1]) if self.__highs else interval.high)
+
+    def __len__(self):
+        return len(self.__lows)
+
+    def contains(self, value):
+        if value is None:
+            return False
+        i = bisect_right(self.__lows, value)
+        return i > 0 and value < self.__highs[i - 1]
@@ -0,0 +1,77 @@
+import logging
+import os
+from configparser import ConfigParser
+
+logger = logging.getLogger("GWAS Miner")
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings", "config.ini")
+SECTION_PREFIX = "profile."
+
+PROFILE_ACCURATE = "accurate"
+PROFILE_FAST = "fast"
+PROFILE_TABLES = "tables"
+
+
+class PipelineProfile:
+    """
+    Named spaCy pipeline configuration.
+
+    A profile which does not parse only uses the tokenizer of its model, with sentence boundaries assigned by rule,
+    leaving entity recognition to the regex patterns and matchers.
+    """
+
+    def __init__(self, name, model, disable=None, merge_noun_chunks=False, parse=True):
+        self.name = name
+        self.model = model
+        self.disable = disable if disable else []
+        self.merge_noun_chunks = merge_noun_chunks
+        self.parse = parse
+
+    def load(self, vocab=True):
+        """
+        Load the spaCy pipeline of this profile.
+        @param vocab: Vocab object to share with an already loaded pipeline, so that string hashes, matchers and
+        entity labels are interchangeable between profiles.
+        @return: spaCy Language object
+        """
+        import spacy
+        nlp = spacy.load(self.model, vocab=vocab, disable=self.disable)
+        if not self.parse:
+            nlp.select_pipes(disable=nlp.pipe_names)
+        elif self.merge_noun_chunks:
+            nlp.add_pipe("merge_noun_chunks")
+        return nlp
+
+    def jsonable(self):
+        return dict(self.__dict__)
+
+
+DEFAULT_PROFILES = {
+    PROFILE_ACCURATE: PipelineProfile(PROFILE_ACCURATE, "en_core_sci_scibert", ["ner"], True, True),
+    PROFILE_FAST: PipelineProfile(PROFILE_FAST, "en_core_sci_sm", ["ner"], True, True),
+    PROFILE_TABLES: PipelineProfile(PROFILE_TABLES, "en_core_sci_sm", [], False, False),
+}
+
+
+def load_profiles(path=CONFIG_PATH):
+    """
+    Read the [profile.<name>] sections of config.ini, falling back to the default profiles for any not defined.
+    @param path: config.ini file path
+    @return: Dictionary of profile name to PipelineProfile
+    """
+    profiles = dict(DEFAULT_PROFILES)
+    config_settings = ConfigParser()
+    config_settings.read(path)
+    for section in config_settings.sections():
+        if not section.startswith(SECTION_PREFIX):
+            continue
+        name = section[len(SECTION_PREFIX):]
+        default = DEFAULT_PROFILES.get(name, DEFAULT_PROFILES[PROFILE_ACCURATE])
+        disable = config_settings.get(section, "disable", fallback=None)
+        profiles[name] = PipelineProfile(
+            name,
+            config_settings.get(section, "model", fallback=default.model),
+            [x.strip() for x in disable.split(",") if x.strip()] if disable is not None else default.disable,
+            config_settings.getboolean(section, "merge_noun_chunks", fallback=default.merge_noun_chunks),
+            config_settings.getboolean(section, "parse", fallback=default.parse))
+    return profiles
@@ -0,0 +1,221 @@
+import contextlib
+import heapq
+import json
+import logging
+import time
+
+logger = logging.getLogger("GWAS Miner")
+
+# Upper bucket bounds for per-call stage durations (seconds) and per-call counter values.
+DURATION_BOUNDS = [0.001, 0.01, 0.1, 1, 10, 60]
+COUNT_BOUNDS = [0, 1, 10, 100, 1000, 10000]
+# Number of slowest documents retained by a profiler.
+SLOWEST_DOCUMENTS = 10
+
+
+class Histogram:
+    """
+    Fixed bucket histogram, the final bucket holding every value above the largest bound.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def jsonable(self):
+        return {"bounds": self.bounds, "buckets": self.buckets, "count": self.count, "total": self.total,
+                "min": self.minimum, "max": self.maximum}
+
+
+class StageTiming:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.durations = Histogram(DURATION_BOUNDS)
+        self.counts = {}
+        self.count_histograms = {}
+
+    def record_call(self, wall, cpu, counts):
+        self.calls += 1
+        self.wall_seconds += wall
+        self.cpu_seconds += cpu
+        self.durations.observe(wall)
+        for name in counts:
+            self.counts[name] = self.counts.get(name, 0) + counts[name]
+            if name not in self.count_histograms:
+                self.count_histograms[name] = Histogram(COUNT_BOUNDS)
+            self.count_histograms[name].observe(counts[name])
+
+    def jsonable(self):
+        return {"calls": self.calls, "wall_seconds": self.wall_seconds, "cpu_seconds": self.cpu_seconds,
+                "durations": self.durations.jsonable(), "counts": self.counts,
+                "count_histograms": {x: self.count_histograms[x].jsonable() for x in self.count_histograms}}
+
+
+class DocumentRecord:
+    def __init__(self, label):
+        self.label = label
+        self.wall_seconds = 0.0
+        self.stage_seconds = {}
+        self.counts = {}
+
+    def __lt__(self, other):
+        return self.wall_seconds < other.wall_seconds
+
+    def jsonable(self):
+        return {"label": self.label, "wall_seconds": self.wall_seconds, "stage_seconds": self.stage_seconds,
+                "counts": self.counts}
+
+
+class StageProfiler:
+    """
+    Accumulates wall clock time, CPU time and counters per named pipeline stage.
+
+    Stages may be nested (e.g. process_corpus called from within get_ubiquitous_phenotype), in which case time spent
+    in an inner stage is only attributed to the inner stage, so the stage totals add up to the profiled run time.
+    Sub-stages are named "<stage>/<sub-stage>" and can be totalled per stage with group_totals().
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.slowest_documents = []
+        self.__stack = []
+        self.__document = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        timing = self.stages.get(name)
+        if timing is None:
+            timing = StageTiming(name)
+            self.stages[name] = timing
+        # [start wall, start cpu, wall spent in child stages, cpu spent in child stages, counts for this call]
+        frame = [time.perf_counter(), time.process_time(), 0.0, 0.0, {}]
+        self.__stack.append(frame)
+        try:
+            yield timing
+        finally:
+            self.__stack.pop()
+            wall = time.perf_counter() - frame[0]
+            cpu = time.process_time() - frame[1]
+            timing.record_call(wall - frame[2], cpu - frame[3], frame[4])
+            if self.__stack:
+                self.__stack[-1][2] += wall
+                self.__stack[-1][3] += cpu
+            if self.__document:
+                stage_seconds = self.__document.stage_seconds
+                stage_seconds[name] = stage_seconds.get(name, 0.0) + wall - frame[2]
+
+    @contextlib.contextmanager
+    def document(self, label):
+        """
+        Attribute the stage times and counts recorded within this context to a document (e.g. a study), retaining
+        the slowest documents for reporting.
+        @param label: Document identifier, such as the PMC ID
+        """
+        record = DocumentRecord(label)
+        previous, self.__document = self.__document, record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.wall_seconds = time.perf_counter() - start
+            self.__document = previous
+            if len(self.slowest_documents) < SLOWEST_DOCUMENTS:
+                heapq.heappush(self.slowest_documents, record)
+            else:
+                heapq.heappushpop(self.slowest_documents, record)
+
+    def add_count(self, name, value=1):
+        """
+        Add to a counter of the innermost active stage and the active document. Ignored outside of a stage.
+        """
+        if not self.__stack:
+            return
+        counts = self.__stack[-1][4]
+        counts[name] = counts.get(name, 0) + value
+        if self.__document:
+            self.__document.counts[name] = self.__document.counts.get(name, 0) + value
+
+    def total_wall_seconds(self):
+        return sum(x.wall_seconds for x in self.stages.values())
+
+    def group_totals(self):
+        """
+        Total wall and CPU time per top level stage, summing the "<stage>/<sub-stage>" entries.
+        """
+        totals = {}
+        for timing in self.stages.values():
+            group = totals.setdefault(timing.name.split("/")[0], {"wall_seconds": 0.0, "cpu_seconds": 0.0})
+            group["wall_seconds"] += timing.wall_seconds
+            group["cpu_seconds"] += timing.cpu_seconds
+        return totals
+
+    def reset(self):
+        self.stages = {}
+        self.slowest_documents = []
+        self.__stack = []
+        self.__document = None
+
+    def jsonable(self):
+        return {x: self.stages[x].jsonable() for x in self.stages}
+
+    def metrics(self):
+        """
+        Complete metrics dump of stage timings, stage group totals and the slowest documents.
+        """
+        return {"stages": self.jsonable(), "stage_groups": self.group_totals(),
+                "slowest_documents": [x.jsonable() for x in sorted(self.slowest_documents, reverse=True)]}
+
+    def log_summary(self):
+        total = self.total_wall_seconds()
+        for timing in sorted(self.stages.values(), key=lambda x: x.wall_seconds, reverse=True):
+            share = timing.wall_seconds / total * 100 if total else 0
+            counts = ", ".join(F"{x}={timing.counts[x]}" for x in sorted(timing.counts))
+            logger.info(F"{timing.name}: {timing.wall_seconds:.3f}s wall, {timing.cpu_seconds:.3f}s CPU over "
+                        F"{timing.calls} call(s) ({share:.1f}%){' ' + counts if counts else ''}")
+        for record in sorted(self.slowest_documents, reverse=True):
+            top_stage = max(record.stage_seconds, key=record.stage_seconds.get) if record.stage_seconds else None
+            logger.info(F"Slow document {record.label}: {record.wall_seconds:.3f}s"
+                        F"{F', mostly {top_stage}' if top_stage else ''}")
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fout:
+            json.dump(self.metrics(), fout, indent=2)
+
+
+def profile_stage(profiler, name):
+    """
+    Context manager timing a stage with the supplied profiler, or doing nothing when profiling is disabled.
+    @param profiler: StageProfiler object or None
+    @param name: Stage name
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
+
+
+def profile_document(profiler, label):
+    """
+    Context manager attributing profiled stages to a document, or doing nothing when profiling is disabled.
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.document(label)
@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+import config
+
+logger = logging.getLogger("GWAS Miner")
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Configuration read by the pipeline (config.ini, ontologies.json, the MeSH blacklist), versioned with the code.
+SETTINGS_DIR = os.path.join(PACKAGE_DIR, "settings")
+RESULT_CACHE_DIR = os.path.join(PACKAGE_DIR, os.pardir, "cache", "results")
+DEFAULT_MAX_BYTES = 2 << 30
+
+__code_version = None
+
+
+def get_code_version():
+    """
+    Hash of the package source and settings files, so that cached results are invalidated by any code or
+    configuration change.
+    """
+    global __code_version
+    if __code_version is None:
+        digest = hashlib.sha256()
+        paths = [os.path.join(PACKAGE_DIR, x) for x in sorted(os.listdir(PACKAGE_DIR)) if x.endswith(".py")]
+        if os.path.isdir(SETTINGS_DIR):
+            paths += [os.path.join(SETTINGS_DIR, x) for x in sorted(os.listdir(SETTINGS_DIR))
+                      if os.path.isfile(os.path.join(SETTINGS_DIR, x))]
+        for path in paths:
+            digest.update(os.path.relpath(path, PACKAGE_DIR).encode("utf-8"))
+            with open(path, "rb") as fin:
+                digest.update(fin.read())
+        __code_version = digest.hexdigest()
+    return __code_version
+
+
+def get_pattern_config():
+    return {"regex_entity_patterns": config.regex_entity_patterns,
+            "pheno_assoc_patterns": config.pheno_assoc_patterns}
+
+
+class ResultCache:
+    """
+    Content addressed store of annotated study output.
+
+    Results are keyed on the study content, the lexicon version, the pattern configuration and the code version
+    (which covers the settings files), so a change to any of them results in the study being processed again. The
+    least recently used results are evicted once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, directory=RESULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Running total of the cache size, so the directory is only scanned when eviction may be needed.
+        self.__size = None
+
+    def get_key(self, study, lexicon_version, extra=None):
+        """
+        Calculate the cache key of a study.
+        @param study: BioC study dictionary, prior to annotation
+        @param lexicon_version: Version of the lexicon the study is annotated with
+        @param extra: Any further JSON serialisable settings that affect the output (e.g. GC relations)
+        @return: Hex digest string, or None if the lexicon is unversioned and so cannot be cached.
+        """
+        if not lexicon_version:
+            return None
+        content = json.dumps([study, lexicon_version, get_pattern_config(), get_code_version(), extra],
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def __get_path(self, key):
+        return os.path.join(self.directory, key[:2], F"{key}.json.gz")
+
+    def get(self, key):
+        """
+        Retrieve a cached result.
+        @return: Annotated study dictionary, or None if not cached.
+        """
+        if not key:
+            return None
+        path = self.__get_path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fin:
+                result = json.load(fin)
+        except FileNotFoundError:
+            return None
+        except (IOError, EOFError, ValueError) as e:
+            logger.warning(F"Discarding unreadable cached result {path}: {e}")
+            self.__remove(path)
+            return None
+        # Record the access time for least recently used eviction.
+        os.utime(path)
+        return result
+
+    def put(self, key, result, default=None):
+        """
+        Store an annotated study.
+        @param key: Cache key from get_key
+        @param result: Annotated study
+        @param default: JSON serialisation function for objects within the study, e.g. BioC.ComplexHandler
+        """
+        if not key:
+            return
+        path = self.__get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = F"{path}.{os.getpid()}.tmp"
+        try:
+            with gzip.open(temp_path, "wt", encoding="utf-8") as fout:
+                json.dump(result, fout, default=default, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except (IOError, TypeError, ValueError) as e:
+            logger.error(F"Unable to cache result {key}: {e}")
+            self.__remove(temp_path)
+            return
+        if self.__size is None:
+            self.evict()
+        else:
+            self.__size += os.path.getsize(path)
+            if self.__size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache is within max_bytes.
+        """
+        files = []
+        total = 0
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".json.gz"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total > self.max_bytes:
+            for mtime, size, path in sorted(files):
+                self.__remove(path)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self.__size = total
+
+    def clear(self):
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                self.__remove(os.path.join(root, name))
+        self.__size = 0
+
+    @staticmethod
+    def __remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
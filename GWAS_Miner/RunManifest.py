@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+logger = logging.getLogger("GWAS Miner")
+
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        file_name TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        status TEXT NOT NULL,
+        output_path TEXT,
+        duration REAL,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL
+    );
+"""
+
+
+def get_file_hash(path, chunk_size=1 << 20):
+    """
+    Calculate the SHA-256 digest of a file's content.
+    @param path: File to hash
+    @param chunk_size: Bytes read at a time
+    @return: Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ManifestEntry:
+    def __init__(self, file_name, content_hash, status, output_path, duration, error, attempts, updated_at):
+        self.file_name = file_name
+        self.content_hash = content_hash
+        self.status = status
+        self.output_path = output_path
+        self.duration = duration
+        self.error = error
+        self.attempts = attempts
+        self.updated_at = updated_at
+
+
+class RunManifest:
+    """
+    SQLite record of the files processed by a batch run, allowing an interrupted run to resume.
+
+    Files whose content hash matches a completed record are skipped, files which failed (or were interrupted while
+    running) are retried until they have been attempted max_attempts times, and changed files are processed afresh.
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.executescript(SCHEMA)
+        self.__connection.commit()
+
+    def close(self):
+        self.__connection.close()
+
+    def get_entry(self, file_name):
+        row = self.__connection.execute("SELECT file_name, content_hash, status, output_path, duration, error, "
+                                        "attempts, updated_at FROM files WHERE file_name = ?", (file_name,)).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def should_process(self, file_name, content_hash):
+        """
+        Determine whether a file needs processing in this run.
+        @param file_name: Name of the input file
+        @param content_hash: Current content hash of the input file
+        @return: True if the file has not been completed and has attempts remaining.
+        """
+        entry = self.get_entry(file_name)
+        if not entry or entry.content_hash != content_hash:
+            return True
+        if entry.status == STATUS_COMPLETED:
+            return False
+        if entry.attempts >= self.max_attempts:
+            logger.warning(F"Skipping {file_name}, failed {entry.attempts} time(s): {entry.error}")
+            return False
+        return True
+
+    def mark_started(self, file_name, content_hash):
+        entry = self.get_entry(file_name)
+        attempts = entry.attempts if entry and entry.content_hash == content_hash else 0
+        self.__write(file_name, content_hash, STATUS_RUNNING, None, None, None, attempts + 1)
+
+    def mark_completed(self, file_name, output_path, duration):
+        self.__update(file_name, STATUS_COMPLETED, output_path, duration, None)
+
+    def mark_failed(self, file_name, error, duration=None):
+        self.__update(file_name, STATUS_FAILED, None, duration, str(error))
+
+    def mark_cancelled(self, file_name):
+        """
+        Forget the current attempt of a file interrupted by the user, so it does not count towards max_attempts.
+        """
+        self.__connection.execute("UPDATE files SET status = ?, attempts = MAX(attempts - 1, 0), updated_at = ? "
+                                  "WHERE file_name = ?", (STATUS_CANCELLED, self.__now(), file_name))
+        self.__connection.commit()
+
+    def summary(self):
+        """
+        @return: Dictionary of status to the number of files with that status.
+        """
+        return {k: v for k, v in self.__connection.execute("SELECT status, COUNT(*) FROM files GROUP BY status")}
+
+    def __write(self, file_name, content_hash, status, output_path, duration, error, attempts):
+        self.__connection.execute("INSERT OR REPLACE INTO files (file_name, content_hash, status, output_path, "
+                                  "duration, error, attempts, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  (file_name, content_hash, status, output_path, duration, error, attempts,
+                                   self.__now()))
+        self.__connection.commit()
+
+    def __update(self, file_name, status, output_path, duration, error):
+        self.__connection.execute("UPDATE files SET status = ?, output_path = ?, duration = ?, error = ?, "
+                                  "updated_at = ? WHERE file_name = ?",
+                                  (status, output_path, duration, error, self.__now(), file_name))
+        self.__connection.commit()
+
+    @staticmethod
+    def __now():
+        return datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
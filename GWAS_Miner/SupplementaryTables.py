@@ -0,0 +1,328 @@
+"""
+Streaming ingestion of supplementary tables (CSV, TSV and XLSX summary statistics) into the TableRow/TableCell/
+TableSection model, annotating variants, p-values and traits chunk by chunk so that files with millions of rows are
+processed in constant memory.
+
+Usage: python SupplementaryTables.py <file> [-o output.jsonl] [--max_p 5e-8] [--caption "Type 2 diabetes GWAS"]
+"""
+import csv
+import gzip
+import itertools
+import json
+import logging
+import os
+from datetime import datetime
+
+import BioC
+from DataStructures import RSID_PATTERN, count_cell_types
+from PipelineProfiles import PROFILE_TABLES
+from PValue import get_significance_infons
+from TableExtractor import Table, TableCell, TableRow, TableSection, get_cell_annotation, get_cell_entity_annotation
+
+logger = logging.getLogger("GWAS Miner")
+
+DELIMITED_EXTENSIONS = {".csv": ",", ".tsv": "\t", ".txt": None}
+XLSX_EXTENSIONS = {".xlsx", ".xlsm"}
+# Rows read into each TableSection.
+DEFAULT_CHUNK_ROWS = 10000
+# Body rows buffered after the header for column type detection.
+HEADER_SAMPLE_ROWS = 1000
+# Proportion of sampled non-blank cells which must hold rsIDs (or p-values) for a column to be typed by its values.
+SAMPLE_THRESHOLD = 0.8
+# Trait cell texts whose entities are remembered, trait columns typically repeating a few values.
+TRAIT_CACHE_SIZE = 10000
+
+
+def get_extension(path):
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return os.path.splitext(name)[1]
+
+
+def is_supported(path):
+    extension = get_extension(path)
+    return extension in DELIMITED_EXTENSIONS or extension in XLSX_EXTENSIONS
+
+
+def __iter_delimited_rows(path):
+    opener = gzip.open if path.lower().endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace", newline="") as fin:
+        delimiter = DELIMITED_EXTENSIONS[get_extension(path)]
+        if not delimiter:
+            sample = fin.read(65536)
+            fin.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",\t; ").delimiter
+            except csv.Error:
+                delimiter = "\t"
+        for row in csv.reader(fin, delimiter=delimiter):
+            yield row
+
+
+def __iter_xlsx_sheets(path):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("openpyxl is required to read XLSX supplementary tables, install GWAS_Miner[tables]")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = (["" if x is None else str(x) for x in row] for row in sheet.iter_rows(values_only=True))
+            yield sheet.title, rows
+    finally:
+        workbook.close()
+
+
+def iter_tables(path):
+    """
+    Read the tables of a supplementary file lazily.
+    @param path: CSV, TSV, TXT (optionally gzipped) or XLSX file path
+    @return: Generator of (table identifier, row generator) tuples, one per sheet for XLSX files.
+    """
+    name = os.path.basename(path)
+    extension = get_extension(path)
+    if extension in XLSX_EXTENSIONS:
+        for sheet_name, rows in __iter_xlsx_sheets(path):
+            yield F"{name}:{sheet_name}", rows
+    elif extension in DELIMITED_EXTENSIONS:
+        yield name, __iter_delimited_rows(path)
+    else:
+        raise ValueError(F"Unsupported supplementary table format: {path}")
+
+
+def is_p_value(text):
+    try:
+        value = float(text.strip())
+    except ValueError:
+        return False
+    return 0 <= value <= 1
+
+
+class SupplementaryTable:
+    """
+    Supplementary table read row chunk by row chunk.
+
+    Column types are detected once from the header, using the table header classifier, and a sample of the rows
+    following it. Only the marker, significance and trait columns are annotated, rsIDs and p-values by pattern and
+    traits with the interpreter's tables profile. Rows without a trait cell are related to the trait of the caption,
+    if one is given, as summary statistics files often cover a single trait.
+    """
+
+    def __init__(self, table_id, rows, chunk_rows=DEFAULT_CHUNK_ROWS, max_p_value=None, caption=None):
+        """
+        @param table_id: Identifier of the table, e.g. the file and sheet name
+        @param rows: Iterable of rows, each a list of cell strings, the first non-empty row being the header
+        @param chunk_rows: Number of rows in each TableSection
+        @param max_p_value: Only annotate rows with a p-value at or below this threshold, if supplied
+        @param caption: Caption of the table or the name of its trait, if supplied
+        """
+        self.table_id = table_id
+        self.chunk_rows = chunk_rows
+        self.max_p_value = max_p_value
+        self.caption = caption
+        self.header = None
+        self.marker_column = None
+        self.significance_column = None
+        self.trait_column = None
+        self.row_count = 0
+        self.__rows = iter(rows)
+        self.__trait_cache = {}
+        # Annotation of the caption's trait, created on first use and shared by every relation of the table.
+        self.__caption_annotation = None
+        self.__read_header()
+
+    def __read_header(self):
+        for row in self.__rows:
+            if any(x.strip() for x in row):
+                self.header = TableRow([TableCell(F"0.{i + 1}", x.strip().lstrip("#"))
+                                        for i, x in enumerate(row)])
+                break
+        if not self.header:
+            return
+        sample = list(itertools.islice(self.__rows, HEADER_SAMPLE_ROWS))
+        self.__rows = itertools.chain(sample, self.__rows)
+        self.__set_column_types(sample)
+
+    def __set_column_types(self, sample):
+        marker_flag = Table.COLUMN_FLAGS[Table.COLUMN_MARKER]
+        significance_flag = Table.COLUMN_FLAGS[Table.COLUMN_SIGNIFICANCE]
+        trait_flag = Table.COLUMN_FLAGS[Table.COLUMN_TRAIT]
+        for i, cell in enumerate(self.header.cells):
+            values = [row[i] if i < len(row) else "" for row in sample]
+            filled = [x for x in values if x.strip()]
+            # Summary statistics headers commonly use _ or . as separators, e.g. P_BOLT_LMM or p.value.
+            header_types = Table.classify_header(cell.text.replace("_", " ").replace(".", " "))
+            if self.marker_column is None:
+                if header_types & marker_flag or \
+                        (filled and count_cell_types(filled)["rsid"] >= len(filled) * SAMPLE_THRESHOLD):
+                    self.marker_column = i
+                    continue
+            if self.significance_column is None and header_types & significance_flag:
+                if not filled or len([x for x in filled if is_p_value(x)]) >= len(filled) * SAMPLE_THRESHOLD:
+                    self.significance_column = i
+                    continue
+            if self.trait_column is None and header_types & trait_flag:
+                self.trait_column = i
+        logger.info(F"Supplementary table {self.table_id} columns: marker={self.__get_heading(self.marker_column)}, "
+                    F"significance={self.__get_heading(self.significance_column)}, "
+                    F"trait={self.__get_heading(self.trait_column)}")
+
+    def __get_heading(self, i):
+        return self.header.cells[i].text if i is not None else None
+
+    def is_candidate(self):
+        """
+        @return: True if the table has marker and significance columns, and so may contain associations.
+        """
+        return self.marker_column is not None and self.significance_column is not None
+
+    def iter_sections(self):
+        """
+        Read the remaining rows into TableSections of up to chunk_rows rows.
+        @return: Generator of TableSection objects
+        """
+        while True:
+            section = TableSection()
+            for row in itertools.islice(self.__rows, self.chunk_rows):
+                self.row_count += 1
+                section.rows.append(TableRow([TableCell(F"{self.row_count}.{i + 1}", x) for i, x in enumerate(row)]))
+            if not section.rows:
+                return
+            yield section
+
+    def __get_cell(self, row, i):
+        return row.cells[i] if i is not None and i < len(row.cells) else None
+
+    def __get_trait_entity(self, nlp, text):
+        if text not in self.__trait_cache:
+            if len(self.__trait_cache) >= TRAIT_CACHE_SIZE:
+                self.__trait_cache.clear()
+            doc = nlp.process_corpus(text, profile=PROFILE_TABLES)
+            self.__trait_cache[text] = next((x for x in doc.ents if x._.is_trait or x._.has_trait), None)
+        return self.__trait_cache[text]
+
+    def __get_caption_annotation(self, nlp, annotations):
+        if self.__caption_annotation is None and self.caption and self.caption.strip():
+            entity = self.__get_trait_entity(nlp, self.caption)
+            if entity is None:
+                return None
+            self.__caption_annotation, nlp = get_cell_entity_annotation(nlp, entity, "table_caption", None)
+            nlp.t += 1
+            annotations.append(self.__caption_annotation)
+        return self.__caption_annotation
+
+    def annotate_section(self, nlp, section):
+        """
+        Annotate the rows of a section which contain a variant and a p-value, relating them to the row's trait, or
+        failing that the caption's trait.
+        @param nlp: Interpreter, whose annotation counters are advanced
+        @param section: TableSection from iter_sections
+        @return: Tuple of the BioC annotations and relations of the section
+        """
+        current_datetime = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+        annotations, relations = [], []
+        for row in section.rows:
+            marker_cell = self.__get_cell(row, self.marker_column)
+            significance_cell = self.__get_cell(row, self.significance_column)
+            if not marker_cell or not significance_cell:
+                continue
+            rsid = RSID_PATTERN.search(marker_cell.text)
+            p_value = significance_cell.text.strip()
+            if not rsid or not is_p_value(p_value):
+                continue
+            value = float(p_value)
+            if self.max_p_value is not None and value > self.max_p_value:
+                continue
+            variant = get_cell_annotation(F"V{nlp.v}", "genetic_variant", F"dbSNP:{rsid.group()}", rsid.group(),
+                                          rsid.start(), marker_cell.id)
+            significance = get_cell_annotation(F"S{nlp.s}", "significance", "PVAL", p_value,
+                                               significance_cell.text.index(p_value), significance_cell.id,
+                                               infons=get_significance_infons(value))
+            nlp.v += 1
+            nlp.s += 1
+            annotations.extend([variant, significance])
+            trait_cell = self.__get_cell(row, self.trait_column)
+            entity = self.__get_trait_entity(nlp, trait_cell.text) if trait_cell and trait_cell.text.strip() else None
+            if entity is not None:
+                trait, nlp = get_cell_entity_annotation(nlp, entity, "table_content", trait_cell.id)
+                nlp.t += 1
+                annotations.append(trait)
+            else:
+                trait = self.__get_caption_annotation(nlp, annotations)
+            if trait is None:
+                continue
+            relations.append(BioC.BioCRelation(id=F"R{nlp.r}", infons={"type": "disease_assoc",
+                                                                       "annotator": "GWASMiner@le.ac.uk",
+                                                                       "updated_at": current_datetime},
+                                               nodes=[BioC.BioCNode(refid=trait.id, role="trait"),
+                                                      BioC.BioCNode(refid=variant.id, role="variant"),
+                                                      BioC.BioCNode(refid=significance.id, role="significance")]))
+            nlp.r += 1
+        return annotations, relations
+
+    def iter_annotations(self, nlp):
+        """
+        Annotate the table chunk by chunk.
+        @return: Generator of (annotations, relations) tuples, one per TableSection.
+        """
+        if not self.is_candidate():
+            logger.info(F"Supplementary table {self.table_id} has no marker and significance columns, skipping.")
+            return
+        for section in self.iter_sections():
+            yield self.annotate_section(nlp, section)
+
+
+def process_supplementary_file(nlp, path, destination, chunk_rows=DEFAULT_CHUNK_ROWS, max_p_value=None,
+                               caption=None):
+    """
+    Annotate every table of a supplementary file, appending each chunk's annotations and relations to a JSON lines
+    file as it is completed.
+    @param nlp: Interpreter used to recognise traits
+    @param path: Supplementary file path
+    @param destination: Output JSON lines file path
+    @param chunk_rows: Number of rows annotated at a time
+    @param max_p_value: Only annotate rows with a p-value at or below this threshold, if supplied
+    @param caption: Caption of the file or the name of its trait, for tables without a trait column
+    @return: Tuple of the number of annotations and relations written
+    """
+    annotation_count, relation_count = 0, 0
+    with open(destination, "w", encoding="utf-8") as fout:
+        for table_id, rows in iter_tables(path):
+            table = SupplementaryTable(table_id, rows, chunk_rows, max_p_value, caption)
+            for annotations, relations in table.iter_annotations(nlp):
+                if not annotations:
+                    continue
+                fout.write(json.dumps({"table": table_id, "annotations": annotations, "relations": relations},
+                                      default=BioC.ComplexHandler, ensure_ascii=False) + "\n")
+                annotation_count += len(annotations)
+                relation_count += len(relations)
+            logger.info(F"Read {table.row_count} rows from {table_id}")
+    return annotation_count, relation_count
+
+
+def main():
+    import argparse
+    import Ontology
+    from NLP import Interpreter
+    parser = argparse.ArgumentParser(description='Annotate supplementary summary statistics tables')
+    parser.add_argument('file', type=str, help='CSV, TSV, TXT (optionally gzipped) or XLSX supplementary file.')
+    parser.add_argument('-o', '--output', type=str, help='JSON lines output file. Default = output/<file>.jsonl.')
+    parser.add_argument('--chunk_rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=F'Number of rows annotated at a time. Default = {DEFAULT_CHUNK_ROWS}.')
+    parser.add_argument('--max_p', type=float, default=5e-8,
+                        help='Only annotate associations with a p-value at or below this threshold. Default = 5e-8.')
+    parser.add_argument('--caption', type=str, help='Caption of the file or the name of its trait, related to the '
+                                                    'associations of tables without a trait column.')
+    args = parser.parse_args()
+    destination = args.output if args.output else os.path.join("output", F"{os.path.basename(args.file)}.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+
+    nlp = Interpreter(Ontology.get_master_lexicon(), profile=PROFILE_TABLES)
+    annotation_count, relation_count = process_supplementary_file(nlp, args.file, destination, args.chunk_rows,
+                                                                  args.max_p, args.caption)
+    print(F"{annotation_count} annotations and {relation_count} relations written to {destination}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,15 @@
 import json
 import re
+from array import array
 from datetime import datetime
 
-from Exceptions import TableTypeError
+from PipelineProfiles import PROFILE_TABLES
+from PValue import get_significance_infons, is_significant, parse_p_value
 import BioC
 
 table_significance_pattern = r""
+# Maximum number of body rows checked for rsID and p-value shapes when triaging a table.
+TRIAGE_SAMPLE_ROWS = 10
 
 
 def output_tables(destination, tables):
@@ -18,15 +22,27 @@ def output_tables(destination, tables):
         print(F"An unknown error occurred: {e}")
 
 
-def process_tables(nlp, tables):
+def triage_table(nlp, table):
+    """
+    Determine whether a table needs the NLP pipeline applied, recording the outcome with the interpreter's profiler.
+    """
+    candidate = table.is_candidate(nlp)
+    if nlp.profiler:
+        nlp.profiler.add_count("tables_processed" if candidate else "tables_skipped")
+    return candidate
+
+
+def process_tables(nlp, tables, triage=True):
     for table in tables:
+        if triage and not triage_table(nlp, table):
+            continue
         nlp = table.add_spacy_docs(nlp)
+        if table.table_type:
+            nlp = table.get_annotations(nlp)
         table.annotations = nlp.annotations
         table.relations = nlp.relations
         nlp.annotations = []
         nlp.relations = []
-        if table.table_type:
-            t, m, p, r, used_annots = table.assign_annotations(t, m, p, r, used_annots)
     return tables, nlp
 
 
@@ -37,12 +53,14 @@ def get_cell_entity_annotation(nlp, ent, table_element, cell_id, element_offset=
     loc = BioC.BioCLocation(offset=offset, length=length, table_cell_id=cell_id, table_element=table_element)
     entity_type = None
     entity_identifier = None
+    infons = {}
     if ent.label_ == "RSID":
         entity_type = "genetic_variant"
         entity_identifier = F"dbSNP:{ent.text}"
     elif ent.label_ == "PVAL":
         entity_type = "significance"
         entity_identifier = "PVAL"
+        infons = get_significance_infons(ent._.p_value)
     else:
         entity_type = "trait"
         entity_identifier = F"MeSH:{ent.label_}"
@@ -55,12 +73,39 @@ def get_cell_entity_annotation(nlp, ent, table_element, cell_id, element_offset=
         entity_id = F"S{nlp.s}"
     annotation = BioC.BioCAnnotation(id=entity_id, infons={"type": entity_type, "identifier": entity_identifier,
                                                            "annotator": "GWASMiner@le.ac.uk",
-                                                           "updated_at": current_datetime},
+                                                           "updated_at": current_datetime, **infons},
                                      locations=[loc], text=ent.text)
     return annotation, nlp
 
 
-def parse_tables(file_input, nlp):
+def get_cell_annotation(annotation_id, entity_type, identifier, text, offset, cell_id, table_element="table_content",
+                        infons=None):
+    """
+    Create an annotation of a table cell value recognised without an entity, e.g. a p-value in a significance column.
+    @param infons: Further infons of the annotation, e.g. the numeric value of a p-value
+    """
+    current_datetime = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+    loc = BioC.BioCLocation(offset=offset, length=len(text), table_element=table_element, table_cell_id=cell_id)
+    return BioC.BioCAnnotation(id=annotation_id, infons={"type": entity_type, "identifier": identifier,
+                                                         "annotator": "GWASMiner@le.ac.uk",
+                                                         "updated_at": current_datetime, **(infons or {})},
+                               locations=[loc], text=text)
+
+
+def broadcast(*values):
+    """
+    Pair the entities of each type found in a row. Types with a single entity are paired with every entity of the
+    others, otherwise entities are paired in column order, any surplus being left unpaired.
+    @param values: Lists of annotations, one per entity type, none of which are empty
+    @return: List of annotation tuples
+    """
+    size = max(len(x) for x in values)
+    if all(len(x) in (1, size) for x in values):
+        return [tuple(x[i] if len(x) == size else x[0] for x in values) for i in range(size)]
+    return list(zip(*values))
+
+
+def parse_tables(file_input, nlp, triage=True):
     tables = []
     tables_data = None
     contains_annotations = False
@@ -116,7 +161,7 @@ def parse_tables(file_input, nlp):
     except IOError as ie:
         print(F"No tables file found for {file_input.replace('_tables.json', '')}")
     if tables_data:
-        annotated_tables, nlp = process_tables(nlp, tables)
+        annotated_tables, nlp = process_tables(nlp, tables, triage)
         for table in annotated_tables:
             if table.annotations:
                 contains_annotations = True
@@ -150,6 +195,8 @@ class Table:
     COLUMN_TRAIT = 1
     COLUMN_SIGNIFICANCE = 2
     COLUMN_MARKER = 3
+    # Bit of each column type within the column_types bitmasks.
+    COLUMN_FLAGS = {COLUMN_TRAIT: 1, COLUMN_SIGNIFICANCE: 2, COLUMN_MARKER: 4}
 
     trait_strings = [r"(?:[ ]|^)(trait)(?:[^\w]|[\s]|\b)", r"(?:[ ]|^)(disease)(?:[^\w]|[\s]|\b)",
                      r"(?:[ ]|^)(phenotype)(?:[^\w]|[\s]|\b)"]
@@ -157,6 +204,15 @@ class Table:
                             r"(?:[ ]|^)(p-?val[ue]{0,2}s?)(?:[^\w]|[\s]|\b)", r"(?:[ ]|^)(p)(?:[^\w]|[\s]|\b)"]
     marker_strings = [r"(?:[ ]|^)(rsids?)(?:[^\w]|[\s]|\b)", r"(?:[ ]|^)(markers?)(?:[^\w]|[\s]|\b)",
                       r"(?:[ ]|^)(variants?)(?:[^\w]|[\s]|\b)", r"(?:[ ]|^)(snps?)(?:[^\w]|[\s]|\b)"]
+    # Body cell shapes indicating a table of associations, used when triaging tables.
+    body_marker_shape = re.compile(r"rs[0-9]+", re.IGNORECASE)
+    body_significance_shape = re.compile(r"\d[ ]?[eE][ ]?[-−–][ ]?\d|\d[ ]?[*×xX][ ]?10|(?<![\d.])0?\.\d")
+    # Header strings are of the form prefix(term)suffix, combined below into a single classifier.
+    header_prefix = r"(?:[ ]|^)"
+    header_suffix = r"(?:[^\w]|[\s]|\b)"
+    # Header fragments are assigned the first type matched, in this order.
+    header_type_order = [(COLUMN_TRAIT, "trait", trait_strings), (COLUMN_MARKER, "marker", marker_strings),
+                         (COLUMN_SIGNIFICANCE, "significance", significance_strings)]
 
     def __init__(self, title, table_id, title_offset, content_offset, column_cells, data_sections,
                  caption_text, caption_offset, footer_text, footer_offset):
@@ -179,7 +235,7 @@ class Table:
         self.relations = []
         self.table_type = None
         self.has_super_rows = False
-        self.column_types = []
+        self.column_types = array("B")  # bitmask of COLUMN_FLAGS per column
         self.data_sections = data_sections
         self.caption_ents = []
         self.section_title_ents = []
@@ -191,6 +247,91 @@ class Table:
         self.section_ents = []
         self.passages = []
 
+    @staticmethod
+    def classify_header(text):
+        """
+        Classify column header text using the trait, marker and significance strings in a single pass of the
+        compiled header classifier.
+        @param text: Header cell text, with "|" separating the headers of merged cells
+        @return: Bitmask of COLUMN_FLAGS, each fragment contributing the first type it matches of trait, marker and
+        significance.
+        """
+        mask = 0
+        for fragment in str(text).lower().split("|"):
+            found = 0
+            for match in header_classifier.finditer(fragment):
+                found |= header_group_flags[match.lastgroup]
+            if fragment.strip() == "p":
+                found |= Table.COLUMN_FLAGS[Table.COLUMN_SIGNIFICANCE]
+            for column_type, name, strings in Table.header_type_order:
+                if found & Table.COLUMN_FLAGS[column_type]:
+                    mask |= Table.COLUMN_FLAGS[column_type]
+                    break
+        return mask
+
+    @staticmethod
+    def get_header_types(text, rsid_patterns=None, pval_patterns=None):
+        """
+        Classify column header text without the NLP pipeline, including rsIDs and p-values which would be recognised
+        as entities.
+        @param text: Header cell text
+        @param rsid_patterns: Regex patterns of rsIDs recognised as RSID entities
+        @param pval_patterns: Regex patterns of p-values recognised as PVAL entities
+        @return: Bitmask of COLUMN_FLAGS the header may describe.
+        """
+        mask = Table.classify_header(text)
+        if Table.__search_any(rsid_patterns, text):
+            mask |= Table.COLUMN_FLAGS[Table.COLUMN_MARKER]
+        if Table.__search_any(pval_patterns, text):
+            mask |= Table.COLUMN_FLAGS[Table.COLUMN_SIGNIFICANCE]
+        return mask
+
+    def get_column_types(self, i):
+        """
+        @param i: Column index
+        @return: List of the column types of the column, empty if it has none or is beyond the header columns.
+        """
+        mask = self.column_types[i] if i < len(self.column_types) else 0
+        return [x for x, flag in Table.COLUMN_FLAGS.items() if mask & flag]
+
+    @staticmethod
+    def __search_any(patterns, text):
+        return patterns and any(re.search(x, text, flags=re.IGNORECASE) for x in patterns)
+
+    def is_candidate(self, nlp):
+        """
+        Cheaply determine whether the table could be classified as a marker or trait list, before applying the NLP
+        pipeline to every cell.
+
+        A table is only typed if its headers describe a significance column and its headers, caption or section titles
+        identify markers, so tables failing either check are skipped. The remainder must also contain an rsID or
+        p-value shaped value in a sample of the body rows.
+        @param nlp: Interpreter supplying the RSID and PVAL candidate patterns
+        @return: True if the table may contain associations.
+        """
+        patterns = nlp.get_candidate_patterns()
+        rsid_patterns, pval_patterns = patterns.get("RSID"), patterns.get("PVAL")
+        header_types = 0
+        for row in self.column_rows:
+            for cell in row.cells:
+                header_types |= Table.get_header_types(cell.text, rsid_patterns, pval_patterns)
+        if not header_types & Table.COLUMN_FLAGS[Table.COLUMN_SIGNIFICANCE]:
+            return False
+        if not header_types & Table.COLUMN_FLAGS[Table.COLUMN_MARKER]:
+            context = [self.caption_text] + [x.title for x in self.data_sections]
+            if not any(Table.__search_any(rsid_patterns, x) for x in context if x):
+                return False
+        return self.__sample_body_cells()
+
+    def __sample_body_cells(self):
+        rows = [row for section in self.data_sections for row in section.rows]
+        step = max(1, -(-len(rows) // TRIAGE_SAMPLE_ROWS))
+        for row in rows[::step]:
+            for cell in row.cells:
+                if Table.body_marker_shape.search(cell.text) or Table.body_significance_shape.search(cell.text):
+                    return True
+        return False
+
     def __set_table_type(self):
         # Check column types
         self.contains_marker, self.contains_trait, self.contains_pval = False, False, False
@@ -226,56 +367,29 @@ class Table:
                         self.contains_marker = True
                         self.section_ents[i].append(self.COLUMN_MARKER)
 
+        entity_flags = {"RSID": Table.COLUMN_FLAGS[Table.COLUMN_MARKER],
+                        "PVAL": Table.COLUMN_FLAGS[Table.COLUMN_SIGNIFICANCE]}
+        self.column_types = array("B", bytes(max((len(x.cells) for x in self.column_rows), default=0)))
         for row in self.column_rows:
-            for i in range(len(row.cells)):
-                cell = row.cells[i]
-                if cell.doc:
-                    if cell.doc.ents:
-                        entity = cell.doc.ents[0]
-                        if entity.label_ == "RSID":
-                            self.column_types.insert(i, Table.COLUMN_MARKER)
-                            self.contains_marker = True
-                        elif entity.label_ == "PVAL":
-                            self.column_types.insert(i, Table.COLUMN_SIGNIFICANCE)
-                            self.contains_significance = True
-                        elif entity._.is_trait or entity._.has_trait:
-                            self.column_types.insert(i, Table.COLUMN_TRAIT)
-                            self.contains_trait = True
-                    if len(self.column_types) != i + 1:
-                        self.column_types.insert(i, 0)  # no entity found
-                    cell_text = [cell.text.lower()] if not cell.text.find("|") else cell.text.lower().split(
-                        "|")
-                    for text in [x for x in cell_text if x]:
-                        if [x for x in Table.trait_strings if re.search(x, text)]:
-                            if isinstance(self.column_types[i], list):
-                                self.column_types[i].append(Table.COLUMN_TRAIT)
-                            else:
-                                self.column_types[i] = [self.column_types[i], Table.COLUMN_TRAIT]
-                            self.contains_trait = True
-                        elif [x for x in Table.marker_strings if re.search(x, text)]:
-                            if isinstance(self.column_types[i], list):
-                                self.column_types[i].append(Table.COLUMN_MARKER)
-                            else:
-                                self.column_types[i] = [self.column_types[i], Table.COLUMN_MARKER]
-                            self.contains_marker = True
-                        elif [x for x in Table.significance_strings if re.search(x, text)] \
-                                or text.lower().strip() == "p":
-                            if isinstance(self.column_types[i], list):
-                                self.column_types[i].append(Table.COLUMN_SIGNIFICANCE)
-                            else:
-                                self.column_types[i] = [self.column_types[i], Table.COLUMN_SIGNIFICANCE]
-                            self.contains_significance = True
-                    if len(self.column_types) != i + 1:
-                        self.column_types.append(0)  # default added in case of no entities.
-                else:
-                    self.column_types.append(0)  # blank cell
-                if isinstance(self.column_types[i], list):  # Clean list values
-                    desirables = [x for x in self.column_types[i] if x != 0]
-                    desirables_len = len(desirables)
-                    if desirables_len == 0:
-                        self.column_types[i] = 0
-                    else:
-                        self.column_types[i] = [x for x in self.column_types[i] if x != 0]
+            for i, cell in enumerate(row.cells):
+                if not cell.doc:
+                    continue  # blank cell
+                if cell.doc.ents:
+                    entity = cell.doc.ents[0]
+                    if entity.label_ in entity_flags:
+                        self.column_types[i] |= entity_flags[entity.label_]
+                    elif entity._.is_trait or entity._.has_trait:
+                        self.column_types[i] |= Table.COLUMN_FLAGS[Table.COLUMN_TRAIT]
+                self.column_types[i] |= Table.classify_header(cell.text)
+        header_types = 0
+        for mask in self.column_types:
+            header_types |= mask
+        if header_types & Table.COLUMN_FLAGS[Table.COLUMN_TRAIT]:
+            self.contains_trait = True
+        if header_types & Table.COLUMN_FLAGS[Table.COLUMN_MARKER]:
+            self.contains_marker = True
+        if header_types & Table.COLUMN_FLAGS[Table.COLUMN_SIGNIFICANCE]:
+            self.contains_significance = True
         if self.contains_significance and self.contains_trait and self.contains_marker:
             self.table_type = Table.TYPE_TRAIT_LIST
         elif self.contains_significance and self.contains_marker:
@@ -283,13 +397,13 @@ class Table:
 
     def add_spacy_docs(self, nlp):
         if self.caption_text:
-            self.caption_doc = nlp.process_corpus(self.caption_text, )
+            self.caption_doc = nlp.process_corpus(self.caption_text, profile=PROFILE_TABLES)
         if self.footer_text:
-            self.footer_doc = nlp.process_corpus(self.footer_text, )
+            self.footer_doc = nlp.process_corpus(self.footer_text, profile=PROFILE_TABLES)
         if self.title:
             if isinstance(self.title, list):
                 self.title = self.title[0]
-            self.title_doc = nlp.process_corpus(self.title, )
+            self.title_doc = nlp.process_corpus(self.title, profile=PROFILE_TABLES)
         if self.column_rows:
             for row in self.column_rows:
                 for cell in row.cells:
@@ -303,146 +417,186 @@ class Table:
         self.__set_table_type()
         return nlp
 
-    def __get_cell_annotation(self, cell, col_type, t, m, p):
-        annotation = None
-        if self.COLUMN_TRAIT == col_type:
-            if cell.doc and cell.doc.ents:
-                annotation = BioC.convert_cell_to_annotation(cell.doc, t,
-                                                             "table_content",
-                                                             cell.id)
-                t += 1
-
-        elif self.COLUMN_MARKER == col_type:
-            if cell.doc and cell.doc.ents:
-                annotation = BioC.convert_cell_to_annotation(cell.doc, m,
-                                                             "table_content",
-                                                             cell.id)
-                m += 1
-        elif self.COLUMN_SIGNIFICANCE == col_type:
-            if cell.doc:
-                new_entity = cell.doc[:]
-                new_entity.label_ = "PVAL"
-                try:
-                    cell.doc.ents += (new_entity,)
-                    annotation = BioC.convert_cell_to_annotation(cell.doc, p,
-                                                                 "table_content",
-                                                                 cell.id)
-                    p += 1
-                except Exception as e:
-                    print(e)
-                    return annotation, t, m, p
-        return annotation, t, m, p
-
-    def __get_row_annotations(self, row, col_types, t, m, p, r):
-        row_annotations = []
-        for i in range(len(row.cells)):
-            cell = row.cells[i]
-            column_types = [col_types[i]] if isinstance(col_types[i], int) \
-                else col_types[i]
-            for col_type in set(column_types):
-                annotation, t, m, p = Table.__get_cell_annotation(cell, col_type, t, m, p)
-                row_annotations.append(annotation)
-        row_relations, r = Table.__get_row_relations(row_annotations, r)
-        return row_annotations, row_relations, t, m, p, r
-
-    def __get_row_relations(self, row_annotations, r):
-        row_relations = []
-        row_annotations_dict = {
-            "traits": [x for x in row_annotations if x.infons['type'] == "trait"],
-            "pvals": [x for x in row_annotations if x.infons['type'] == "significance"],
-            "variants": [x for x in row_annotations if x.infons['type'] == "genetic_variant"]
-        }
-
-        if self.table_type == self.TYPE_TRAIT_LIST:
-            row_relations = self.__get_trait_list_row_relations(row_annotations_dict, r)
-        elif self.table_type == self.TYPE_MARKER_LIST:
-            row_relations = self.__get_marker_list_row_relations(row_annotations_dict, r)
-        elif self.table_type == self.TYPE_TRAIT_AND_MARKER_LIST:
-            row_relations = self.__get_trait_marker_list_row_relations(row_annotations_dict, r)
-
-        return row_relations, r
-
-    def __get_trait_list_row_relations(self, row_annotations_dict, r):
-        row_relations = []
-        trait_count, pval_count, variant_count = self.__get_row_annotation_counts(row_annotations_dict)
-
-        return row_relations, r
-
-    def __get_marker_list_row_relations(self, row_annotations_dict, r):
-        row_relations = []
-        trait_count, pval_count, variant_count = self.__get_row_annotation_counts(row_annotations_dict)
-        if trait_count > 1 or pval_count > 1 or variant_count > 1:
-            raise TableTypeError(self)
-        trait_annot = row_annotations_dict['traits'][0]
-        variant_annot = row_annotations_dict['variants'][0]
-        pval_annot = row_annotations_dict['pvals'][0]
-        row_relations.append(
-            BioC.BioCRelation()
-        )
-        return row_relations, r
-
-    def __get_trait_marker_list_row_relations(self, row_annotations_dict, r):
-        row_relations = []
-        trait_count, pval_count, variant_count = self.__get_row_annotation_counts(row_annotations_dict)
-        return row_relations, r
+    def get_column_map(self):
+        """
+        Entity types to extract from each body column, calculated once per table from the column type bitmasks.
+        @return: List of (column index, list of column types) tuples for the typed columns.
+        """
+        return [(i, self.get_column_types(i)) for i in range(len(self.column_types)) if self.column_types[i]]
 
     @staticmethod
-    def __get_row_annotation_counts(row_annotations_dict):
-        trait_count, pval_count, variant_count = len(row_annotations_dict['traits']), len(
-            row_annotations_dict['pvals']), len(row_annotations_dict['variants'])
-        return trait_count, pval_count, variant_count
-
-    def assign_gc_annotations(self, t, m, p, r, used_annots, gc_relations):
-        docs_iter = [(self.title_doc, self.title_offset, "table_title"),
-                     (self.caption_doc, self.caption_offset, "table_caption"),
-                     (self.footer_doc, self.footer_offset, "table_footer")]
-        used_annots = []
-        for (doc, offset, elem) in docs_iter:
-            if doc and doc.ents:
-                used_annots, t, m, p, r = BioC.get_bioc_annotations(doc, used_annots, offset, t, m, p, r, elem)
-
-        for row in self.column_rows:
-            row_annotations, row_relations, t, m, p, r = self.__get_gc_row_annotations(row, self.column_types, t, m, p,
-                                                                                       r)
-            used_annots += row_annotations
-
+    def __get_first_entity(doc, label=None):
+        if not doc or not doc.ents:
+            return None
+        if label:
+            return next((x for x in doc.ents if x.label_ == label), None)
+        return next((x for x in doc.ents if x._.is_trait or x._.has_trait), None)
+
+    def __get_context_entities(self, label=None):
+        """
+        Entities stated once for the whole table (or a section of it) rather than per row, in order of precedence.
+        @param label: Entity label, or None for traits
+        @return: Tuple of the table level (entity, table element, offset) tuple and a list of the same per section.
+        """
+        table_entity = None
+        for doc, element, offset in [(self.caption_doc, "table_caption", self.caption_offset or 0),
+                                     (self.title_doc, "table_title", self.title_offset or 0),
+                                     (self.footer_doc, "table_footer", self.footer_offset or 0)]:
+            entity = Table.__get_first_entity(doc, label)
+            if entity is not None:
+                table_entity = (entity, element, offset)
+                break
+        section_entities = []
         for section in self.data_sections:
-            for row in section.rows:
-                row_annotations, row_relations, t, m, p, r = self.__get_gc_row_annotations(row, self.column_types, t, m,
-                                                                                           p, r)
-                used_annots += row_annotations
-        self.annotations = used_annots
-        return t, m, p, r, used_annots
-
-    def assign_annotations(self, t, m, p, r, used_annots):
-        docs_iter = [(self.title_doc, self.title_offset, "table_title"),
-                     (self.caption_doc, self.caption_offset, "table_caption"),
-                     (self.footer_doc, self.footer_offset, "table_footer")]
-        used_annots = []
-        for (doc, offset, elem) in docs_iter:
-            if doc and doc.ents:
-                used_annots, t, m, p, r = BioC.get_bioc_annotations(doc, used_annots, offset, t, m, p, r, elem)
+            entity = Table.__get_first_entity(section.doc, label)
+            section_entities.append((entity, "section_title", section.title_offset or 0) if entity is not None
+                                    else table_entity)
+        return table_entity, section_entities
 
-        for row in self.column_rows:
-            row_annotations, row_relations, t, m, p, r = self.__get_row_annotations(row, self.column_types, t, m, p, r)
-            used_annots += row_annotations
+    def __get_row_entities(self, nlp, row, column_map):
+        """
+        Create the annotations of a row's typed cells, without identifiers.
+        @return: Tuple of trait, variant and significance annotation lists
+        """
+        traits, variants, significances = [], [], []
+        for i, column_types in column_map:
+            if i >= len(row.cells):
+                break
+            cell = row.cells[i]
+            if not cell.doc:
+                continue
+            for column_type in column_types:
+                if column_type == Table.COLUMN_MARKER:
+                    for entity in [x for x in cell.doc.ents if x.label_ == "RSID"]:
+                        variants.append(get_cell_entity_annotation(nlp, entity, "table_content", cell.id)[0])
+                elif column_type == Table.COLUMN_SIGNIFICANCE:
+                    entities = [x for x in cell.doc.ents if x.label_ == "PVAL"]
+                    for entity in entities:
+                        significances.append(get_cell_entity_annotation(nlp, entity, "table_content", cell.id)[0])
+                    # Significance columns commonly hold bare values, e.g. 3.2 × 10−8, which are not PVAL entities.
+                    if not entities and Table.body_significance_shape.search(cell.text):
+                        value = parse_p_value(cell.text)
+                        if is_significant(value, nlp.max_p_value):
+                            significances.append(get_cell_annotation(None, "significance", "PVAL", cell.text.strip(),
+                                                                     cell.text.index(cell.text.strip()), cell.id,
+                                                                     infons=get_significance_infons(value)))
+                elif column_type == Table.COLUMN_TRAIT:
+                    for entity in [x for x in cell.doc.ents if x._.is_trait or x._.has_trait]:
+                        traits.append(get_cell_entity_annotation(nlp, entity, "table_content", cell.id)[0])
+        return traits, variants, significances
 
-        for section in self.data_sections:
+    @staticmethod
+    def __assign_identifier(nlp, annotation):
+        annotation_type = annotation.infons["type"]
+        if annotation_type == "trait":
+            annotation.id = F"T{nlp.t}"
+            nlp.t += 1
+        elif annotation_type == "genetic_variant":
+            annotation.id = F"V{nlp.v}"
+            nlp.v += 1
+        else:
+            annotation.id = F"S{nlp.s}"
+            nlp.s += 1
+
+    def get_annotations(self, nlp):
+        """
+        Extract the trait, variant and significance annotations of each body row and relate them, according to the
+        table type:
+            TYPE_MARKER_LIST: Variants and significances per row, the trait given per row or stated once in a section
+            title, caption, title or footer.
+            TYPE_TRAIT_LIST: Traits and significances per row, the variant given per row or stated once in a section
+            title or caption. Tables with a trait only in their caption, title or footer are also of this type, so the
+            trait may be stated once too.
+            TYPE_TRAIT_AND_MARKER_LIST: Traits, variants and significances all given per row.
+        Rows without a variant and significance are skipped, and annotations are only retained (and assigned
+        identifiers) for rows which are related.
+        @param nlp: Interpreter whose annotation and relation counters are advanced
+        @return: Interpreter with the table's annotations and relations appended
+        """
+        current_datetime = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+        column_map = self.get_column_map()
+        section_traits, section_variants = [None] * len(self.data_sections), [None] * len(self.data_sections)
+        if self.table_type in [self.TYPE_MARKER_LIST, self.TYPE_TRAIT_LIST]:
+            table_trait, section_traits = self.__get_context_entities()
+            table_variant, section_variants = self.__get_context_entities("RSID")
+            if self.table_type == self.TYPE_MARKER_LIST:
+                section_variants = [None] * len(self.data_sections)
+        # Context entities are annotated once, on first use, and shared by every relation.
+        context_annotations = {}
+        annotations, relations = [], []
+
+        def get_context_annotation(context):
+            if context is None:
+                return []
+            key = (id(context[0]), context[1])
+            if key not in context_annotations:
+                annotation = get_cell_entity_annotation(nlp, context[0], context[1], None, context[2])[0]
+                Table.__assign_identifier(nlp, annotation)
+                annotations.append(annotation)
+                context_annotations[key] = annotation
+            return [context_annotations[key]]
+
+        def add_row_annotation(annotation, added):
+            if id(annotation) in added or annotation in context_annotations.values():
+                return
+            Table.__assign_identifier(nlp, annotation)
+            annotations.append(annotation)
+            added.add(id(annotation))
+
+        for section_index, section in enumerate(self.data_sections):
             for row in section.rows:
-                row_annotations, row_relations, t, m, p, r = self.__get_row_annotations(row, self.column_types, t, m,
-                                                                                        p, r)
-                used_annots += row_annotations
-        self.annotations = used_annots
-        return t, m, p, r, used_annots
+                traits, variants, significances = self.__get_row_entities(nlp, row, column_map)
+                if not significances:
+                    continue
+                if not variants:
+                    variants = get_context_annotation(section_variants[section_index])
+                if not traits:
+                    traits = get_context_annotation(section_traits[section_index])
+                if not variants or not traits:
+                    continue
+                added = set()
+                for trait, variant, significance in broadcast(traits, variants, significances):
+                    for annotation in (trait, variant, significance):
+                        add_row_annotation(annotation, added)
+                    relations.append(BioC.BioCRelation(id=F"R{nlp.r}", infons={"type": "disease_assoc",
+                                                                               "annotator": "GWASMiner@le.ac.uk",
+                                                                               "updated_at": current_datetime},
+                                                       nodes=[BioC.BioCNode(refid=trait.id, role="trait"),
+                                                              BioC.BioCNode(refid=variant.id, role="variant"),
+                                                              BioC.BioCNode(refid=significance.id,
+                                                                            role="significance")]))
+                    nlp.r += 1
+        nlp.annotations += annotations
+        nlp.relations += relations
+        return nlp
 
     def jsonable(self):
         output_dict = self.__dict__
         del output_dict['title_doc']
         del output_dict['footer_doc']
         del output_dict['caption_doc']
+        output_dict['column_types'] = list(self.column_types)
         return output_dict
 
 
+def __compile_header_classifier():
+    """
+    Combine the header strings of each column type into a single alternation of named groups, e.g. trait_0, with
+    the consuming prefix and suffix replaced by lookarounds so adjacent terms are all found by finditer.
+    """
+    alternatives = []
+    group_flags = {}
+    for column_type, name, strings in Table.header_type_order:
+        for i, pattern in enumerate(strings):
+            term = pattern[len(Table.header_prefix):-len(Table.header_suffix)]
+            alternatives.append(F"(?P<{name}_{i}>{term})")
+            group_flags[F"{name}_{i}"] = Table.COLUMN_FLAGS[column_type]
+    return re.compile(F"(?<![^ ])(?:{'|'.join(alternatives)})(?!\\w)"), group_flags
+
+
+header_classifier, header_group_flags = __compile_header_classifier()
+
+
 class TablePassage:
     def __init__(self, title):
         self.title = title
@@ -467,7 +621,7 @@ class TableSection:
 
     def add_spacy_docs(self, nlp):
         if self.title:
-            self.doc = nlp.process_corpus(self.title, )
+            self.doc = nlp.process_corpus(self.title, profile=PROFILE_TABLES)
 
     def jsonable(self):
         output_dict = self.__dict__
@@ -493,7 +647,7 @@ class TableCell:
 
     def add_spacy_docs(self, nlp):
         if self.text:
-            self.doc = nlp.process_corpus(self.text, )
+            self.doc = nlp.process_corpus(self.text, profile=PROFILE_TABLES)
 
     def jsonable(self):
         output_dict = self.__dict__
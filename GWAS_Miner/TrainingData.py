@@ -0,0 +1,81 @@
+import logging
+import os
+
+logger = logging.getLogger("GWAS Miner")
+
+TRAINING_DIR = "training_input"
+TRAINING_FILE_NAME = "training_input"
+
+
+def is_training_sentence(sent):
+    """
+    Determine whether a sentence contains a trait, a marker and a p-value, making it useful as training input.
+    """
+    labels = [x.label_ for x in sent.ents]
+    return bool([x for x in labels if x[0] == "D"]) and "RSID" in labels and "PVAL" in labels
+
+
+def get_marked_up_sentence(sent):
+    """
+    Produce the training markup of a sentence, e.g. "<!TRAIT:asthma !>was associated with <!RSID:rs123 !>...".
+    Built in a single pass over the entity offsets.
+    @param sent: Sentence span containing entities
+    @return: Marked up sentence string
+    """
+    text = sent.text_with_ws
+    pieces = []
+    position = 0
+    for ent in sent.ents:
+        start = ent.start_char - sent.start_char
+        end = start + len(ent.text_with_ws)
+        pieces.append(text[position:start])
+        label = "TRAIT" if ent.label_[0] == "D" else ent.label_
+        pieces.append(F"<!{label}:{ent.text_with_ws}!>")
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+class TrainingDataExporter:
+    """
+    Accumulates marked up training sentences and appends them to the training file in bulk.
+
+    When shard_by_process is set each process writes to its own training_input_<pid>.txt file, so parallel runs
+    do not contend on a single file.
+    """
+
+    def __init__(self, directory=TRAINING_DIR, shard_by_process=False):
+        self.directory = directory
+        self.shard_by_process = shard_by_process
+        self.__lines = []
+
+    def get_path(self):
+        if self.shard_by_process:
+            return os.path.join(self.directory, F"{TRAINING_FILE_NAME}_{os.getpid()}.txt")
+        return os.path.join(self.directory, F"{TRAINING_FILE_NAME}.txt")
+
+    def add_doc(self, doc):
+        """
+        Buffer the training sentences of a processed document.
+        @return: Number of sentences added
+        """
+        count = 0
+        for sent in doc.sents:
+            if sent.ents and is_training_sentence(sent):
+                self.__lines.append(get_marked_up_sentence(sent))
+                count += 1
+        return count
+
+    def flush(self):
+        """
+        Append the buffered sentences to the training file.
+        """
+        if not self.__lines:
+            return
+        lines, self.__lines = self.__lines, []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.get_path(), "a+", encoding="utf-8") as f_in:
+                f_in.write("\n".join(lines) + "\n")
+        except IOError as io:
+            logger.error(F"Unable to write training sentences: {io}")
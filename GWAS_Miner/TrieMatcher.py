@@ -0,0 +1,145 @@
+import logging
+import os
+import pickle
+
+logger = logging.getLogger("GWAS Miner")
+
+# Increment when the serialised layout changes.
+FORMAT_VERSION = 1
+
+
+class TokenTrieMatcher:
+    """
+    Ontology term matcher over lower case tokens, usable in place of a PhraseMatcher(attr="LOWER").
+
+    Every pattern is stored as a path through a single token trie, keyed on the hash of each token's lower case
+    text, so a pattern costs a handful of integers rather than a Doc. Matching walks the trie from every token in
+    the document and produces the same (match_id, start, end) tuples and on_match callbacks as a PhraseMatcher.
+    """
+
+    def __init__(self, vocab):
+        self.vocab = vocab
+        # (parent node, token lower hash) -> child node, the root node is 0.
+        self.__edges = {}
+        # node -> key hashes of the patterns ending at that node
+        self.__terminals = {}
+        # key hash -> nodes at which that key's patterns end
+        self.__key_nodes = {}
+        self.__callbacks = {}
+        self.__node_count = 1
+        self.__max_length = 0
+
+    def __len__(self):
+        return len(self.__key_nodes)
+
+    def __contains__(self, key):
+        return self.vocab.strings[key] in self.__key_nodes if key in self.vocab.strings else False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_TokenTrieMatcher__callbacks"] = {}
+        return state
+
+    def add(self, key, patterns, on_match=None):
+        """
+        Add patterns for a key.
+        @param key: Match ID string (e.g. the MeSH identifier)
+        @param patterns: Iterable of tokenised Doc objects or lists of token strings
+        @param on_match: Callback executed for each match, taking (matcher, doc, i, matches)
+        """
+        key_hash = self.vocab.strings.add(key)
+        nodes = self.__key_nodes.setdefault(key_hash, [])
+        for pattern in patterns:
+            token_hashes = [self.vocab.strings.add(x.lower()) if isinstance(x, str) else x.lower for x in pattern]
+            if not token_hashes:
+                continue
+            node = 0
+            for token_hash in token_hashes:
+                child = self.__edges.get((node, token_hash))
+                if child is None:
+                    child = self.__node_count
+                    self.__edges[(node, token_hash)] = child
+                    self.__node_count += 1
+                node = child
+            terminal_keys = self.__terminals.setdefault(node, [])
+            if key_hash not in terminal_keys:
+                terminal_keys.append(key_hash)
+                nodes.append(node)
+            if len(token_hashes) > self.__max_length:
+                self.__max_length = len(token_hashes)
+        if on_match:
+            self.__callbacks[key_hash] = on_match
+
+    def remove(self, key):
+        """
+        Remove every pattern of a key. Trie paths are left in place, they simply no longer end in a match.
+        """
+        if key not in self:
+            raise KeyError(key)
+        key_hash = self.vocab.strings[key]
+        for node in self.__key_nodes.pop(key_hash):
+            self.__terminals[node].remove(key_hash)
+            if not self.__terminals[node]:
+                del self.__terminals[node]
+        self.__callbacks.pop(key_hash, None)
+
+    def set_on_match(self, on_match):
+        """
+        Assign the callback for every key, e.g. after loading a matcher from disk.
+        """
+        self.__callbacks = {x: on_match for x in self.__key_nodes}
+
+    def __call__(self, doc):
+        token_hashes = [x.lower for x in doc]
+        doc_length = len(token_hashes)
+        edges = self.__edges
+        terminals = self.__terminals
+        matches = []
+        for start in range(doc_length):
+            node = 0
+            for end in range(start, min(doc_length, start + self.__max_length)):
+                node = edges.get((node, token_hashes[end]))
+                if node is None:
+                    break
+                for key_hash in terminals.get(node, ()):
+                    matches.append((key_hash, start, end + 1))
+        for i in range(len(matches)):
+            on_match = self.__callbacks.get(matches[i][0])
+            if on_match:
+                on_match(self, doc, i, matches)
+        return matches
+
+    def to_disk(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        keys = [self.vocab.strings[x] for x in self.__key_nodes]
+        state = self.__getstate__()
+        del state["vocab"]
+        temp_path = F"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as fout:
+            pickle.dump((FORMAT_VERSION, keys, state), fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def from_disk(path, vocab, on_match=None):
+        """
+        Load a serialised matcher.
+        @return: TokenTrieMatcher object, or None if the file is missing or from an incompatible version.
+        """
+        try:
+            with open(path, "rb") as fin:
+                format_version, keys, state = pickle.load(fin)
+        except (IOError, pickle.UnpicklingError, ValueError, EOFError) as e:
+            logger.info(F"Unable to load trie matcher from {path}: {e}")
+            return None
+        if format_version != FORMAT_VERSION:
+            return None
+        matcher = TokenTrieMatcher(vocab)
+        state["vocab"] = vocab
+        matcher.__dict__.update(state)
+        for key in keys:
+            vocab.strings.add(key)
+        if on_match:
+            matcher.set_on_match(on_match)
+        return matcher
@@ -0,0 +1,158 @@
+import gc
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger("GWAS Miner")
+
+MEBIBYTE = 1 << 20
+
+# State inherited by forked workers, set in the parent while the pool is running so replacement workers inherit it too.
+_worker_state = None
+_worker_function = None
+
+
+def is_fork_available():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def get_memory_usage(pid=None):
+    """
+    Read the memory usage of a process from /proc/<pid>/smaps_rollup.
+
+    USS (unique set size) is the memory which would be freed if the process exited, i.e. the pages it no longer
+    shares with the parent, and so is the cost of adding a worker to the pool.
+    @param pid: Process ID, defaults to the current process
+    @return: Dictionary of rss, pss and uss in bytes, or None if unavailable on this platform.
+    """
+    path = F"/proc/{pid if pid else 'self'}/smaps_rollup"
+    fields = {}
+    try:
+        with open(path, "r") as fin:
+            for line in fin:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except (IOError, ValueError):
+        return None
+    return {"rss": fields.get("Rss", 0), "pss": fields.get("Pss", 0),
+            "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def get_available_memory():
+    """
+    @return: MemAvailable from /proc/meminfo in bytes, or None if unavailable on this platform.
+    """
+    try:
+        with open("/proc/meminfo", "r") as fin:
+            for line in fin:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (IOError, ValueError):
+        pass
+    return None
+
+
+def _run_task(task):
+    try:
+        result, error = _worker_function(_worker_state, task), None
+    except Exception as e:
+        logger.exception(F"Worker {os.getpid()} failed to process {task}")
+        result, error = None, repr(e)
+    return task, result, error, os.getpid(), get_memory_usage()
+
+
+class ForkWorkerPool:
+    """
+    Process pool whose workers are forked from a parent which has already loaded the shared state (e.g. the
+    Interpreter with its spaCy model, matchers and lexicon), so that the state is shared copy-on-write rather than
+    loaded by every worker.
+
+    Objects in the shared state are moved to the permanent generation with gc.freeze() before forking, so that garbage
+    collection in the workers does not write to, and so copy, the pages holding them. Each result reports the
+    unique memory of the worker that produced it, which is the memory needed per additional worker.
+    """
+
+    def __init__(self, state, function, workers):
+        """
+        @param state: Object passed to function in each worker, inherited through fork rather than pickled
+        @param function: Module level function called as function(state, task) within the workers
+        @param workers: Number of worker processes
+        """
+        if not is_fork_available():
+            raise RuntimeError("Forked worker processes are not supported on this platform")
+        self.workers = workers
+        self.worker_memory = {}
+        self.parent_memory = None
+        self.__state = state
+        self.__function = function
+        self.__pool = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        global _worker_state, _worker_function
+        _worker_state, _worker_function = self.__state, self.__function
+        gc.collect()
+        gc.freeze()
+        self.__pool = multiprocessing.get_context("fork").Pool(self.workers)
+        self.parent_memory = get_memory_usage()
+        logger.info(F"Started {self.workers} forked worker(s) from process {os.getpid()}")
+
+    def imap_unordered(self, tasks):
+        """
+        Process each task in the workers, yielding results as they complete.
+        @param tasks: Iterable of picklable task arguments
+        @return: Generator of (task, result, error) tuples, error being None on success.
+        """
+        for task, result, error, pid, memory in self.__pool.imap_unordered(_run_task, tasks):
+            if memory:
+                peak = self.worker_memory.get(pid)
+                if not peak or memory["uss"] > peak["uss"]:
+                    self.worker_memory[pid] = memory
+            yield task, result, error
+
+    def memory_summary(self):
+        """
+        Summarise the memory usage of the pool, estimating the number of workers that would fit in the memory
+        currently available. Call while the pool is running so that available memory accounts for its workers.
+        @return: Dictionary of memory statistics in bytes, or None if memory usage is unavailable.
+        """
+        if not self.worker_memory:
+            return None
+        peak_uss = max(x["uss"] for x in self.worker_memory.values())
+        available = get_available_memory()
+        summary = {"workers": self.workers, "parent_rss": self.parent_memory["rss"] if self.parent_memory else None,
+                   "peak_worker_uss": peak_uss,
+                   "mean_worker_uss": sum(x["uss"] for x in self.worker_memory.values()) // len(self.worker_memory),
+                   "peak_worker_pss": max(x["pss"] for x in self.worker_memory.values()),
+                   "available": available}
+        if available is not None and peak_uss:
+            summary["estimated_max_workers"] = self.workers + available // peak_uss
+        return summary
+
+    def log_memory_summary(self):
+        summary = self.memory_summary()
+        if not summary:
+            return
+        message = F"Worker pool memory: parent RSS {(summary['parent_rss'] or 0) / MEBIBYTE:.1f} MiB, " \
+                  F"peak worker USS {summary['peak_worker_uss'] / MEBIBYTE:.1f} MiB, " \
+                  F"mean worker USS {summary['mean_worker_uss'] / MEBIBYTE:.1f} MiB"
+        if "estimated_max_workers" in summary:
+            message += F", approximately {summary['estimated_max_workers']} workers fit in available memory"
+        logger.info(message)
+
+    def close(self):
+        global _worker_state, _worker_function
+        if self.__pool is None:
+            return
+        self.__pool.close()
+        self.__pool.join()
+        self.__pool = None
+        gc.unfreeze()
+        _worker_state, _worker_function = None, None
@@ -1,11 +1,70 @@
 import html
 import re
+from bisect import bisect_left
 from datetime import datetime
 from difflib import SequenceMatcher
 
-from GWAS_Miner import BioC
-from GWAS_Miner.BioC import BioCLocation, BioCAnnotation
-from Utility_Functions import Utility
+import BioC
+from BioC import BioCLocation, BioCAnnotation
+
+# Minimum SequenceMatcher ratio for a passage sentence to be aligned with a BeFree sentence.
+SENTENCE_MATCH_THRESHOLD = 0.7
+SENTENCE_DELIMITER = ". "
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalise_sentence(text):
+    """
+    Normalise a sentence for exact lookup, unescaping HTML entities, collapsing whitespace and dropping the final
+    full stop removed when passages are split into sentences.
+    """
+    return WHITESPACE_PATTERN.sub(" ", html.unescape(text)).strip().rstrip(".").rstrip()
+
+
+class SentenceIndex:
+    """
+    Sentences of a passage split once on ". ", with their passage offsets, indexed by their normalised text.
+
+    BeFree sentences are aligned by exact lookup of their normalised text, falling back to the sentence with the
+    highest SequenceMatcher ratio. The fuzzy fallback skips sentences whose real_quick_ratio or quick_ratio upper
+    bounds cannot beat the threshold or the best ratio found so far.
+    """
+
+    def __init__(self, text):
+        self.sentences = []
+        self.__exact = {}
+        offset = 0
+        for sentence in text.split(SENTENCE_DELIMITER):
+            if sentence:
+                self.sentences.append((sentence, offset))
+                self.__exact.setdefault(normalise_sentence(sentence), (sentence, offset))
+            offset += len(sentence) + len(SENTENCE_DELIMITER)
+
+    def find(self, sentence, normalised=None, threshold=SENTENCE_MATCH_THRESHOLD):
+        """
+        Align a sentence with a sentence of the passage.
+        @param sentence: Sentence text to align
+        @param normalised: normalise_sentence(sentence), if already computed
+        @param threshold: Minimum ratio of a fuzzy match
+        @return: Tuple of the matching passage sentence and its offset within the passage, or None.
+        """
+        match = self.__exact.get(normalised if normalised is not None else normalise_sentence(sentence))
+        if match:
+            return match
+        # The matcher caches its analysis of the second sequence, so the BeFree sentence is set once as seq2.
+        matcher = SequenceMatcher(None, b=sentence)
+        best_score = threshold
+        best_match = None
+        for candidate in self.sentences:
+            matcher.set_seq1(candidate[0])
+            if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                continue
+            score = matcher.ratio()
+            if score > best_score or (best_match is None and score == best_score):
+                best_score = score
+                best_match = candidate
+        return best_match
+
 
 def get_befree_data(pmid):
     befree_data = {}
@@ -83,17 +142,49 @@ def get_bioc_annotations(annotations, offset, nlp):
     return nlp
 
 
-def get_closest_index(text, search, target):
-    closest_index = None
-    closest_difference = None
-    for match in re.finditer(search, text, flags=re.MULTILINE):
-        if closest_index is None:
-            closest_index = match.start()
-            closest_difference = abs(target - closest_index)
-        elif closest_difference and abs(target - match.start()) < closest_difference:
-            closest_index = match.start()
-            closest_difference = abs(target - closest_index)
-    return closest_index
+class OccurrenceLocator:
+    """
+    Sorted offsets of every occurrence of a set of literal strings within a text, found in a single pass.
+
+    The targets are searched for together as an escaped alternation inside a lookahead, longest first, so that
+    overlapping occurrences are found. At each position only the longest target is matched, and any shorter
+    target found at the same position must be a prefix of it, so those are recorded from a precomputed prefix table.
+    """
+
+    def __init__(self, text, targets):
+        targets = sorted({x for x in targets if x}, key=len, reverse=True)
+        self.offsets = {x: [] for x in targets}
+        if not targets:
+            return
+        prefixes = {x: [y for y in targets if x.startswith(y)] for x in targets}
+        pattern = re.compile(F"(?=({'|'.join(re.escape(x) for x in targets)}))")
+        for match in pattern.finditer(text):
+            for target in prefixes[match.group(1)]:
+                self.offsets[target].append(match.start())
+
+    def closest(self, target, position):
+        """
+        @param target: String to locate, which must have been one of the targets of the locator
+        @param position: Expected offset of the target
+        @return: Offset of the occurrence of target closest to position, the earlier on a tie, or None if absent.
+        """
+        offsets = self.offsets.get(target)
+        if not offsets:
+            return None
+        i = bisect_left(offsets, position)
+        if i == len(offsets):
+            return offsets[-1]
+        if i and position - offsets[i - 1] <= offsets[i] - position:
+            return offsets[i - 1]
+        return offsets[i]
+
+
+def get_befree_offset(value):
+    """
+    @param value: BeFree "start#end" offset of an entity within its sentence
+    @return: Start offset
+    """
+    return int(value[:value.index("#")])
 
 
 def get_befree_annotations(study, nlp, current_datetime):
@@ -103,26 +194,31 @@ def get_befree_annotations(study, nlp, current_datetime):
         study_befree_data = befree_data[pmid]
         relations = []
         contains_missing_entities = False
+        normalised_sentences = [normalise_sentence(x['sentence']) for x in study_befree_data]
         for passage in study['documents'][0]['passages']:
             annotations = []
             if passage['infons']['section_type'] == "ABSTRACT" and "title" not in passage['infons']['type']:
-                text = passage["text"]
-                for entry in study_befree_data:
+                sentence_index = SentenceIndex(passage["text"])
+                matches = [sentence_index.find(x['sentence'], y) for x, y in zip(study_befree_data, normalised_sentences)]
+                # Every entity of the entries aligned with a sentence is located in one pass over that sentence.
+                sentence_targets = {}
+                for entry, match in zip(study_befree_data, matches):
+                    if match:
+                        sentence_targets.setdefault(match, []).extend(
+                            [entry["disease_text"], entry["gene_text" if "ncbi_id" in entry.keys() else "variantid"]])
+                locators = {x: OccurrenceLocator(x[0], sentence_targets[x]) for x in sentence_targets}
+                for entry, match in zip(study_befree_data, matches):
                     disease_node_id = nlp.t
                     marker_node_id = nlp.v
                     gene_node_id = nlp.g
                     is_gene = "ncbi_id" in entry.keys()
-                    sent = sorted([(SequenceMatcher(None, x, entry['sentence']).ratio(), x) for x in text.split(". ")],
-                                  key=lambda y: y[0], reverse=True)[0]
-                    sent_score = sent[0]
-                    sent = sent[1]
-                    if not sent or sent_score < 0.7:
+                    if not match:
                         continue
-                    sentence_offset = text.index(sent) + passage["offset"]
+                    locator = locators[match]
+                    sentence_offset = match[1] + passage["offset"]
                     try:
-                        loc = BioC.BioCLocation(offset=get_closest_index(sent, entry["disease_text"], int(
-                            entry["disease_offset"][:entry["disease_offset"].index("#")]) + sentence_offset) + sentence_offset,
-                                                length=len(entry["disease_text"]))
+                        loc = BioC.BioCLocation(offset=locator.closest(entry["disease_text"], get_befree_offset(
+                            entry["disease_offset"])) + sentence_offset, length=len(entry["disease_text"]))
                         annotations.append(BioC.BioCAnnotation(id=F"T{nlp.t}",
                                                                infons={"type": "trait",
                                                                        "identifier": F"MeSH:{entry['meshid']}",
@@ -131,9 +227,8 @@ def get_befree_annotations(study, nlp, current_datetime):
                                                                locations=[loc], text=entry["disease_text"]))
                         nlp.t += 1
                         if not is_gene:
-                            loc = BioC.BioCLocation(offset=get_closest_index(sent, entry["variantid"], int(
-                                    entry["variant_offset"][:entry["variant_offset"].index("#")]) + sentence_offset) + sentence_offset,
-                                                    length=len(entry["variantid"]))
+                            loc = BioC.BioCLocation(offset=locator.closest(entry["variantid"], get_befree_offset(
+                                entry["variant_offset"])) + sentence_offset, length=len(entry["variantid"]))
                             annotations.append(BioC.BioCAnnotation(id=F"V{nlp.v}",
                                                 infons={"type": "genetic_variant", "identifier": F"dbSNP:{entry['variantid']}",
                                                         "annotator": "GWASMiner@le.ac.uk",
@@ -141,9 +236,8 @@ def get_befree_annotations(study, nlp, current_datetime):
                                                 locations=[loc], text=entry["variantid"]))
                             nlp.v += 1
                         else:
-                            loc = BioC.BioCLocation(offset=get_closest_index(sent, entry["gene_text"], int(
-                                    entry["gene_offset"][:entry["gene_offset"].index("#")]) + sentence_offset) + sentence_offset,
-                                                    length=len(entry["gene_text"]))
+                            loc = BioC.BioCLocation(offset=locator.closest(entry["gene_text"], get_befree_offset(
+                                entry["gene_offset"])) + sentence_offset, length=len(entry["gene_text"]))
                             annotations.append(BioC.BioCAnnotation(id=F"G{nlp.g}",
                                                 infons={"type": "gene", "identifier": F"Entrez:{entry['ncbi_id']}",
                                                         "annotator": "GWASMiner@le.ac.uk",
@@ -171,6 +265,8 @@ def get_befree_annotations(study, nlp, current_datetime):
                 for annot in annotations:
                     passage['annotations'].append(annot)
         if relations:
+            # Imported here as it requires spaCy, which the sentence and entity alignment above does not.
+            from Utility_Functions import Utility
             relations = Utility.remove_duplicate_bioc_associations(relations)
             for relation in relations:
                 study['documents'][0]['relations'].append(relation)
@@ -15,6 +15,18 @@ regex_entity_patterns = {
     # "Table Ref": r"(table[- ]{0,}\d{1,})"
 }
 
+# Sentences must match at least one pattern of every label to be sent through the dependency parser when sentence
+# pre-filtering is enabled.
+candidate_sentence_patterns = {
+    "RSID": [r"\brs[0-9]+"],
+    "PVAL": regex_entity_patterns["PVAL"]
+}
+# Sentences either side of a candidate sentence that are also parsed, for context.
+candidate_context_sentences = 1
+# PVAL entities with a p-value above this threshold are not extracted, e.g. 5e-8 for genome-wide significance.
+# None extracts every p-value.
+max_p_value = None
+
 pheno_assoc_patterns = [
     [
         {
@@ -24,6 +24,9 @@ setuptools.setup(
        "PyQt5>=5.15.0",
         "bs4"
     ],
+    extras_require={
+        "tables": ["pandas>=1.1", "openpyxl>=3.0"]
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# GWAS Miner modules import each other by module name, as when run from within the GWAS_Miner directory.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "GWAS_Miner"))
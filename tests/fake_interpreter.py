@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from DataStructures import RSID_PATTERN
+from PValue import parse_p_value, pvalue_pattern
+
+
+class FakeInterpreter:
+    """
+    Stand-in for NLP.Interpreter without spaCy, recognising a fixed set of traits, rsIDs and scientific notation
+    p-values, and counting the texts processed.
+    """
+
+    def __init__(self, traits):
+        self.traits = traits
+        self.processed = []
+        self.v, self.s, self.t, self.r = 0, 0, 0, 0
+        self.max_p_value = None
+        self.annotations = []
+        self.relations = []
+
+    @staticmethod
+    def get_entity(text, start, end, label, p_value=None):
+        return SimpleNamespace(text=text[start:end], label_=label, start_char=start, end_char=end,
+                               _=SimpleNamespace(is_trait=label not in ("RSID", "PVAL"), has_trait=False,
+                                                 p_value=p_value))
+
+    def process_corpus(self, text, profile=None):
+        self.processed.append(text)
+        ents = []
+        for i, trait in enumerate(self.traits):
+            start = text.lower().find(trait.lower())
+            if start != -1:
+                ents.append(self.get_entity(text, start, start + len(trait), F"D{i + 1:06d}"))
+        for match in RSID_PATTERN.finditer(text):
+            ents.append(self.get_entity(text, match.start(), match.end(), "RSID"))
+        for match in pvalue_pattern.finditer(text):
+            ents.append(self.get_entity(text, match.start(), match.end(), "PVAL", parse_p_value(match.group())))
+        return SimpleNamespace(ents=sorted(ents, key=lambda x: x.start_char))
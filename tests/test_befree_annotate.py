@@ -0,0 +1,71 @@
+from befree_annotate import OccurrenceLocator, SentenceIndex, normalise_sentence
+
+
+def test_locator_escapes_metacharacters():
+    text = "soluble IL-6R(a) and IL-6Ra levels, IL-6R(a) again"
+    locator = OccurrenceLocator(text, ["IL-6R(a)"])
+    assert locator.offsets["IL-6R(a)"] == [8, 36]
+
+
+def test_locator_finds_overlapping_occurrences():
+    assert OccurrenceLocator("aaaa", ["aa"]).offsets["aa"] == [0, 1, 2]
+
+
+def test_locator_records_prefix_targets_at_same_offset():
+    locator = OccurrenceLocator("IL-6R and IL-6 and IL-6R", ["IL-6", "IL-6R", ""])
+    assert locator.offsets == {"IL-6R": [0, 19], "IL-6": [0, 10, 19]}
+
+
+def test_closest_occurrence():
+    locator = OccurrenceLocator("x ab x ab x ab", ["ab"])
+    assert locator.closest("ab", 0) == 2
+    assert locator.closest("ab", 8) == 7
+    assert locator.closest("ab", 20) == 12
+
+
+def test_closest_tie_goes_to_earlier_occurrence():
+    assert OccurrenceLocator("x ab xx ab", ["ab"]).closest("ab", 5) == 2
+
+
+def test_closest_absent_target():
+    locator = OccurrenceLocator("asthma", ["rs123"])
+    assert locator.closest("rs123", 0) is None
+    assert locator.closest("asthma", 0) is None
+    assert OccurrenceLocator("asthma", []).closest("asthma", 0) is None
+
+
+def test_normalise_sentence():
+    assert normalise_sentence(" IL-6 &amp; asthma\n risk. ") == "IL-6 & asthma risk"
+
+
+def test_sentence_index_exact_normalised_lookup():
+    text = "First sentence here. Second  sentence with &amp; stuff. Third one."
+    index = SentenceIndex(text)
+    sentence, offset = index.find("Second sentence with & stuff.")
+    assert sentence == "Second  sentence with &amp; stuff"
+    assert offset == text.index("Second")
+    assert index.find("Third one") == ("Third one.", text.index("Third"))
+
+
+def test_sentence_index_offsets_from_split():
+    text = "The risk is high. Risk is high. risk is high"
+    index = SentenceIndex(text)
+    assert index.sentences == [("The risk is high", 0), ("Risk is high", 18), ("risk is high", 32)]
+    assert index.find("risk is high") == ("risk is high", 32)
+
+
+def test_sentence_index_fuzzy_fallback():
+    index = SentenceIndex("Asthma was associated with rs123 in adults. Height was not")
+    assert index.find("Asthma was associated with rs1234 in adult") == ("Asthma was associated with rs123 in adults",
+                                                                           0)
+    assert index.find("Completely unrelated text about diabetes") is None
+
+
+def test_sentence_index_fuzzy_threshold_is_inclusive():
+    assert SentenceIndex("abcdefghij").find("abcdefgxyz") == ("abcdefghij", 0)
+    assert SentenceIndex("abcdefghij").find("abcdefwxyz") is None
+
+
+def test_sentence_index_fuzzy_tie_goes_to_first_best():
+    index = SentenceIndex("Asthma was associated with rs123. Asthma was associated with rs123")
+    assert index.find("Asthma was associated with rs124") == ("Asthma was associated with rs123", 0)
@@ -0,0 +1,58 @@
+import re
+import warnings
+
+import pytest
+
+import DataStructures
+from DataStructures import count_cell_types, forward_fill
+
+CELLS = ["rs123", "RS4 A", "chr1:rs99", "12", "12 ", "3", "1.2 x 10-8", "3.2×10-5(a)", "0.05", "p=0.03 ", "",
+         "   ", "Asthma", "Type 2 diabetes", "rs", "1 2", "0.5x", "Body mass index\nBMI", "1.0E-8", "-"]
+
+
+def get_baseline_counts(values):
+    """
+    Per-cell classification chain used before columns were classified at once.
+    """
+    counts = dict.fromkeys(DataStructures.CELL_TYPES, 0)
+    for cell_value in values:
+        if re.search(r"(?:rs[0-9]{1,}){1}", cell_value, re.IGNORECASE):
+            counts["rsid"] += 1
+        elif re.fullmatch(r"(^[0-9]{1,}[ ]?$)", cell_value, re.IGNORECASE):
+            counts["integer"] += 1
+        elif re.search(r"(\d+\.?\d?[ ]?[×xX*][ ]?\d+-\d[\(]?\d?[\)]?)|(\d\.\d+ ?)$", cell_value, re.IGNORECASE):
+            counts["pval"] += 1
+        elif not cell_value.replace(" ", ""):
+            counts["blank"] += 1
+        else:
+            counts["phenotype"] += 1
+    return counts
+
+
+@pytest.fixture(params=["regex", "pandas"])
+def cell_type_branch(request, monkeypatch):
+    if request.param == "pandas":
+        monkeypatch.setattr(DataStructures, "pandas", pytest.importorskip("pandas"))
+    else:
+        monkeypatch.setattr(DataStructures, "pandas", None)
+    return request.param
+
+
+def test_count_cell_types_matches_baseline(cell_type_branch):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        counts = count_cell_types(CELLS)
+    assert counts == get_baseline_counts(CELLS)
+    assert sum(counts.values()) == len(CELLS)
+    for cell in CELLS:
+        assert count_cell_types([cell]) == get_baseline_counts([cell]), cell
+
+
+def test_count_cell_types_empty(cell_type_branch):
+    assert count_cell_types([]) == dict.fromkeys(DataStructures.CELL_TYPES, 0)
+
+
+def test_forward_fill():
+    assert forward_fill(["", " ", "Asthma", "", "  ", "Hypertension", ""]) == \
+        ["", " ", "Asthma", "Asthma", "Asthma", "Hypertension", "Hypertension"]
+    assert forward_fill([]) == []
@@ -0,0 +1,98 @@
+from DataStructures import Lexicon, LexiconEntry, MasterLexicon
+from LexiconStore import LexiconStore, StoredLexicon
+
+
+def get_entry(identifier, name, tree_ids=(None,), synonyms=()):
+    entry = LexiconEntry(identifier, name=name, tree_id=tree_ids[0])
+    for tree_id in tree_ids[1:]:
+        entry.add_tree_id(tree_id)
+    for synonym in synonyms:
+        entry.add_synonym(id=identifier, name=synonym)
+    return entry
+
+
+def get_master_lexicon(lexicons):
+    """
+    @param lexicons: Dictionary of lexicon name -> list of LexiconEntry objects, in priority order
+    """
+    master = MasterLexicon()
+    for name, entries in lexicons.items():
+        lexicon = Lexicon(name)
+        for entry in entries:
+            lexicon.add_entry(entry)
+        master.add_lexicon(lexicon)
+    master.set_priority_order({x: i + 1 for i, x in enumerate(lexicons)})
+    return master
+
+
+def get_mesh_entries():
+    return [get_entry("D001249", "Asthma", ("C08.127.108", "C08.381.495.108"), ["Asthma", "Bronchial Asthma"]),
+            get_entry("D006973", "Hypertension", ("C14.907.489",), ["High Blood Pressure"])]
+
+
+def get_hpo_entries():
+    return [get_entry("HP:0001250", "Seizure", synonyms=["Seizures"])]
+
+
+def test_write_and_load(tmp_path):
+    store = LexiconStore(str(tmp_path / "lexicon.db"))
+    version = store.write(get_master_lexicon({"MESH": get_mesh_entries(), "HPO": get_hpo_entries()}))
+    master = store.load_master_lexicon()
+    assert master.version == version
+    assert list(master.get_priority_order()) == ["MESH", "HPO"]
+    mesh = master.get_lexicon_by_name("MESH")
+    assert isinstance(mesh, StoredLexicon)
+    entry = mesh.get_entry_by_id("D001249")
+    assert (entry.name(), entry.tree_id()) == ("Asthma", ["C08.127.108", "C08.381.495.108"])
+    assert [x["name"] for x in entry.synonyms()] == ["Asthma", "Bronchial Asthma"]
+    assert mesh.get_entry_by_term("HIGH BLOOD PRESSURE").identifier == "D006973"
+    assert mesh.get_entry_by_term("bronchial asthma") is entry
+    assert mesh.get_entry_by_term("seizure") is None
+    assert master.get_lexicon_by_name("HPO").get_entry_by_term("seizures").identifier == "HP:0001250"
+    assert [x.identifier for x in mesh.get_entries()] == ["D001249", "D006973"]
+
+
+def test_version_independent_of_order(tmp_path):
+    store = LexiconStore(str(tmp_path / "lexicon.db"))
+    version = store.write(get_master_lexicon({"MESH": get_mesh_entries(), "HPO": get_hpo_entries()}))
+    reordered = LexiconStore(str(tmp_path / "reordered.db"))
+    assert reordered.write(get_master_lexicon({"HPO": get_hpo_entries(), "MESH": get_mesh_entries()[::-1]})) == \
+        version
+    changed = get_mesh_entries()
+    changed[1].add_synonym(id="D006973", name="Raised Blood Pressure")
+    assert LexiconStore(str(tmp_path / "changed.db")).write(get_master_lexicon({"MESH": changed,
+                                                                                "HPO": get_hpo_entries()})) != version
+
+
+def test_update_applies_changes(tmp_path):
+    store = LexiconStore(str(tmp_path / "lexicon.db"))
+    from_version = store.write(get_master_lexicon({"MESH": get_mesh_entries(), "HPO": get_hpo_entries()}))
+    mesh = get_mesh_entries()
+    mesh[1].add_synonym(id="D006973", name="Raised Blood Pressure")
+    mesh.append(get_entry("D003920", "Diabetes Mellitus", ("C18.452.394.750",)))
+    fresh = get_master_lexicon({"MESH": mesh, "HPO": []})
+    change_set = store.update(fresh)
+    assert change_set.from_version == from_version
+    assert [(x, y.identifier) for x, y in change_set.added] == [("MESH", "D003920")]
+    assert [(x, y.identifier) for x, y in change_set.modified] == [("MESH", "D006973")]
+    assert change_set.removed == [("HPO", "HP:0001250")]
+    assert change_set.to_version == store.version
+    assert change_set.to_version == LexiconStore(str(tmp_path / "rebuilt.db")).write(fresh)
+    mesh = store.load_master_lexicon().get_lexicon_by_name("MESH")
+    assert mesh.get_entry_by_term("raised blood pressure").identifier == "D006973"
+    assert mesh.get_entry_by_term("diabetes mellitus").identifier == "D003920"
+
+    unchanged = store.update(fresh)
+    assert not unchanged
+    assert unchanged.from_version == unchanged.to_version == change_set.to_version
+    assert store.version == change_set.to_version
+
+
+def test_update_adds_lexicon_names(tmp_path):
+    store = LexiconStore(str(tmp_path / "lexicon.db"))
+    store.write(get_master_lexicon({"MESH": get_mesh_entries()}))
+    change_set = store.update(get_master_lexicon({"MESH": get_mesh_entries(), "HPO": get_hpo_entries()}))
+    assert [(x, y.identifier) for x, y in change_set.added] == [("HPO", "HP:0001250")]
+    assert store.lexicon_names() == ["MESH", "HPO"]
+    hpo = store.load_master_lexicon().get_lexicon_by_name("HPO")
+    assert hpo.get_entry_by_term("seizure").identifier == "HP:0001250"
@@ -0,0 +1,99 @@
+import json
+import os
+
+import Ontology
+from DataStructures import Lexicon, LexiconEntry
+from LexiconStore import LexiconChangeSet
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ontology")
+
+
+class CountingGraph(Ontology.RecordedGraph):
+    def __init__(self, path):
+        super().__init__(path)
+        self.pages = []
+
+    def run(self, query, skip=0, limit=None, **kwargs):
+        self.pages.append((skip, limit))
+        return super().run(query, skip, limit, **kwargs)
+
+
+def load_rows(ontology_name):
+    with open(os.path.join(FIXTURE_DIR, F"{ontology_name}.json"), "r", encoding="utf-8") as fin:
+        return json.load(fin)
+
+
+def build_legacy_lexicon(ontology_name, rows):
+    # The lexicon build prior to the single pass term index, looking up each FSN with get_entry_by_term.
+    lexi = Lexicon(name=ontology_name)
+    for row in rows:
+        old_entry = lexi.get_entry_by_term(str(row["fsn"]))
+        if old_entry:
+            if ontology_name == "MESH":
+                old_entry.add_tree_id(str(row["treeid"]))
+            continue
+        entry = LexiconEntry(str(row["id"]), name=str(row["fsn"]), tree_id=str(row["treeid"]))
+        for syn in row["syns"]:
+            entry.add_synonym(id=entry.identifier, name=syn)
+        lexi.add_entry(entry)
+    return lexi
+
+
+def describe(lexi):
+    return [(x.identifier, x.name(), x.tree_id(), x.synonyms()) for x in lexi.get_entries()]
+
+
+def test_export_is_paged():
+    graph = CountingGraph(os.path.join(FIXTURE_DIR, "MESH.json"))
+    rows = list(Ontology.export_ontology_rows("MESH", graph, page_size=3))
+    assert rows == load_rows("MESH")
+    assert graph.pages == [(0, 3), (3, 3), (6, 3)]
+
+
+def test_export_requests_final_empty_page_when_rows_fill_pages():
+    graph = CountingGraph(os.path.join(FIXTURE_DIR, "MESH.json"))
+    rows = list(Ontology.export_ontology_rows("MESH", graph, page_size=4))
+    assert len(rows) == 8
+    assert graph.pages == [(0, 4), (4, 4), (8, 4)]
+
+
+def test_duplicate_fsn_folds_into_tree_ids():
+    lexi = Ontology.build_lexicon("MESH", load_rows("MESH"))
+    asthma = lexi.get_entry_by_id("D001249")
+    assert asthma.tree_id() == ["C08.127.108", "C08.381.495.108", "C20.543.480.680.095"]
+    # An FSN matching the synonym of an earlier term, ignoring case, is folded into that term.
+    assert lexi.get_entry_by_id("D006974") is None
+    assert lexi.get_entry_by_id("D006973").tree_id() == ["C14.907.489", "C14.907.489.500"]
+    assert len(lexi.get_entries()) == 5
+
+
+def test_duplicate_hpo_terms_are_skipped_without_tree_ids():
+    lexi = Ontology.build_lexicon("HPO", load_rows("HPO"))
+    assert [x.identifier for x in lexi.get_entries()] == ["HP:0000822", "HP:0002099"]
+    assert lexi.get_entry_by_id("HP:0000822").tree_id() == ["None"]
+
+
+def test_build_matches_get_entry_by_term_lookup():
+    for ontology_name in ["MESH", "HPO"]:
+        rows = load_rows(ontology_name)
+        assert describe(Ontology.build_lexicon(ontology_name, rows)) == \
+               describe(build_legacy_lexicon(ontology_name, rows))
+
+
+def test_replay_and_record(tmp_path):
+    master = Ontology.get_graph_ontology_data(fixture_dir=FIXTURE_DIR, record_dir=str(tmp_path))
+    assert [x.name for x in master.get_ordered_lexicons()] == ["MESH", "HPO"]
+    assert master.get_lexicon_entry("D003924", "MESH").name() == "Diabetes Mellitus, Type 2"
+    for ontology_name in ["MESH", "HPO"]:
+        with open(tmp_path / F"{ontology_name}.json", "r", encoding="utf-8") as fin:
+            assert json.load(fin) == load_rows(ontology_name)
+
+
+def test_change_set_chain_from_latest_cached_version(tmp_path):
+    for from_version, to_version in [("a", "b"), ("b", "c"), ("c", "d")]:
+        LexiconChangeSet(from_version, to_version).save(str(tmp_path / F"{from_version}_{to_version}.json"))
+    base, change_sets = Ontology.get_change_set_chain("d", lambda x: x in ("a", "b"), str(tmp_path))
+    assert base == "b"
+    assert [(x.from_version, x.to_version) for x in change_sets] == [("b", "c"), ("c", "d")]
+    assert Ontology.get_change_set_chain("d", lambda x: False, str(tmp_path)) == (None, [])
+    assert Ontology.get_change_set_chain("e", lambda x: True, str(tmp_path)) == (None, [])
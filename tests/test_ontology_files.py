@@ -0,0 +1,46 @@
+import os
+
+import OntologyFiles
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ontology_files")
+MESH_PATH = os.path.join(FIXTURE_DIR, "desc.xml")
+OBO_PATH = os.path.join(FIXTURE_DIR, "hp.obo")
+
+
+def test_mesh_rows_one_per_included_tree_number():
+    rows = list(OntologyFiles.iter_mesh_rows(MESH_PATH, {}))
+    assert [(x["id"], x["treeid"]) for x in rows] == [
+        ("D001249", "C08.127.108"), ("D001249", "C08.381.495.108"), ("D004247", "D13.444.308"),
+        ("D006973", "C14.907.489")]
+    assert rows[0]["fsn"] == "Asthma"
+    assert rows[0]["syns"] == ["Asthma", "Asthmas", "Bronchial Asthma"]
+
+
+def test_mesh_rows_apply_blacklist_and_tree_rules():
+    rules = OntologyFiles.load_ontology_rules()["MESH"]
+    assert "D004247" not in [x["id"] for x in OntologyFiles.iter_mesh_rows(MESH_PATH, rules)]
+    rules = {"included_tree_prefixes": ["C"], "excluded_tree_prefixes": ["C08.381"],
+             "excluded_terms": ["high blood pressure"]}
+    rows = list(OntologyFiles.iter_mesh_rows(MESH_PATH, rules))
+    assert [(x["id"], x["treeid"]) for x in rows] == [("D001249", "C08.127.108"), ("D006973", "C14.907.489")]
+    assert rows[1]["syns"] == ["Hypertension"]
+
+
+def test_obo_rows_skip_obsolete_terms_and_other_scopes():
+    rows = list(OntologyFiles.iter_obo_rows(OBO_PATH, {"synonym_scopes": ["EXACT"]}))
+    assert rows == [
+        {"id": "HP:0000822", "fsn": "Hypertension", "treeid": None, "syns": ["Hypertension", "High blood pressure"]},
+        {"id": "HP:0001250", "fsn": "Seizure", "treeid": None, "syns": ["Seizure", "Seizures"]}]
+    rows = list(OntologyFiles.iter_obo_rows(OBO_PATH, {"synonym_scopes": ["EXACT", "RELATED"],
+                                                       "include_obsolete": True}))
+    assert [x["id"] for x in rows] == ["HP:0000822", "HP:0001250", "HP:0000001"]
+    assert rows[0]["syns"][-1] == "Raised blood pressure"
+
+
+def test_file_ontology_data():
+    master = OntologyFiles.get_file_ontology_data({"MESH": MESH_PATH, "HPO": OBO_PATH}, parallel=False)
+    mesh = master.get_lexicon_by_name("MESH")
+    assert [x.identifier for x in mesh.get_entries()] == ["D001249", "D006973"]
+    assert mesh.get_entry_by_term("bronchial asthma").tree_id() == ["C08.127.108", "C08.381.495.108"]
+    hpo = master.get_lexicon_by_name("HPO")
+    assert hpo.get_entry_by_term("high blood pressure").identifier == "HP:0000822"
@@ -0,0 +1,17 @@
+from OutputWriter import OutputWriter
+
+
+def fail(error):
+    raise error
+
+
+def test_completed_outputs_are_reported_once_written():
+    written = []
+    with OutputWriter(workers=1) as writer:
+        writer.submit("PMC1", written.append, "PMC1")
+        writer.submit("PMC2", fail, IOError("disk full"))
+        writer.flush()
+        assert writer.pop_completed() == ["PMC1"]
+        assert writer.pop_completed() == []
+    assert written == ["PMC1"]
+    assert [x for x, _ in writer.failures] == ["PMC2"]
@@ -0,0 +1,40 @@
+import pytest
+
+from PValue import PValueIndex, PValueInterval, parse_p_value, pvalue_pattern
+
+
+@pytest.mark.parametrize("text, value", [
+    ("P = 3.2 × 10−8", 3.2e-8),
+    ("P = 3.2x10<sup>-8</sup>", 3.2e-8),
+    ("P = 3.2 × 10⁻⁸", 3.2e-8),
+    ("P = 3.2E-08", 3.2e-8),
+    ("P = 3.2 × 10(-8)", 3.2e-8),
+    ("P = 4.1 x 10 (-9)", 4.1e-9),
+    ("P=3.2x10^-8", 3.2e-8),
+    ("P = 10^-8", 1e-8),
+    ("P < 10−5", 1e-5),
+    ("P = 10(-6)", 1e-6),
+    ("p = 0.003", 0.003),
+    ("p = 0.003 (10 cases)", 0.003),
+])
+def test_parse_p_value(text, value):
+    assert parse_p_value(text) == pytest.approx(value)
+
+
+@pytest.mark.parametrize("text", ["", None, "P = 3.2 × 10(-n)", "P = 10^-", "P = 4.1 x 10 (", "not significant"])
+def test_unparsed_p_value(text):
+    assert parse_p_value(text) is None
+
+
+def test_bracketed_exponent_match_excludes_enclosing_bracket():
+    assert pvalue_pattern.search("(P = 3.2 × 10−8)").group() == "3.2 × 10−8"
+    assert pvalue_pattern.search("(P = 3.2 × 10(-8))").group() == "3.2 × 10(-8)"
+
+
+def test_p_value_index():
+    index = PValueIndex([PValueInterval("3E-08"), PValueInterval("0.002")])
+    assert len(index) == 2
+    assert index.contains(parse_p_value("P = 2.5 × 10(-8)"))
+    assert index.contains(0.003)
+    assert not index.contains(6e-8)
+    assert not index.contains(None)
@@ -0,0 +1,24 @@
+import ResultCache
+
+
+def get_code_version(monkeypatch, settings_dir):
+    monkeypatch.setattr(ResultCache, "SETTINGS_DIR", str(settings_dir))
+    monkeypatch.setattr(ResultCache, "__code_version", None)
+    return ResultCache.get_code_version()
+
+
+def test_code_version_covers_settings_files(tmp_path, monkeypatch):
+    (tmp_path / "config.ini").write_text("[DEFAULT]\n")
+    (tmp_path / "Blacklist.txt").write_text("D004247\tDNA\tTRUE\n")
+    version = get_code_version(monkeypatch, tmp_path)
+    assert get_code_version(monkeypatch, tmp_path) == version
+    (tmp_path / "Blacklist.txt").write_text("D004247\tDNA\tTRUE\nD014041\tTokyo\tTRUE\n")
+    assert get_code_version(monkeypatch, tmp_path) != version
+
+
+def test_key_changes_with_code_version(monkeypatch):
+    cache = ResultCache.ResultCache()
+    key = cache.get_key({"id": "PMC1"}, "v1")
+    monkeypatch.setattr(ResultCache, "__code_version", "changed")
+    assert cache.get_key({"id": "PMC1"}, "v1") != key
+    assert cache.get_key({"id": "PMC1"}, None) is None
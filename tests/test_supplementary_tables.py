@@ -0,0 +1,56 @@
+from SupplementaryTables import SupplementaryTable
+
+from fake_interpreter import FakeInterpreter
+
+HEADER = ["SNP", "CHR", "P_BOLT_LMM", "Trait"]
+ROWS = [["rs123", "1", "1e-9", "Asthma"], ["rs456", "2", "0.2", "Asthma"], ["", "", "", ""],
+        ["rs789", "3", "3e-8", ""], ["rs101", "4", "1e-10", "Hypertension"]]
+
+
+def get_roles(relation):
+    return [x.role for x in relation.nodes]
+
+
+def test_column_detection_by_header():
+    table = SupplementaryTable("gwas.tsv", [[], HEADER] + ROWS)
+    assert (table.marker_column, table.significance_column, table.trait_column) == (0, 2, 3)
+    assert table.is_candidate()
+
+
+def test_marker_column_detected_by_values():
+    table = SupplementaryTable("gwas.tsv", [["id", "beta", "pval"], ["rs1", "0.1", "1e-9"], ["rs2", "0.2", "0.04"]])
+    assert (table.marker_column, table.significance_column, table.trait_column) == (0, 2, None)
+
+
+def test_sections_are_chunked():
+    table = SupplementaryTable("gwas.tsv", [HEADER] + ROWS, chunk_rows=2)
+    sections = list(table.iter_sections())
+    assert [len(x.rows) for x in sections] == [2, 2, 1]
+    assert [x.id for x in sections[1].rows[1].cells] == ["4.1", "4.2", "4.3", "4.4"]
+    assert table.row_count == len(ROWS)
+
+
+def test_rows_related_to_their_trait_cell():
+    nlp = FakeInterpreter(["Asthma", "Hypertension"])
+    table = SupplementaryTable("gwas.tsv", [HEADER] + ROWS, chunk_rows=2, max_p_value=5e-8)
+    results = list(table.iter_annotations(nlp))
+    relations = [x for _, section_relations in results for x in section_relations]
+    assert len(relations) == 2
+    assert all(get_roles(x) == ["trait", "variant", "significance"] for x in relations)
+    assert len([x for annotations, _ in results for x in annotations]) == 8
+    assert nlp.processed == ["Asthma", "Hypertension"]
+
+
+def test_rows_without_trait_column_related_to_caption_trait():
+    rows = [["SNP", "P"], ["rs123", "1e-9"], ["rs456", "2e-8"], ["rs789", "0.3"]]
+    nlp = FakeInterpreter(["Type 2 diabetes"])
+    table = SupplementaryTable("t2d.csv", rows, chunk_rows=1, max_p_value=5e-8, caption="GWAS of Type 2 diabetes")
+    results = list(table.iter_annotations(nlp))
+    annotations = [x for section_annotations, _ in results for x in section_annotations]
+    relations = [x for _, section_relations in results for x in section_relations]
+    traits = [x for x in annotations if x.infons["type"] == "trait"]
+    assert len(traits) == 1
+    assert traits[0].locations[0].offset == len("GWAS of ")
+    assert len(relations) == 2
+    assert {x.nodes[0].refid for x in relations} == {traits[0].id}
+    assert not list(SupplementaryTable("t2d.csv", rows).iter_annotations(nlp))[0][1]
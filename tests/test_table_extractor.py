@@ -0,0 +1,95 @@
+from TableExtractor import Table, TableCell, TableRow, TableSection, broadcast
+
+from fake_interpreter import FakeInterpreter
+
+TRAITS = ["Asthma", "Hypertension"]
+
+
+def get_table(headers, sections, caption=None, caption_offset=None):
+    """
+    @param sections: List of (section title, title offset, rows) tuples, each row a list of cell texts
+    """
+    column_row = TableRow([TableCell(F"1.{i + 1}", x) for i, x in enumerate(headers)])
+    data_sections = []
+    row_number = 1
+    for title, title_offset, rows in sections:
+        section = TableSection(title=title, title_offset=title_offset)
+        for row in rows:
+            row_number += 1
+            section.rows.append(TableRow([TableCell(F"{row_number}.{i + 1}", x) for i, x in enumerate(row)]))
+        data_sections.append(section)
+    return Table(None, "T1", None, 50, [column_row], data_sections, caption, caption_offset, None, None)
+
+
+def annotate(table, nlp):
+    table.add_spacy_docs(nlp)
+    return table.get_annotations(nlp)
+
+
+def get_nodes(relation):
+    return [(x.role, x.refid) for x in relation.nodes]
+
+
+def get_annotation(nlp, annotation_id):
+    return next(x for x in nlp.annotations if x.id == annotation_id)
+
+
+def test_broadcast_pairs_single_entities_with_every_row_entity():
+    assert broadcast(["T"], ["V1", "V2", "V3"], ["S1", "S2", "S3"]) == [("T", "V1", "S1"), ("T", "V2", "S2"),
+                                                                        ("T", "V3", "S3")]
+    assert broadcast(["T"], ["V"], ["S"]) == [("T", "V", "S")]
+
+
+def test_broadcast_pairs_uneven_entities_in_column_order():
+    assert broadcast(["T1", "T2"], ["V1", "V2", "V3"], ["S"]) == [("T1", "V1", "S")]
+
+
+def test_marker_list_without_trait_has_no_relations():
+    nlp = FakeInterpreter(TRAITS)
+    table = get_table(["SNP", "P-value"], [(None, None, [["rs123", "3 × 10−8"]])], "Top loci", 10)
+    annotate(table, nlp)
+    assert table.table_type == Table.TYPE_MARKER_LIST
+    assert not nlp.relations
+    assert not nlp.annotations
+
+
+def test_rows_related_to_caption_trait():
+    nlp = FakeInterpreter(TRAITS)
+    nlp.r, nlp.t = 5, 2
+    rows = [["rs123", "IL6", "3 × 10−8"], ["rs456", "IL6R", "NS"], ["rs789", "ABC", "1.2E-9"]]
+    table = get_table(["SNP", "Gene", "P"], [(None, None, rows)], "Loci associated with asthma", 100)
+    annotate(table, nlp)
+    assert table.table_type == Table.TYPE_TRAIT_LIST
+    assert [x.id for x in nlp.relations] == ["R5", "R6"]
+    assert [get_nodes(x) for x in nlp.relations] == [
+        [("trait", "T2"), ("variant", "V0"), ("significance", "S0")],
+        [("trait", "T2"), ("variant", "V1"), ("significance", "S1")]]
+    trait = get_annotation(nlp, "T2")
+    assert trait.infons["type"] == "trait"
+    assert trait.locations[0].offset == 100 + len("Loci associated with ")
+    assert [x.text for x in nlp.annotations if x.id.startswith("V")] == ["rs123", "rs789"]
+    assert (nlp.r, nlp.t, nlp.v, nlp.s) == (7, 3, 2, 2)
+
+
+def test_rows_related_to_section_title_traits():
+    nlp = FakeInterpreter(TRAITS)
+    sections = [("Asthma", 200, [["rs1", "2E-8"]]), ("Hypertension", 300, [["rs2", "4E-9"], ["rs3", "5E-10"]])]
+    table = get_table(["SNP", "P"], sections)
+    annotate(table, nlp)
+    traits = [get_annotation(nlp, x.nodes[0].refid) for x in nlp.relations]
+    assert [(x.text, x.locations[0].offset) for x in traits] == [("Asthma", 200), ("Hypertension", 300),
+                                                                  ("Hypertension", 300)]
+    assert len([x for x in nlp.annotations if x.infons["type"] == "trait"]) == 2
+
+
+def test_trait_list_related_to_caption_variant():
+    nlp = FakeInterpreter(TRAITS)
+    rows = [["Asthma", "2E-8"], ["Hypertension", "4E-9"], ["Asthma", ""]]
+    table = get_table(["Trait", "P"], [(None, None, rows)], "Associations of rs123", 20)
+    annotate(table, nlp)
+    assert table.table_type == Table.TYPE_TRAIT_LIST
+    assert [get_nodes(x) for x in nlp.relations] == [
+        [("trait", "T0"), ("variant", "V0"), ("significance", "S0")],
+        [("trait", "T1"), ("variant", "V0"), ("significance", "S1")]]
+    variant = get_annotation(nlp, "V0")
+    assert (variant.text, variant.locations[0].offset) == ("rs123", 20 + len("Associations of "))